@@ -0,0 +1,43 @@
+"""add storage state to traffic_files and prediction_summaries
+
+Revision ID: a4d7e9b2c615
+Revises: f3b8d6a2c914
+Create Date: 2026-02-20 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a4d7e9b2c615"
+down_revision: Union[str, Sequence[str], None] = "f3b8d6a2c914"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("traffic_files", sa.Column("storage_state", sa.String(length=16), nullable=False, server_default="hot"))
+    op.add_column("traffic_files", sa.Column("stored_bytes", sa.BigInteger(), nullable=True))
+    op.add_column("traffic_files", sa.Column("storage_updated_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        "ix_traffic_files_state_created", "traffic_files", ["storage_state", "created_at"], unique=False
+    )
+
+    op.add_column(
+        "prediction_summaries", sa.Column("scored_state", sa.String(length=16), nullable=False, server_default="hot")
+    )
+    op.add_column("prediction_summaries", sa.Column("scored_bytes", sa.BigInteger(), nullable=True))
+    op.add_column("prediction_summaries", sa.Column("scored_sep", sa.String(length=8), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("prediction_summaries", "scored_sep")
+    op.drop_column("prediction_summaries", "scored_bytes")
+    op.drop_column("prediction_summaries", "scored_state")
+
+    op.drop_index("ix_traffic_files_state_created", table_name="traffic_files")
+    op.drop_column("traffic_files", "storage_updated_at")
+    op.drop_column("traffic_files", "stored_bytes")
+    op.drop_column("traffic_files", "storage_state")
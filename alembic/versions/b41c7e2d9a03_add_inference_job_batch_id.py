@@ -0,0 +1,27 @@
+"""add batch_id to inference_jobs
+
+Revision ID: b41c7e2d9a03
+Revises: 9f2b3b1c7d11
+Create Date: 2026-01-12 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b41c7e2d9a03"
+down_revision: Union[str, Sequence[str], None] = "9f2b3b1c7d11"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("inference_jobs", sa.Column("batch_id", sa.UUID(), nullable=True))
+    op.create_index(op.f("ix_inference_jobs_batch_id"), "inference_jobs", ["batch_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_inference_jobs_batch_id"), table_name="inference_jobs")
+    op.drop_column("inference_jobs", "batch_id")
@@ -0,0 +1,36 @@
+"""add prediction_timelines
+
+Revision ID: b6c2e8f41a37
+Revises: a4d7e9b2c615
+Create Date: 2026-02-24 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b6c2e8f41a37"
+down_revision: Union[str, Sequence[str], None] = "a4d7e9b2c615"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prediction_timelines",
+        sa.Column("job_id", sa.UUID(), nullable=False),
+        sa.Column("resolution_seconds", sa.Integer(), nullable=False),
+        sa.Column("start_ts", sa.BigInteger(), nullable=False),
+        sa.Column("classes", sa.JSON(), nullable=False),
+        sa.Column("buckets", sa.JSON(), nullable=False),
+        sa.Column("untimed_rows", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["job_id"], ["inference_jobs.id"]),
+        sa.PrimaryKeyConstraint("job_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("prediction_timelines")
@@ -0,0 +1,50 @@
+"""add per-user daily rollups and prediction_summaries.class_counts
+
+Revision ID: c3f9a7d25e81
+Revises: b6c2e8f41a37
+Create Date: 2026-02-27 00:00:00.000000
+
+Tables start empty: fill them for existing history with
+    python -m app.scripts.backfill_rollups
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c3f9a7d25e81"
+down_revision: Union[str, Sequence[str], None] = "b6c2e8f41a37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("prediction_summaries", sa.Column("class_counts", sa.JSON(), nullable=True))
+    op.create_table(
+        "user_daily_stats",
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("jobs_done", sa.Integer(), nullable=False),
+        sa.Column("jobs_failed", sa.Integer(), nullable=False),
+        sa.Column("rows_scored", sa.BigInteger(), nullable=False),
+        sa.Column("attack_rows", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "day"),
+    )
+    op.create_table(
+        "user_daily_class_counts",
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("class_name", sa.String(length=64), nullable=False),
+        sa.Column("rows", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "day", "class_name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_daily_class_counts")
+    op.drop_table("user_daily_stats")
+    op.drop_column("prediction_summaries", "class_counts")
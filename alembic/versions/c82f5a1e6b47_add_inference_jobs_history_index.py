@@ -0,0 +1,33 @@
+"""add (user_id, created_at desc, id desc) index for job history
+
+Revision ID: c82f5a1e6b47
+Revises: b41c7e2d9a03
+Create Date: 2026-01-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c82f5a1e6b47"
+down_revision: Union[str, Sequence[str], None] = "b41c7e2d9a03"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_inference_jobs_user_created_id",
+        "inference_jobs",
+        ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+    # the composite index starts with user_id, the single-column one is redundant now
+    op.drop_index(op.f("ix_inference_jobs_user_id"), table_name="inference_jobs")
+
+
+def downgrade() -> None:
+    op.create_index(op.f("ix_inference_jobs_user_id"), "inference_jobs", ["user_id"], unique=False)
+    op.drop_index("ix_inference_jobs_user_created_id", table_name="inference_jobs")
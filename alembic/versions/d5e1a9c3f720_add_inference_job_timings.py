@@ -0,0 +1,25 @@
+"""add timings to inference_jobs
+
+Revision ID: d5e1a9c3f720
+Revises: c82f5a1e6b47
+Create Date: 2026-02-02 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d5e1a9c3f720"
+down_revision: Union[str, Sequence[str], None] = "c82f5a1e6b47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("inference_jobs", sa.Column("timings", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("inference_jobs", "timings")
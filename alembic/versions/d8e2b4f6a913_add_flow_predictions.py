@@ -0,0 +1,57 @@
+"""add flow_predictions (partitioned by day) and flow_classes
+
+Revision ID: d8e2b4f6a913
+Revises: c3f9a7d25e81
+Create Date: 2026-03-02 00:00:00.000000
+
+Partitions (flow_predictions_pYYYYMMDD) are created by the worker on first
+write and dropped by the storage manager (FLOW_SINK_RETENTION_DAYS).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "d8e2b4f6a913"
+down_revision: Union[str, Sequence[str], None] = "c3f9a7d25e81"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "flow_classes",
+        sa.Column("id", sa.SmallInteger(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.execute("INSERT INTO flow_classes (id, name) VALUES (0, 'benign')")
+
+    op.create_table(
+        "flow_predictions",
+        sa.Column("job_id", sa.UUID(), nullable=False),
+        sa.Column("row_no", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("saddr", postgresql.INET(), nullable=True),
+        sa.Column("sport", sa.Integer(), nullable=True),
+        sa.Column("daddr", postgresql.INET(), nullable=True),
+        sa.Column("dport", sa.Integer(), nullable=True),
+        sa.Column("is_attack", sa.Boolean(), nullable=False),
+        sa.Column("class_id", sa.SmallInteger(), nullable=False),
+        sa.Column("attack_proba", sa.REAL(), nullable=True),
+        sa.Column("class_proba", sa.REAL(), nullable=True),
+        sa.PrimaryKeyConstraint("job_id", "row_no", "day"),
+        postgresql_partition_by="RANGE (day)",
+    )
+    # on the parent: every partition gets its own copy
+    op.create_index("ix_flow_predictions_saddr_class", "flow_predictions", ["saddr", "class_id"])
+    op.create_index("ix_flow_predictions_daddr_class", "flow_predictions", ["daddr", "class_id"])
+
+
+def downgrade() -> None:
+    # drops the partitions too
+    op.drop_table("flow_predictions")
+    op.drop_table("flow_classes")
@@ -0,0 +1,37 @@
+"""partial indexes for admission control: jobs in flight, recently finished jobs
+
+Revision ID: e1a5c9d7b342
+Revises: d8e2b4f6a913
+Create Date: 2026-03-04 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e1a5c9d7b342"
+down_revision: Union[str, Sequence[str], None] = "d8e2b4f6a913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_inference_jobs_in_flight",
+        "inference_jobs",
+        ["user_id"],
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+    op.create_index(
+        "ix_inference_jobs_done_finished",
+        "inference_jobs",
+        ["finished_at"],
+        postgresql_where=sa.text("status = 'done'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inference_jobs_done_finished", table_name="inference_jobs")
+    op.drop_index("ix_inference_jobs_in_flight", table_name="inference_jobs")
@@ -0,0 +1,27 @@
+"""add model_version to inference_jobs and prediction_summaries
+
+Revision ID: e7a4c2d91b58
+Revises: d5e1a9c3f720
+Create Date: 2026-02-09 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e7a4c2d91b58"
+down_revision: Union[str, Sequence[str], None] = "d5e1a9c3f720"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("inference_jobs", sa.Column("model_version", sa.String(length=64), nullable=True))
+    op.add_column("prediction_summaries", sa.Column("model_version", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("prediction_summaries", "model_version")
+    op.drop_column("inference_jobs", "model_version")
@@ -0,0 +1,25 @@
+"""add shadow_stats to prediction_summaries
+
+Revision ID: f3b8d6a2c914
+Revises: e7a4c2d91b58
+Create Date: 2026-02-12 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f3b8d6a2c914"
+down_revision: Union[str, Sequence[str], None] = "e7a4c2d91b58"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("prediction_summaries", sa.Column("shadow_stats", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("prediction_summaries", "shadow_stats")
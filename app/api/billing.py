@@ -2,20 +2,25 @@ from datetime import datetime, timedelta, timezone
 import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_async_db, get_current_user
+from app.schemas.auth import UserOut
 from app.schemas.billing import SubscriptionStatusOut, RenewIn, RenewOut
-from app.models import User, Plan, Payment, Subscription
+from app.models import Plan, Payment, Subscription
+from app.services.billing import subscription_cache
 
 router = APIRouter()
 
 
 @router.get("/subscription", response_model=SubscriptionStatusOut)
-def get_subscription_status(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_subscription_status(
+    user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
     now = datetime.now(timezone.utc)
-    sub = db.scalar(
+    sub = await db.scalar(
         select(Subscription)
         .where(Subscription.user_id == user.id)
         .where(Subscription.status == "active")
@@ -39,13 +44,17 @@ def get_subscription_status(user: User = Depends(get_current_user), db: Session
 
 
 @router.post("/renew", response_model=RenewOut)
-def renew_subscription(payload: RenewIn, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def renew_subscription(
+    payload: RenewIn,
+    user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Mock-продление:
     - создаём Payment со статусом succeeded
     - продлеваем/создаём Subscription на duration_days плана
     """
-    plan = db.scalar(select(Plan).where(Plan.code == payload.plan_code).where(Plan.is_active == True))  # noqa: E712
+    plan = await db.scalar(select(Plan).where(Plan.code == payload.plan_code).where(Plan.is_active == True))  # noqa: E712
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found or inactive")
 
@@ -62,11 +71,11 @@ def renew_subscription(payload: RenewIn, user: User = Depends(get_current_user),
         paid_at=now,
     )
     db.add(payment)
-    db.commit()
-    db.refresh(payment)
+    await db.commit()
+    await db.refresh(payment)
 
     # найдём текущую активную подписку
-    current = db.scalar(
+    current = await db.scalar(
         select(Subscription)
         .where(Subscription.user_id == user.id)
         .where(Subscription.status == "active")
@@ -88,8 +97,11 @@ def renew_subscription(payload: RenewIn, user: User = Depends(get_current_user),
         end_at=end_at,
     )
     db.add(sub)
-    db.commit()
-    db.refresh(sub)
+    await db.commit()
+    await db.refresh(sub)
+
+    # upload guard must see the new end_at right away
+    subscription_cache.invalidate(user.id)
 
     return RenewOut(
         payment_id=payment.id,
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_db
+from app.schemas.capacity import CapacityOut, ThroughputFitOut, WorkOut
+from app.services.capacity import Work, snapshot
+
+router = APIRouter()
+
+
+def _work(work: Work) -> WorkOut:
+    return WorkOut(jobs=work.jobs, bytes=work.bytes, seconds=round(work.seconds, 1))
+
+
+@router.get("", response_model=CapacityOut)
+async def get_capacity(db: AsyncSession = Depends(get_async_db)):
+    """Queued and running work in estimated worker-seconds (wall clock of one job slot,
+    not CPU time: XGBoost is multi-threaded inside a job) - the autoscaling signal.
+
+    Aggregates only, no auth (like /metrics).
+    replicas = pending_seconds / (target drain time * job_slots).
+    """
+    state = await snapshot(db)
+    return CapacityOut(
+        queued=_work(state.work.queued),
+        running=_work(state.work.running),
+        pending_seconds=round(state.work.seconds, 1),
+        queue_messages=state.queue_messages,
+        consumers=state.consumers,
+        job_slots=state.job_slots,
+        drain_seconds=round(state.drain_seconds, 1),
+        model=[
+            ThroughputFitOut(
+                kind=kind,
+                jobs=fit.jobs,
+                bytes_per_row=round(fit.bytes_per_row, 1),
+                overhead_seconds=round(fit.overhead_seconds, 3),
+                rows_per_second=round(1.0 / fit.seconds_per_row, 1),
+            )
+            for kind, fit in sorted(state.model.kinds.items())
+        ],
+    )
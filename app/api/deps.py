@@ -1,21 +1,32 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import Generator
+from typing import AsyncGenerator, Generator
 import uuid
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.db import SessionLocal
-from app.models import User, Subscription
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, SessionLocal
+from app.models import User
+from app.schemas.auth import UserOut
+from app.services import billing
 from app.services.auth import decode_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# user_id -> snapshot of an active user; JWT is still verified on every request
+user_cache: "TTLCache[UserOut]" = TTLCache(
+    "auth_user",
+    ttl_seconds=settings.auth_cache_ttl_seconds,
+    max_entries=settings.auth_cache_max_entries,
+)
+
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -25,10 +36,20 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def get_current_user(
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> User:
+    db: AsyncSession = Depends(get_async_db),
+) -> UserOut:
+    """Authenticated user as a detached snapshot (id/email/role/is_active).
+
+    The users lookup is cached for auth_cache_ttl_seconds, so a deactivated
+    user keeps access at most that long.
+    """
     credentials_exc = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -44,30 +65,23 @@ def get_current_user(
     except (JWTError, ValueError):
         raise credentials_exc
 
-    user = db.scalar(select(User).where(User.id == user_id))
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user or not user.is_active:
         raise credentials_exc
-    return user
 
+    snapshot = UserOut.model_validate(user)
+    user_cache.set(user_id, snapshot)
+    return snapshot
 
-def require_active_subscription(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-) -> User:
-    """Dependency-guard: user must have active subscription."""
-    now = datetime.now(timezone.utc)
-
-    sub = db.scalar(
-        select(Subscription)
-        .where(Subscription.user_id == user.id)
-        .where(Subscription.status == "active")
-        .where(Subscription.end_at > now)
-        .order_by(Subscription.end_at.desc())
-    )
 
-    if not sub:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Active subscription required",
-        )
+async def require_active_subscription(
+    user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+) -> UserOut:
+    """Dependency-guard: user must have active subscription."""
+    await billing.require_active_subscription(db, user.id)
     return user
@@ -2,20 +2,46 @@ from __future__ import annotations
 
 import os
 import uuid
+from collections import Counter
 from datetime import datetime, timezone
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Response
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_db, get_current_user
-from app.core.config import settings
+from app.api.deps import get_async_db, get_current_user
+from app.ml.timeline import rebucket
 from app.models.inference_job import InferenceJob
 from app.models.prediction_summary import PredictionSummary
-from app.models.traffic_file import TrafficFile
-from app.schemas.predictions import PredictionJobOut, PredictionJobListItemOut, PredictionSummaryOut
+from app.models.prediction_timeline import PredictionTimeline
+from app.schemas.predictions import (
+    PredictionBatchOut,
+    PredictionJobListItemOut,
+    PredictionJobOut,
+    PredictionJobStatusOut,
+    PredictionStatusIn,
+    PredictionSummaryOut,
+    PredictionTimelineOut,
+    TimelineBucketOut,
+)
+from app.services.admission import admit
 from app.services.billing import require_active_subscription
-from app.services.queue import publish_ml_job
+from app.services.predictions import (
+    aggregate_status,
+    check_model_version,
+    check_upload_name,
+    create_jobs,
+    fetch_jobs,
+    is_archive,
+    list_jobs_page,
+    store_upload,
+    store_uploads,
+    user_jobs_select,
+)
+from app.services.queue import publish_ml_job, publish_ml_jobs
+from app.services.storage import EXPIRED, scored_download
 
 router = APIRouter(tags=["predictions"])
 
@@ -24,82 +50,202 @@ def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _empty_summary() -> PredictionSummaryOut:
+    return PredictionSummaryOut(
+        total_rows=0,
+        attack_rows=0,
+        attack_ratio=0.0,
+        top_class=None,
+        top_class_share=None,
+    )
+
+
+def _summary_out(summary: PredictionSummary | None) -> PredictionSummaryOut:
+    if not summary:
+        return _empty_summary()
+
+    return PredictionSummaryOut(
+        total_rows=int(summary.rows_scored or 0),
+        attack_rows=int(summary.attack_rows or 0),
+        attack_ratio=float(summary.attack_share or 0.0),
+        top_class=summary.top_class,
+        top_class_share=float(summary.top_class_share) if summary.top_class_share is not None else None,
+    )
+
+
+async def _get_user_job(db: AsyncSession, user_id: uuid.UUID, job_id: uuid.UUID) -> InferenceJob:
+    job = await db.scalar(user_jobs_select(user_id).where(InferenceJob.id == job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def _content_disposition(filename: str) -> str:
+    """Same header FileResponse sets (RFC 5987 form for non-ASCII names)."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _job_error(job: InferenceJob) -> str | None:
+    if job.status != "failed" or not job.error_message:
+        return None
+    # shorten a bit: goes to a header / polling payload
+    return job.error_message.replace("\n", " ")[:800]
+
+
+def _model_version(job: InferenceJob) -> str | None:
+    if job.summary and job.summary.model_version:
+        return job.summary.model_version
+    return job.model_version
+
+
+def _list_item(job: InferenceJob) -> PredictionJobListItemOut:
+    created_iso = job.created_at.isoformat() if getattr(job, "created_at", None) else None
+    return PredictionJobListItemOut(
+        job_id=job.id,
+        status=job.status,
+        summary=_summary_out(job.summary),
+        model_version=_model_version(job),
+        created_at=created_iso,
+        original_filename=getattr(job.file, "original_filename", None),
+    )
+
+
 @router.post("/upload", response_model=PredictionJobOut)
-def upload_for_prediction(
+async def upload_for_prediction(
     csv_file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    model_version: str | None = Form(None),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
 ):
-    require_active_subscription(db, user.id)
-
-    if not csv_file.filename or not csv_file.filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Only CSV files are supported")
-
-    raw = csv_file.file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="Empty file")
-
-    os.makedirs(settings.uploads_dir, exist_ok=True)
-    safe_name = os.path.basename(csv_file.filename)
-    stored_name = f"{uuid.uuid4()}_{safe_name}"
-    stored_path = os.path.join(settings.uploads_dir, stored_name)
-
-    try:
-        with open(stored_path, "wb") as f:
-            f.write(raw)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to store file: {e}")
-
-    now = _utcnow()
-
-    tf = TrafficFile(
-        user_id=user.id,
-        original_filename=safe_name,
-        stored_path=stored_path,
-        rows_count=None,
-        created_at=now,
+    """`model_version` (optional) pins the job to a model version of the manifest.
+
+    Admission control may refuse the upload with 429 / 503 and Retry-After;
+    an accepted one reports `estimated_wait_seconds`.
+    """
+    await require_active_subscription(db, user.id)
+
+    check_upload_name(csv_file.filename)
+
+    model_version = await run_in_threadpool(check_model_version, model_version)
+    wait = await admit(db, user.id, [(csv_file.filename or "", csv_file.size or 0)])
+
+    stored = await run_in_threadpool(store_upload, csv_file.file, csv_file.filename)
+    [(job_id, _)] = await create_jobs(db, user.id, [stored], model_version=model_version)
+
+    await run_in_threadpool(publish_ml_job, job_id=str(job_id))
+
+    return PredictionJobOut(
+        job_id=job_id,
+        status="queued",
+        summary=_empty_summary(),
+        model_version=model_version,
+        estimated_wait_seconds=wait,
     )
-    db.add(tf)
-    db.commit()
-    db.refresh(tf)
 
-    job = InferenceJob(
-        user_id=user.id,
-        file_id=tf.id,
+
+@router.post("/upload/batch", response_model=PredictionBatchOut)
+async def upload_batch_for_prediction(
+    csv_files: list[UploadFile] = File(...),
+    model_version: str | None = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    """Many CSVs in one request: one subscription check, one transaction, one publish.
+
+    Each part is either a CSV (.csv, .csv.gz, .csv.zst), a table (.parquet,
+    .arrow, .jsonl), a capture (.pcap, .pcapng, .ipfix, .netflow) or a
+    .zip/.tar(.gz) archive whose members of those kinds become separate jobs.
+    Formats are checked by content. `model_version` pins all of them.
+    Admission control counts an archive as one job (its members are not
+    known before it is expanded).
+    """
+    await require_active_subscription(db, user.id)
+    model_version = await run_in_threadpool(check_model_version, model_version)
+
+    for f in csv_files:
+        name = f.filename or ""
+        if is_archive(name):
+            continue
+        check_upload_name(name)
+
+    wait = await admit(db, user.id, [(f.filename or "", f.size or 0) for f in csv_files])
+
+    stored = await run_in_threadpool(store_uploads, [(f.filename, f.file) for f in csv_files])
+
+    if not stored:
+        raise HTTPException(status_code=400, detail="No CSV / table / capture files in batch")
+
+    batch_id = uuid.uuid4()
+    created = await create_jobs(db, user.id, stored, batch_id=batch_id, model_version=model_version)
+
+    await run_in_threadpool(publish_ml_jobs, [str(job_id) for job_id, _ in created])
+
+    created_iso = _utcnow().isoformat()
+    return PredictionBatchOut(
+        batch_id=batch_id,
         status="queued",
-        created_at=now,
-        started_at=None,
-        finished_at=None,
-        error_message=None,
+        total_jobs=len(created),
+        status_counts={"queued": len(created)},
+        estimated_wait_seconds=wait,
+        jobs=[
+            PredictionJobListItemOut(
+                job_id=job_id,
+                status="queued",
+                summary=_empty_summary(),
+                model_version=model_version,
+                created_at=created_iso,
+                original_filename=filename,
+            )
+            for job_id, filename in created
+        ],
     )
-    db.add(job)
-    db.commit()
-    db.refresh(job)
 
-    publish_ml_job(job_id=str(job.id))
 
-    return PredictionJobOut(
-        job_id=job.id,
-        status=job.status,
-        summary=PredictionSummaryOut(
-            total_rows=0,
-            attack_rows=0,
-            attack_ratio=0.0,
-            top_class=None,
-            top_class_share=None,
-        ),
+@router.get("/batches/{batch_id}", response_model=PredictionBatchOut)
+async def get_prediction_batch(
+    batch_id: uuid.UUID,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    jobs = await fetch_jobs(
+        db,
+        user_jobs_select(user.id)
+        .where(InferenceJob.batch_id == batch_id)
+        .order_by(InferenceJob.created_at, InferenceJob.id),
+    )
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    items = [_list_item(job) for job in jobs]
+    counts = Counter(item.status for item in items)
+
+    return PredictionBatchOut(
+        batch_id=batch_id,
+        status=aggregate_status(counts),
+        total_jobs=len(items),
+        status_counts=dict(counts),
+        jobs=items,
     )
 
 
 @router.get("/jobs", response_model=list[PredictionJobListItemOut])
-def list_prediction_jobs(
+async def list_prediction_jobs(
+    response: Response,
     limit: int = 50,
     offset: int = 0,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
 ):
     """Return user's jobs for the dashboard/history.
 
+    Pagination: pass the X-Next-Cursor header of the previous page as `cursor`
+    (keyset on created_at, id - constant cost at any depth). `offset` is kept
+    for old clients and ignored when a cursor is given.
+
     Important: this route must be declared before /{job_id} to avoid "jobs" being
     captured by the UUID path parameter.
     """
@@ -107,132 +253,128 @@ def list_prediction_jobs(
     limit = max(1, min(int(limit), 200))
     offset = max(0, int(offset))
 
-    rows = (
-        db.query(InferenceJob, TrafficFile, PredictionSummary)
-        .join(TrafficFile, TrafficFile.id == InferenceJob.file_id)
-        .outerjoin(PredictionSummary, PredictionSummary.job_id == InferenceJob.id)
-        .filter(InferenceJob.user_id == user.id)
-        .order_by(InferenceJob.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+    jobs, next_cursor = await list_jobs_page(db, user.id, limit=limit, cursor=cursor, offset=offset)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    out: list[PredictionJobListItemOut] = []
-
-    for job, tf, summary in rows:
-        if summary:
-            total = int(summary.rows_scored or 0)
-            attack_rows = int(summary.attack_rows or 0)
-            attack_ratio = float(summary.attack_share or 0.0)
-
-            out_summary = PredictionSummaryOut(
-                total_rows=total,
-                attack_rows=attack_rows,
-                attack_ratio=attack_ratio,
-                top_class=summary.top_class,
-                top_class_share=float(summary.top_class_share)
-                if summary.top_class_share is not None
-                else None,
-            )
-        else:
-            out_summary = PredictionSummaryOut(
-                total_rows=0,
-                attack_rows=0,
-                attack_ratio=0.0,
-                top_class=None,
-                top_class_share=None,
-            )
+    return [_list_item(job) for job in jobs]
 
-        created_iso = job.created_at.isoformat() if getattr(job, "created_at", None) else None
 
-        out.append(
-            PredictionJobListItemOut(
-                job_id=job.id,
-                status=job.status,
-                summary=out_summary,
-                created_at=created_iso,
-                original_filename=getattr(tf, "original_filename", None),
-            )
-        )
+@router.post("/status", response_model=list[PredictionJobStatusOut])
+async def get_prediction_statuses(
+    payload: PredictionStatusIn,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    """Statuses + summaries for many jobs in one round-trip (dashboard polling).
 
+    Unknown ids and jobs of other users are silently omitted; order follows the request.
+    """
+    if not payload.job_ids:
+        return []
+
+    jobs = await fetch_jobs(db, user_jobs_select(user.id).where(InferenceJob.id.in_(set(payload.job_ids))))
+    by_id = {job.id: job for job in jobs}
+
+    out: list[PredictionJobStatusOut] = []
+    for job_id in dict.fromkeys(payload.job_ids):
+        job = by_id.get(job_id)
+        if not job:
+            continue
+        out.append(PredictionJobStatusOut(**_list_item(job).model_dump(), error_message=_job_error(job)))
     return out
 
 
 @router.get("/{job_id}", response_model=PredictionJobOut)
-def get_prediction_job(
+async def get_prediction_job(
     job_id: uuid.UUID,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
 ):
-    job = (
-        db.query(InferenceJob)
-        .filter(InferenceJob.id == job_id, InferenceJob.user_id == user.id)
-        .first()
-    )
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+    job = await _get_user_job(db, user.id, job_id)
 
     # If failed, provide diagnostic in header (does not break response schema)
-    if job.status == "failed" and job.error_message:
-        # shorten header size a bit
-        msg = job.error_message.replace("\n", " ")[:800]
-        response.headers["X-Job-Error"] = msg
-
-    summary = db.query(PredictionSummary).filter(PredictionSummary.job_id == job.id).first()
-
-    if summary:
-        total = int(summary.rows_scored or 0)
-        attack_rows = int(summary.attack_rows or 0)
-        attack_ratio = float(summary.attack_share or 0.0)
-
-        out_summary = PredictionSummaryOut(
-            total_rows=total,
-            attack_rows=attack_rows,
-            attack_ratio=attack_ratio,
-            top_class=summary.top_class,
-            top_class_share=float(summary.top_class_share) if summary.top_class_share is not None else None,
-        )
-    else:
-        out_summary = PredictionSummaryOut(
-            total_rows=0,
-            attack_rows=0,
-            attack_ratio=0.0,
-            top_class=None,
-            top_class_share=None,
-        )
-
-    return PredictionJobOut(job_id=job.id, status=job.status, summary=out_summary)
+    error = _job_error(job)
+    if error:
+        response.headers["X-Job-Error"] = error
 
+    return PredictionJobOut(
+        job_id=job.id,
+        status=job.status,
+        summary=_summary_out(job.summary),
+        timings=job.timings,
+        model_version=_model_version(job),
+    )
 
-@router.get("/{job_id}/download")
-def download_scored_csv(
+
+@router.get("/{job_id}/timeline", response_model=PredictionTimelineOut)
+async def get_prediction_timeline(
     job_id: uuid.UUID,
-    db: Session = Depends(get_db),
+    resolution: int | None = Query(None, ge=1, description="seconds, a multiple of the stored resolution"),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user),
 ):
-    job = (
-        db.query(InferenceJob)
-        .filter(InferenceJob.id == job_id, InferenceJob.user_id == user.id)
-        .first()
+    """Attack timeline built by the worker while scoring; the scored file is not read."""
+    job = await _get_user_job(db, user.id, job_id)
+
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is not done (status={job.status})")
+
+    timeline = await db.get(PredictionTimeline, job.id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="No timeline for this job (no stime/ltime columns)")
+
+    b = timeline.buckets
+    start, step = timeline.start_ts, timeline.resolution_seconds
+    offsets, rows, attacks, counts = b["offsets"], b["rows"], b["attacks"], b["counts"]
+    if resolution is not None and resolution != step:
+        if resolution % step:
+            raise HTTPException(
+                status_code=400, detail=f"resolution must be a multiple of {step} seconds for this job"
+            )
+        start, offsets, (rows, attacks, counts) = rebucket(offsets, start, step, resolution, rows, attacks, counts)
+        step = resolution
+
+    return PredictionTimelineOut(
+        job_id=job.id,
+        resolution_seconds=step,
+        classes=timeline.classes,
+        untimed_rows=timeline.untimed_rows,
+        buckets=[
+            TimelineBucketOut(start=start + off * step, rows=r, attack_rows=a, class_counts=c)
+            for off, r, a, c in zip(offsets, rows, attacks, counts)
+        ],
     )
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+
+
+@router.get("/{job_id}/download")
+async def download_scored_csv(
+    job_id: uuid.UUID,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    job = await _get_user_job(db, user.id, job_id)
 
     if job.status != "done":
         raise HTTPException(status_code=409, detail=f"Job is not done (status={job.status})")
 
-    summary = db.query(PredictionSummary).filter(PredictionSummary.job_id == job.id).first()
+    summary = job.summary
     if not summary or not summary.scored_path:
         raise HTTPException(status_code=404, detail="Scored file not found")
 
-    if not os.path.exists(summary.scored_path):
+    if summary.scored_state == EXPIRED:
+        raise HTTPException(status_code=410, detail="Scored file was removed by the retention policy")
+
+    download = scored_download(summary, job.file)
+    if not await run_in_threadpool(lambda: all(os.path.exists(p) for p in download.sources)):
         raise HTTPException(status_code=404, detail="Scored file missing on disk (uploads volume?)")
 
-    filename = os.path.basename(summary.scored_path)
-    return FileResponse(
-        path=summary.scored_path,
-        media_type="text/csv",
-        filename=filename,
+    # served in the upload's compression, whatever the storage manager did at rest
+    if download.path is not None:
+        return FileResponse(path=download.path, media_type=download.media_type, filename=download.filename)
+    return StreamingResponse(
+        download.chunks,
+        media_type=download.media_type,
+        headers={"Content-Disposition": _content_disposition(download.filename)},
     )
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_db, get_current_user
+from app.schemas.stats import DailyStatsOut, DailyStatsPageOut
+from app.services.rollups import daily_stats
+
+router = APIRouter()
+
+
+@router.get("/daily", response_model=DailyStatsPageOut)
+async def get_daily_stats(
+    days: int = Query(7, ge=1, le=366),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    """Rows, attacks, classes and jobs per day for the last `days` days.
+
+    Served from the rollup tables the worker maintains: cost grows with
+    `days`, not with the number of jobs.
+    """
+    until = datetime.now(timezone.utc).date()
+    stats, classes = await daily_stats(db, user.id, days, today=until)
+
+    out = []
+    totals = DailyStatsOut()
+    for row in stats:
+        item = DailyStatsOut(
+            day=row.day,
+            jobs_done=row.jobs_done,
+            jobs_failed=row.jobs_failed,
+            rows_scored=row.rows_scored,
+            attack_rows=row.attack_rows,
+            class_counts=classes.get(row.day, {}),
+        )
+        out.append(item)
+        totals.jobs_done += item.jobs_done
+        totals.jobs_failed += item.jobs_failed
+        totals.rows_scored += item.rows_scored
+        totals.attack_rows += item.attack_rows
+        for name, n in item.class_counts.items():
+            totals.class_counts[name] = totals.class_counts.get(name, 0) + n
+
+    return DailyStatsPageOut(since=until - timedelta(days=days - 1), until=until, days=out, totals=totals)
@@ -0,0 +1,565 @@
+"""Packet captures (pcap, pcapng) and flow exports (NetFlow v5/v9, IPFIX) -> flows.
+
+Files are read as a stream (compressed .gz/.zst too, see formats.open_read).
+Only the record framing is walked in Python; headers are decoded with numpy
+over whole chunks: packet offsets are collected per chunk, then link / IP /
+port fields are gathered for all packets at once. Export data sets with a
+fixed-size template are viewed as numpy structured arrays.
+
+Scope: IPv4/IPv6 over Ethernet (+ one VLAN tag), Linux cooked (SLL, SLL2),
+raw IP and BSD loopback links. IPv6 extension headers are not walked (the
+port fields of such packets stay 0). NetFlow/IPFIX files are a plain
+sequence of export messages as sent by the exporter (e.g. IPFIX files, RFC
+5655, or a dump of the collector's UDP payloads); export traffic captured
+inside a pcap is treated as ordinary packets.
+"""
+from __future__ import annotations
+
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.flows import FlowAggregator, ipv4_to_lo
+from app.core.formats import capture_kind, open_read
+
+# capture bytes (decompressed) framed per step
+_CHUNK = 16 * 1024 * 1024
+# export records buffered before they are handed to the aggregator
+_EXPORT_BATCH = 200_000
+
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_PCAPNG_MAGIC = b"\x0a\x0d\x0d\x0a"
+
+# link types (LINKTYPE_*)
+_LINK_NULL, _LINK_ETHERNET, _LINK_RAW, _LINK_LOOP, _LINK_SLL, _LINK_SLL2 = 0, 1, 101, 108, 113, 276
+_RAW_LINKS = (_LINK_RAW, 12, 14, 228, 229)
+
+_PORT_PROTOS = (6, 17, 132)
+
+
+class CaptureError(ValueError):
+    pass
+
+
+def read_capture_flows(path: str, record_seconds: float, idle_timeout: float) -> Tuple[pd.DataFrame, int]:
+    """BoT-IoT flow frame of a capture / export file. Returns (flows, packets seen)."""
+    kind = capture_kind(path)
+    try:
+        return _read_flows(path, kind, record_seconds, idle_timeout)
+    except struct.error as e:
+        raise CaptureError(f"truncated or broken record: {e}")
+
+
+def _read_flows(path: str, kind: Optional[str], record_seconds: float, idle_timeout: float) -> Tuple[pd.DataFrame, int]:
+    with open_read(path) as f:
+        magic = f.read(4)
+        if kind == "pcap":
+            agg = FlowAggregator(record_seconds, idle_timeout, merge=True)
+            if magic == _PCAPNG_MAGIC:
+                chunks = _pcapng_chunks(f, magic)
+            elif magic in _PCAP_MAGIC:
+                chunks = _pcap_chunks(f, magic)
+            else:
+                raise CaptureError("not a pcap/pcapng file (bad magic)")
+            for buf, off, caplen, wirelen, ts, link in chunks:
+                agg.add_packets(**_decode_packets(buf, off, caplen, wirelen, ts, link))
+        elif kind == "netflow":
+            agg = FlowAggregator(record_seconds, idle_timeout, merge=False)
+            for batch in _ExportReader(f, magic).batches():
+                agg.add_records(**batch)
+        else:
+            raise CaptureError(f"not a capture file: {path}")
+    return agg.finish(), agg.packets
+
+
+# ---------- packet framing ----------
+
+_Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _chunk_arrays(buf: bytes, off: List[int], caplen: List[int], wirelen: List[int], ts: List[float], link: List[int]) -> _Chunk:
+    # zero padding: header gathers of truncated packets stay inside the array
+    data = np.frombuffer(buf + bytes(128), dtype=np.uint8)
+    return (
+        data,
+        np.asarray(off, dtype=np.int64),
+        np.asarray(caplen, dtype=np.int64),
+        np.asarray(wirelen, dtype=np.int64),
+        np.asarray(ts, dtype=np.float64),
+        np.asarray(link, dtype=np.int64),
+    )
+
+
+def _pcap_chunks(f: BinaryIO, magic: bytes) -> Iterator[_Chunk]:
+    endian, scale = _PCAP_MAGIC[magic]
+    header = f.read(20)
+    if len(header) < 20:
+        raise CaptureError("truncated pcap header")
+    linktype = struct.unpack(endian + "I", header[16:20])[0] & 0xFFFF
+    incl_at = struct.Struct(endian + "I").unpack_from
+    u32 = np.dtype(endian + "u4")
+
+    tail = b""
+    while True:
+        block = f.read(_CHUNK)
+        buf = tail + block
+        # only the framing is sequential; the other header fields are read below for all records
+        heads: List[int] = []
+        append = heads.append
+        pos, end = 0, len(buf)
+        while pos + 16 <= end:
+            nxt = pos + 16 + incl_at(buf, pos + 8)[0]
+            if nxt > end:
+                break
+            append(pos)
+            pos = nxt
+        tail = buf[pos:]
+        if heads:
+            at = np.asarray(heads, dtype=np.int64)
+            fields = np.frombuffer(buf, dtype=np.uint8)
+            hdr = fields[at[:, None] + np.arange(16)].copy().view(u32)  # (n, 4): sec, frac, incl, orig
+            data = np.frombuffer(buf + bytes(128), dtype=np.uint8)
+            ts = hdr[:, 0].astype(np.float64) + hdr[:, 1] * scale
+            yield (
+                data,
+                at + 16,
+                hdr[:, 2].astype(np.int64),
+                hdr[:, 3].astype(np.int64),
+                ts,
+                np.full(len(at), linktype, dtype=np.int64),
+            )
+        if not block:
+            # a cut-off last packet (capture still running) is dropped
+            return
+
+
+def _pcapng_chunks(f: BinaryIO, magic: bytes) -> Iterator[_Chunk]:
+    endian = "<"
+    interfaces: List[Tuple[int, float]] = []  # (linktype, seconds per tick)
+
+    tail = magic
+    while True:
+        block = f.read(_CHUNK)
+        buf = tail + block
+        off: List[int] = []
+        caplen: List[int] = []
+        wirelen: List[int] = []
+        ts: List[float] = []
+        link: List[int] = []
+        pos, end = 0, len(buf)
+        while pos + 12 <= end:
+            if buf[pos : pos + 4] == _PCAPNG_MAGIC:
+                # section header: byte order from its magic, interfaces restart
+                endian = "<" if buf[pos + 8 : pos + 12] == b"\x4d\x3c\x2b\x1a" else ">"
+                interfaces = []
+            btype, blen = struct.unpack_from(endian + "II", buf, pos)
+            if blen < 12:
+                raise CaptureError(f"broken pcapng block at byte {pos}")
+            if pos + blen > end:
+                break
+            if btype == 1:  # interface description
+                linktype = struct.unpack_from(endian + "H", buf, pos + 8)[0]
+                interfaces.append((linktype, _pcapng_tsresol(buf, pos + 16, pos + blen - 4, endian)))
+            elif btype == 6:  # enhanced packet
+                iface, ts_hi, ts_lo, incl, orig = struct.unpack_from(endian + "IIIII", buf, pos + 8)
+                if iface < len(interfaces):
+                    linktype, tick = interfaces[iface]
+                    off.append(pos + 28)
+                    caplen.append(incl)
+                    wirelen.append(orig)
+                    ts.append(((ts_hi << 32) | ts_lo) * tick)
+                    link.append(linktype)
+            pos += blen
+        tail = buf[pos:]
+        if off:
+            yield _chunk_arrays(buf, off, caplen, wirelen, ts, link)
+        if not block:
+            return
+
+
+def _pcapng_tsresol(buf: bytes, pos: int, end: int, endian: str) -> float:
+    """if_tsresol option of an interface block (default: microseconds)."""
+    while pos + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, pos)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = buf[pos + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        pos += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+# ---------- vectorized header decoding ----------
+
+
+def _u16(b: np.ndarray, i: np.ndarray) -> np.ndarray:
+    return (b[i].astype(np.uint32) << 8) | b[i + 1]
+
+
+def _u32(b: np.ndarray, i: np.ndarray) -> np.ndarray:
+    return (_u16(b, i) << 16) | _u16(b, i + 2)
+
+
+def _u64(b: np.ndarray, i: np.ndarray) -> np.ndarray:
+    return (_u32(b, i).astype(np.uint64) << np.uint64(32)) | _u32(b, i + 4).astype(np.uint64)
+
+
+def _decode_packets(
+    b: np.ndarray, off: np.ndarray, caplen: np.ndarray, wirelen: np.ndarray, ts: np.ndarray, link: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """IP 5-tuple + wire length of every packet of a chunk; non-IP packets are dropped."""
+    end = off + caplen
+
+    # link layer -> start of the IP header, ethertype where the link has one
+    eth_type = _u16(b, off + 12)
+    vlan = (eth_type == 0x8100) | (eth_type == 0x88A8)
+    eth_l3 = np.where(vlan, off + 18, off + 14)
+    eth_type = np.where(vlan, _u16(b, off + 16), eth_type)
+
+    is_eth = link == _LINK_ETHERNET
+    is_sll = link == _LINK_SLL
+    is_sll2 = link == _LINK_SLL2
+    is_raw = np.isin(link, _RAW_LINKS)
+    is_null = (link == _LINK_NULL) | (link == _LINK_LOOP)
+
+    l3 = np.select([is_eth, is_sll, is_sll2, is_raw, is_null], [eth_l3, off + 16, off + 20, off, off + 4], -1)
+    l3 = np.where(l3 < 0, off, l3)
+    ether = np.select([is_eth, is_sll, is_sll2], [eth_type, _u16(b, off + 14), _u16(b, off)], 0)
+    version = b[l3] >> 4
+    typed = is_eth | is_sll | is_sll2
+    v4 = (version == 4) & np.where(typed, ether == 0x0800, is_raw | is_null) & (l3 + 20 <= end)
+    v6 = (version == 6) & np.where(typed, ether == 0x86DD, is_raw | is_null) & (l3 + 40 <= end)
+
+    keep = v4 | v6
+    b_l3 = l3[keep]
+    k4 = v4[keep]
+    k_end = end[keep]
+
+    proto = np.where(k4, b[b_l3 + 9], b[b_l3 + 6]).astype(np.int16)
+    ihl = (b[b_l3] & 15).astype(np.int64) * 4
+    l4 = np.where(k4, b_l3 + ihl, b_l3 + 40)
+    # fragments after the first carry no ports
+    first_fragment = ~k4 | ((_u16(b, b_l3 + 6) & 0x1FFF) == 0)
+
+    s_hi = np.where(k4, np.uint64(0), _u64(b, b_l3 + 8))
+    s_lo = np.where(k4, ipv4_to_lo(_u32(b, b_l3 + 12)), _u64(b, b_l3 + 16))
+    d_hi = np.where(k4, np.uint64(0), _u64(b, b_l3 + 24))
+    d_lo = np.where(k4, ipv4_to_lo(_u32(b, b_l3 + 16)), _u64(b, b_l3 + 32))
+
+    has_ports = np.isin(proto, _PORT_PROTOS) & first_fragment & (l4 + 4 <= k_end)
+    l4 = np.where(has_ports, l4, b_l3)
+    sport = np.where(has_ports, _u16(b, l4), 0)
+    dport = np.where(has_ports, _u16(b, l4 + 2), 0)
+
+    return {
+        "ts": ts[keep],
+        "proto": proto,
+        "s_hi": s_hi,
+        "s_lo": s_lo,
+        "sport": sport,
+        "d_hi": d_hi,
+        "d_lo": d_lo,
+        "dport": dport,
+        "length": wirelen[keep],
+    }
+
+
+# ---------- NetFlow v5 / v9 / IPFIX ----------
+
+_V5_HEADER = struct.Struct(">HHIIIIBBH")
+_V5_RECORD = np.dtype(
+    [
+        ("src", ">u4"), ("dst", ">u4"), ("nexthop", ">u4"), ("input", ">u2"), ("output", ">u2"),
+        ("pkts", ">u4"), ("octets", ">u4"), ("first", ">u4"), ("last", ">u4"),
+        ("sport", ">u2"), ("dport", ">u2"), ("pad1", "u1"), ("tcp_flags", "u1"), ("proto", "u1"),
+        ("tos", "u1"), ("src_as", ">u2"), ("dst_as", ">u2"), ("src_mask", "u1"), ("dst_mask", "u1"),
+        ("pad2", ">u2"),
+    ]
+)
+_V9_HEADER = struct.Struct(">HHIIII")
+_IPFIX_HEADER = struct.Struct(">HHIII")
+
+# information elements (same numbers in v9 and IPFIX)
+_IE_BYTES, _IE_PKTS, _IE_PROTO, _IE_SPORT, _IE_SRC4, _IE_DPORT, _IE_DST4 = 1, 2, 4, 7, 8, 11, 12
+_IE_LAST_UP, _IE_FIRST_UP, _IE_SRC6, _IE_DST6 = 21, 22, 27, 28
+_IE_BYTES_TOTAL, _IE_PKTS_TOTAL = 85, 86
+_IE_START_S, _IE_END_S, _IE_START_MS, _IE_END_MS = 150, 151, 152, 153
+_VARLEN = 65535
+
+_Template = List[Tuple[int, int]]  # (element id or -1 for enterprise / unknown, length)
+
+
+class _ExportReader:
+    """Sequential reader of export messages; templates are kept per (domain, template id).
+
+    v9 messages carry no length: a flowset id 5/9/10 where the next flowset
+    would start (ids 2-255 are reserved) is the next message's version.
+    """
+
+    def __init__(self, f: BinaryIO, head: bytes) -> None:
+        self._f = f
+        self._buf = head
+        self._templates: Dict[Tuple[int, int], _Template] = {}
+        self._parts: List[Dict[str, np.ndarray]] = []
+        self._pending = 0
+
+    def _read(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            block = self._f.read(max(n - len(self._buf), 1024 * 1024))
+            if not block:
+                break
+            self._buf += block
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+    def _peek16(self) -> Optional[int]:
+        head = self._read(2)
+        self._buf = head + self._buf
+        return struct.unpack(">H", head)[0] if len(head) == 2 else None
+
+    def _exact(self, n: int) -> bytes:
+        data = self._read(n)
+        if len(data) < n:
+            raise CaptureError("truncated export message")
+        return data
+
+    def batches(self) -> Iterator[Dict[str, np.ndarray]]:
+        while True:
+            version = self._peek16()
+            if version is None:
+                break
+            if version == 5:
+                self._v5()
+            elif version == 9:
+                self._v9()
+            elif version == 10:
+                self._ipfix()
+            else:
+                raise CaptureError(f"unsupported export version {version}")
+            if self._pending >= _EXPORT_BATCH:
+                yield self._flush()
+        if self._pending:
+            yield self._flush()
+
+    def _flush(self) -> Dict[str, np.ndarray]:
+        parts, self._parts, self._pending = self._parts, [], 0
+        return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    def _add(self, **cols: np.ndarray) -> None:
+        self._parts.append(cols)
+        self._pending += len(cols["proto"])
+
+    # -- v5: fixed records --
+
+    def _v5(self) -> None:
+        _, count, uptime, secs, nsecs, _, _, _, _ = _V5_HEADER.unpack(self._exact(24))
+        rec = np.frombuffer(self._exact(count * _V5_RECORD.itemsize), dtype=_V5_RECORD)
+        boot = secs + nsecs * 1e-9 - uptime / 1000.0
+        zero = np.zeros(count, dtype=np.uint64)
+        self._add(
+            proto=rec["proto"].astype(np.int16),
+            s_hi=zero,
+            s_lo=ipv4_to_lo(rec["src"]),
+            sport=rec["sport"].astype(np.int32),
+            d_hi=zero,
+            d_lo=ipv4_to_lo(rec["dst"]),
+            dport=rec["dport"].astype(np.int32),
+            first=boot + rec["first"] / 1000.0,
+            last=boot + rec["last"] / 1000.0,
+            pkts=rec["pkts"].astype(np.int64),
+            nbytes=rec["octets"].astype(np.int64),
+        )
+
+    # -- v9 / IPFIX: template driven --
+
+    def _v9(self) -> None:
+        _, _, uptime, secs, _, source = _V9_HEADER.unpack(self._exact(20))
+        boot = secs - uptime / 1000.0
+        while True:
+            set_id = self._peek16()
+            if set_id is None or set_id in (5, 9, 10):
+                return
+            set_id, length = struct.unpack(">HH", self._exact(4))
+            if length < 4:
+                raise CaptureError("broken v9 flowset")
+            body = self._exact(length - 4)
+            if set_id == 0:
+                self._templates_v9(source, body, options=False)
+            elif set_id == 1:
+                self._templates_v9(source, body, options=True)
+            elif set_id >= 256:
+                self._data(source, set_id, body, boot, export_time=secs)
+
+    def _templates_v9(self, source: int, body: bytes, options: bool) -> None:
+        pos = 0
+        while pos + 4 <= len(body):
+            if options:
+                if pos + 6 > len(body):
+                    return
+                tid, scope_len, option_len = struct.unpack_from(">HHH", body, pos)
+                count = (scope_len + option_len) // 4
+                pos += 6
+            else:
+                tid, count = struct.unpack_from(">HH", body, pos)
+                pos += 4
+            if tid < 256 or pos + 4 * count > len(body):
+                return  # padding
+            fields = [struct.unpack_from(">HH", body, pos + 4 * i) for i in range(count)]
+            pos += 4 * count
+            # option scope/option ids are not flow fields
+            self._templates[(source, tid)] = [(-1 if options else int(i), int(n)) for i, n in fields]
+
+    def _ipfix(self) -> None:
+        _, length, export_time, _, domain = _IPFIX_HEADER.unpack(self._exact(16))
+        if length < 16:
+            raise CaptureError("broken IPFIX message")
+        body = self._exact(length - 16)
+        pos = 0
+        while pos + 4 <= len(body):
+            set_id, set_len = struct.unpack_from(">HH", body, pos)
+            if set_len < 4:
+                raise CaptureError("broken IPFIX set")
+            data = body[pos + 4 : pos + set_len]
+            if set_id in (2, 3):
+                self._templates_ipfix(domain, data, options=set_id == 3)
+            elif set_id >= 256:
+                self._data(domain, set_id, data, None, export_time=export_time)
+            pos += set_len
+
+    def _templates_ipfix(self, domain: int, body: bytes, options: bool) -> None:
+        pos = 0
+        while pos + 4 <= len(body):
+            tid, count = struct.unpack_from(">HH", body, pos)
+            pos += 6 if options else 4
+            if tid < 256:
+                return  # padding
+            fields: _Template = []
+            for _ in range(count):
+                ie, n = struct.unpack_from(">HH", body, pos)
+                pos += 4
+                if ie & 0x8000:
+                    pos += 4  # enterprise number: not a standard element
+                    ie = -1
+                fields.append((-1 if options else ie, n))
+            self._templates[(domain, tid)] = fields
+
+    def _data(self, domain: int, tid: int, body: bytes, boot: Optional[float], export_time: int) -> None:
+        template = self._templates.get((domain, tid))
+        if template is None:
+            return  # data before its template: dropped, as collectors do
+        if any(n == _VARLEN for _, n in template):
+            cols = _varlen_records(template, body)
+        else:
+            cols = _fixed_records(template, body)
+        if not cols or _IE_PROTO not in cols:
+            return
+
+        n = len(cols[_IE_PROTO])
+        v4 = _IE_SRC4 in cols and _IE_DST4 in cols
+        if not v4 and not (_IE_SRC6 in cols and _IE_DST6 in cols):
+            return
+        zero = np.zeros(n, dtype=np.uint64)
+
+        first, last = _times(cols, boot, export_time)
+        self._add(
+            proto=cols[_IE_PROTO].astype(np.int16),
+            s_hi=zero if v4 else cols[_IE_SRC6][0],
+            s_lo=ipv4_to_lo(cols[_IE_SRC4]) if v4 else cols[_IE_SRC6][1],
+            sport=cols.get(_IE_SPORT, zero).astype(np.int32),
+            d_hi=zero if v4 else cols[_IE_DST6][0],
+            d_lo=ipv4_to_lo(cols[_IE_DST4]) if v4 else cols[_IE_DST6][1],
+            dport=cols.get(_IE_DPORT, zero).astype(np.int32),
+            first=first,
+            last=last,
+            pkts=cols.get(_IE_PKTS, cols.get(_IE_PKTS_TOTAL, zero)).astype(np.int64),
+            nbytes=cols.get(_IE_BYTES, cols.get(_IE_BYTES_TOTAL, zero)).astype(np.int64),
+        )
+
+
+def _times(cols: Dict[int, np.ndarray], boot: Optional[float], export_time: int) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(cols[_IE_PROTO])
+    if _IE_START_MS in cols:
+        first = cols[_IE_START_MS] / 1000.0
+        last = cols.get(_IE_END_MS, cols[_IE_START_MS]) / 1000.0
+    elif _IE_START_S in cols:
+        first = cols[_IE_START_S].astype(np.float64)
+        last = cols.get(_IE_END_S, cols[_IE_START_S]).astype(np.float64)
+    elif _IE_FIRST_UP in cols:
+        up_first = cols[_IE_FIRST_UP].astype(np.float64)
+        up_last = cols.get(_IE_LAST_UP, cols[_IE_FIRST_UP]).astype(np.float64)
+        if boot is None:
+            # IPFIX sysUpTime without the exporter's init time: the newest end ~ export time
+            boot = export_time - up_last.max() / 1000.0
+        first, last = boot + up_first / 1000.0, boot + up_last / 1000.0
+    else:
+        first = last = np.full(n, float(export_time))
+    return np.asarray(first, dtype=np.float64), np.maximum(np.asarray(last, dtype=np.float64), first)
+
+
+def _field_dtype(n: int) -> str:
+    return f">u{n}" if n in (1, 2, 4, 8) else f"V{n}"
+
+
+def _column(values: np.ndarray, n: int):
+    """Integer column (or (hi, lo) for 16-byte addresses) from a structured-array field."""
+    if n in (1, 2, 4, 8):
+        return values.astype(np.uint64)
+    raw = np.frombuffer(values.tobytes(), dtype=np.uint8).reshape(-1, n)
+    if n == 16:
+        halves = raw.view(">u8")
+        return halves[:, 0].astype(np.uint64), halves[:, 1].astype(np.uint64)
+    # reduced-size encoding (RFC 7011 6.2): big-endian integer of n bytes
+    out = np.zeros(len(raw), dtype=np.uint64)
+    for k in range(min(n, 8)):
+        out = (out << np.uint64(8)) | raw[:, n - min(n, 8) + k].astype(np.uint64)
+    return out
+
+
+_WANTED = {
+    _IE_BYTES, _IE_PKTS, _IE_PROTO, _IE_SPORT, _IE_SRC4, _IE_DPORT, _IE_DST4, _IE_LAST_UP, _IE_FIRST_UP,
+    _IE_SRC6, _IE_DST6, _IE_BYTES_TOTAL, _IE_PKTS_TOTAL, _IE_START_S, _IE_END_S, _IE_START_MS, _IE_END_MS,
+}
+
+
+def _fixed_records(template: _Template, body: bytes) -> Dict[int, object]:
+    size = sum(n for _, n in template)
+    if size == 0 or len(body) < size:
+        return {}
+    dtype = np.dtype([(f"f{i}", _field_dtype(n)) for i, (_, n) in enumerate(template)])
+    rec = np.frombuffer(body, dtype=dtype, count=len(body) // size)  # the rest is padding
+    return {ie: _column(rec[f"f{i}"], n) for i, (ie, n) in enumerate(template) if ie in _WANTED}
+
+
+def _varlen_records(template: _Template, body: bytes) -> Dict[int, object]:
+    """Templates with variable-length fields: walked record by record (rare)."""
+    values: Dict[int, List[bytes]] = {ie: [] for ie, _ in template if ie in _WANTED}
+    pos = 0
+    min_size = sum(1 if n == _VARLEN else n for _, n in template)
+    while pos + min_size <= len(body):
+        for ie, n in template:
+            if n == _VARLEN:
+                n = body[pos]
+                pos += 1
+                if n == 255:
+                    n = struct.unpack_from(">H", body, pos)[0]
+                    pos += 2
+            if ie in values:
+                values[ie].append(body[pos : pos + n])
+            pos += n
+    out: Dict[int, object] = {}
+    for ie, items in values.items():
+        if not items:
+            continue
+        n = len(items[0])
+        if any(len(v) != n for v in items):
+            continue
+        out[ie] = _column(np.frombuffer(b"".join(items), dtype=_field_dtype(n)), n)
+    return out
@@ -1,9 +1,24 @@
 from __future__ import annotations
 
-from typing import Iterable, Optional, Tuple
+import io
+import itertools
+import mmap
+import os
+import re
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
+from app.core.formats import arrow_input, compression_of, iter_read, open_read, open_write, split_csv_name
+
+# bytes of CSV handled per step when streaming scored output
+_PASSTHROUGH_BLOCK = 16 * 1024 * 1024
+# CSV bytes per Arrow batch on the fast path
+_ARROW_BLOCK = 4 * 1024 * 1024
+
 
 def _guess_sep_from_header(header: str) -> Optional[str]:
     if ";" in header and header.count(";") >= 2:
@@ -13,6 +28,14 @@ def _guess_sep_from_header(header: str) -> Optional[str]:
     return None
 
 
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
+    if compression_of(path) is None:
+        return pd.read_csv(path, **kwargs)
+    # decompressed as a stream (pandas alone would need the zstandard package for .zst)
+    with open_read(path) as f:
+        return pd.read_csv(f, **kwargs)
+
+
 def read_csv_robust(
     path: str,
     expected_columns: Optional[Iterable[str]] = None,
@@ -32,7 +55,7 @@ def read_csv_robust(
     """
 
     # --- Try default first ---
-    df = pd.read_csv(path)
+    df = _read_csv(path)
     df.columns = [c.strip() for c in df.columns]
 
     used_sep = ","
@@ -42,7 +65,7 @@ def read_csv_robust(
         header = str(df.columns[0])
         sep = _guess_sep_from_header(header)
         if sep:
-            df = pd.read_csv(path, sep=sep)
+            df = _read_csv(path, sep=sep)
             df.columns = [c.strip() for c in df.columns]
             return df, sep
 
@@ -60,7 +83,7 @@ def read_csv_robust(
 
         for sep in [";", "\t"]:
             try:
-                d = pd.read_csv(path, sep=sep)
+                d = _read_csv(path, sep=sep)
                 d.columns = [c.strip() for c in d.columns]
                 sc = overlap(d)
                 if sc > best_score:
@@ -73,3 +96,563 @@ def read_csv_robust(
         return best_df, best_sep
 
     return df, used_sep
+
+
+# ---------- fast path: memory-mapped Arrow reader ----------
+
+
+@dataclass
+class NumericCsv:
+    """Selected columns of a CSV as one float32 matrix (column-major, rows x columns).
+
+    Columns missing from the file are zeros. Unparseable values are NaN, as
+    after pd.to_numeric(errors="coerce"). `times` is the requested time
+    column as float64 (epoch seconds need more than float32), if there is one.
+    """
+
+    matrix: np.ndarray
+    columns: List[str]
+    header: List[str]
+    sep: str
+    rows: int
+    times: Optional[np.ndarray] = None
+
+
+def _read_header_line(path: str) -> str:
+    with open_read(path) as f:
+        line = b""
+        while b"\n" not in line:
+            block = f.read(64 * 1024)
+            if not block:
+                break
+            line += block
+    return line.split(b"\n", 1)[0].decode("utf-8-sig", errors="replace").rstrip("\r")
+
+
+def sniff_csv_header(
+    path: str,
+    expected_columns: Optional[Iterable[str]] = None,
+) -> Tuple[str, List[str], List[str]]:
+    """Separator from the header line only, same choice as read_csv_robust.
+
+    Returns: (sep, stripped column names, raw column names)
+    """
+    header = _read_header_line(path)
+
+    def split(sep: str) -> List[str]:
+        return [c.strip('"') for c in header.split(sep)]
+
+    sep = ","
+    if "," not in header:
+        sep = _guess_sep_from_header(header) or ","
+    elif expected_columns is not None:
+        expected = set(str(c).strip() for c in expected_columns)
+        best = len(set(c.strip() for c in split(",")) & expected)
+        for candidate in [";", "\t"]:
+            score = len(set(c.strip() for c in split(candidate)) & expected)
+            if score > best:
+                best, sep = score, candidate
+
+    raw = split(sep)
+    return sep, [c.strip() for c in raw], raw
+
+
+def _release(mm: mmap.mmap, start: int, end: int) -> None:
+    """Drop already scanned pages of a read-only mapping from our RSS.
+
+    They stay in the page cache, so a later pass over the file is still cheap.
+    """
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    start -= start % mmap.PAGESIZE
+    end = min(end - end % mmap.PAGESIZE, len(mm))
+    if end > start:
+        mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+class _MappedSource(io.RawIOBase):
+    """Read-only file object over an mmap that drops pages once they are read.
+
+    Arrow pulls blocks from it; without the release every parsed page would
+    stay mapped and the RSS would grow to the file size.
+    """
+
+    def __init__(self, mm: mmap.mmap) -> None:
+        self._mm = mm
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._mm) if size is None or size < 0 else min(len(self._mm), self._pos + size)
+        data = self._mm[self._pos : end]
+        _release(self._mm, 0, self._pos)
+        self._pos = end
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _iter_blocks(path: str) -> Iterator[bytes]:
+    """Decompressed content of a .csv.gz/.csv.zst, block by block."""
+    return iter_read(path, _PASSTHROUGH_BLOCK)
+
+
+def _count_data_rows(path: str) -> int:
+    """Upper bound of the data rows: lines after the header (blank lines included)."""
+    if compression_of(path) is not None:
+        # one extra streaming decompression pass, memory stays flat
+        newlines, last = 0, b""
+        for block in _iter_blocks(path):
+            newlines += block.count(b"\n")
+            last = block[-1:]
+        if last and last != b"\n":
+            newlines += 1
+        return max(0, newlines - 1)
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    newlines = 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start in range(0, size, _PASSTHROUGH_BLOCK):
+            newlines += mm[start : start + _PASSTHROUGH_BLOCK].count(b"\n")
+            _release(mm, start, start + _PASSTHROUGH_BLOCK)
+        if mm[size - 1 : size] != b"\n":
+            newlines += 1
+    return max(0, newlines - 1)
+
+
+def _column_values(arr) -> np.ndarray:
+    import pyarrow as pa
+
+    if pa.types.is_floating(arr.type):
+        return arr.to_numpy(zero_copy_only=False)
+    return pd.to_numeric(pd.Series(arr.to_numpy(zero_copy_only=False)), errors="coerce").to_numpy()
+
+
+def _stream_into(
+    path: str,
+    sep: str,
+    matrix: np.ndarray,
+    columns: Sequence[str],
+    raw_by_name: Dict[str, str],
+    types: Dict[str, object],
+    time_raw: Optional[str] = None,
+    times: Optional[np.ndarray] = None,
+) -> int:
+    """Parse the file batch by batch straight into `matrix`; returns the row count.
+
+    Only one Arrow batch (a few MB of text) is alive at a time, so the
+    matrix is the only allocation that grows with the file.
+    """
+    from pyarrow import csv as pacsv
+
+    convert_options = pacsv.ConvertOptions(
+        include_columns=list(types),
+        column_types=types,
+        strings_can_be_null=True,
+    )
+    offset = 0
+    with ExitStack() as stack:
+        if compression_of(path) is not None:
+            # Arrow decompresses natively while parsing, no temp copy
+            source = stack.enter_context(arrow_input(path))
+        else:
+            f = stack.enter_context(open(path, "rb"))
+            source = _MappedSource(stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=_ARROW_BLOCK),
+            parse_options=pacsv.ParseOptions(delimiter=sep),
+            convert_options=convert_options,
+        )
+        for batch in reader:
+            n = batch.num_rows
+            if offset + n > matrix.shape[0]:
+                raise ValueError("more rows than lines in the file")
+            for j, name in enumerate(columns):
+                if name not in raw_by_name:
+                    continue
+                matrix[offset : offset + n, j] = _column_values(batch.column(raw_by_name[name]))
+            if time_raw is not None:
+                times[offset : offset + n] = _column_values(batch.column(time_raw))
+            offset += n
+    return offset
+
+
+def read_numeric_matrix(
+    path: str,
+    columns: Sequence[str],
+    expected_columns: Optional[Iterable[str]] = None,
+    time_columns: Sequence[str] = (),
+) -> Optional[NumericCsv]:
+    """Parse only `columns` of the CSV straight into a preallocated float32 matrix.
+
+    The first of `time_columns` found in the header is parsed in the same
+    pass into NumericCsv.times.
+
+    The file is memory-mapped and parsed by Arrow batch by batch, nothing
+    goes through per-cell Python objects and no full-size intermediate frame
+    exists: peak memory is about rows x len(columns) x 4 bytes plus one batch.
+    Returns None when pyarrow is not installed or Arrow cannot parse the
+    file - callers then use read_csv_robust.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+
+    sep, header, raw_header = sniff_csv_header(path, expected_columns)
+    raw_by_name = {name: raw for name, raw in zip(header, raw_header) if name in columns}
+    capacity = _count_data_rows(path)
+    time_raw = next((raw for name, raw in zip(header, raw_header) if name in time_columns), None)
+
+    # float32 everywhere (float64 for the time column); a column that fails float parsing (hex ports like
+    # 0x0303 in BoT-IoT) is re-read as strings and coerced, one retry per column
+    types: Dict[str, object] = {raw: pa.float32() for raw in raw_by_name.values()}
+    if time_raw is not None:
+        types[time_raw] = pa.float64()
+    for _ in range(len(types) + 1):
+        matrix = np.zeros((capacity, len(columns)), dtype=np.float32, order="F")
+        times = np.full(capacity, np.nan) if time_raw is not None else None
+        try:
+            rows = _stream_into(path, sep, matrix, columns, raw_by_name, types, time_raw, times)
+            break
+        except pa.ArrowInvalid as e:
+            m = re.search(r"column #(\d+)", str(e))
+            idx = int(m.group(1)) if m else -1
+            candidates = [lst[idx] for lst in (raw_header, list(types)) if 0 <= idx < len(lst)]
+            failed = next((c for c in candidates if types.get(c) in (pa.float32(), pa.float64())), None)
+            if failed is None:
+                return None
+            types[failed] = pa.string()
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if rows < capacity:
+        # blank lines: shrink to the parsed rows (one copy, rare)
+        matrix = np.asfortranarray(matrix[:rows])
+        times = times[:rows] if times is not None else None
+
+    return NumericCsv(matrix=matrix, columns=list(columns), header=header, sep=sep, rows=rows, times=times)
+
+
+def read_text_columns(path: str, names: Sequence[str], sep: str = ",") -> Dict[str, np.ndarray]:
+    """`names` of the CSV as arrays of raw strings (None for empty cells), by stripped name.
+
+    A narrow second pass for the non-numeric columns the fast path skips
+    (addresses, hex ports); names missing from the header are absent.
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+
+    raw_header = [c.strip('"') for c in _read_header_line(path).split(sep)]
+    raw_by_name = {raw.strip(): raw for raw in raw_header if raw.strip() in names}
+    if not raw_by_name:
+        return {}
+    source = arrow_input(path) if compression_of(path) is not None else path
+    table = pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=_ARROW_BLOCK),
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=list(raw_by_name.values()),
+            column_types={raw: pa.string() for raw in raw_by_name.values()},
+            strings_can_be_null=True,
+        ),
+    )
+    return {name: table.column(raw).to_numpy(zero_copy_only=False) for name, raw in raw_by_name.items()}
+
+
+def _line_blocks(path: str) -> Iterator[bytes]:
+    """File content as blocks of whole lines (~_PASSTHROUGH_BLOCK each).
+
+    Plain files are memory-mapped and released behind the cursor; compressed
+    ones are decompressed as a stream.
+    """
+    if compression_of(path) is not None:
+        tail = b""
+        for chunk in _iter_blocks(path):
+            buf = tail + chunk
+            cut = buf.rfind(b"\n") + 1
+            tail = buf[cut:]
+            if cut:
+                yield buf[:cut]
+        if tail:
+            yield tail
+        return
+
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        pos = 0
+        while pos < size:
+            end = mm.rfind(b"\n", pos, min(size, pos + _PASSTHROUGH_BLOCK)) + 1
+            if end <= pos:
+                end = mm.find(b"\n", pos) + 1 or size
+            block = mm[pos:end]
+            _release(mm, 0, end)
+            pos = end
+            yield block
+
+
+def _iter_joined(
+    src_path: str,
+    sep: str,
+    header: List[str],
+    extra_columns: List[str],
+    suffixes_for: Callable[[int, int], List[bytes]],
+) -> Iterator[bytes]:
+    """Raw input lines (comma separated) with per-row suffixes appended, no re-parsing.
+
+    suffixes_for(row, n) gives the suffixes of data rows row..row+n-1. Only
+    for files without quoting (and without commas when sep is not a comma),
+    so replacing the separator cannot split a field - ValueError otherwise.
+    Blank lines are dropped.
+    """
+    sep_b = sep.encode("utf-8")
+    blocks = _line_blocks(src_path)
+    try:
+        first = next(blocks, b"")
+        if not first:
+            raise ValueError("empty file")
+        # the header line is skipped (a new one is written)
+        head_end = first.find(b"\n") + 1 or len(first)
+        if b'"' in first[:head_end]:
+            raise ValueError("quoted header")
+
+        yield ",".join(header + extra_columns).encode("utf-8") + b"\n"
+        row = 0
+        for block in itertools.chain([first[head_end:]], blocks):
+            if b'"' in block or (sep != "," and b"," in block):
+                raise ValueError("quoted fields")
+            if sep != ",":
+                block = block.replace(sep_b, b",")
+            lines = [line for line in block.replace(b"\r", b"").split(b"\n") if line]
+            if not lines:
+                continue
+            yield b"\n".join(map(bytes.__add__, lines, suffixes_for(row, len(lines)))) + b"\n"
+            row += len(lines)
+    finally:
+        blocks.close()
+
+
+def _write_passthrough(
+    src_path: str,
+    dst_path: str,
+    sep: str,
+    header: List[str],
+    rows: int,
+    extra_columns: List[str],
+    codes: np.ndarray,
+    code_values: List[Tuple[object, ...]],
+) -> bool:
+    """Copy raw input lines and append the extra values (see _iter_joined).
+
+    Returns False if the file does not qualify or its data lines do not add
+    up to `rows`. Output is compressed like dst_path's suffix.
+    """
+    suffixes = [("," + ",".join(str(v) for v in values)).encode("utf-8") for values in code_values]
+    seen = [0]
+
+    def suffixes_for(row: int, n: int) -> List[bytes]:
+        if row + n > rows:
+            raise ValueError("more lines than parsed rows")
+        seen[0] = row + n
+        return [suffixes[c] for c in codes[row : row + n].tolist()]
+
+    tmp_path = dst_path + ".tmp"
+    try:
+        with open_write(tmp_path, like=dst_path) as out:
+            for chunk in _iter_joined(src_path, sep, header, extra_columns, suffixes_for):
+                out.write(chunk)
+        if seen[0] != rows:
+            raise ValueError("fewer lines than parsed rows")
+    except ValueError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    os.replace(tmp_path, dst_path)
+    return True
+
+
+# ---------- slim scored files: predictions only, raw columns re-joined on read ----------
+
+
+class _SlimRows:
+    """Sequential reader of the data lines of a slim predictions file."""
+
+    def __init__(self, path: str) -> None:
+        self._blocks = _line_blocks(path)
+        self._lines: List[bytes] = []
+        self._pos = 0
+        first = next(self._blocks, b"")
+        head_end = first.find(b"\n") + 1 or len(first)
+        self.columns = first[:head_end].decode("utf-8").strip().split(",")
+        self._push(first[head_end:])
+
+    def _push(self, block: bytes) -> None:
+        self._lines = self._lines[self._pos :] + [line for line in block.split(b"\n") if line]
+        self._pos = 0
+
+    def take(self, n: int) -> List[bytes]:
+        while len(self._lines) - self._pos < n:
+            block = next(self._blocks, None)
+            if block is None:
+                raise ValueError("slim file has fewer rows than the input")
+            self._push(block)
+        out = self._lines[self._pos : self._pos + n]
+        self._pos += n
+        return out
+
+    def exhausted(self) -> bool:
+        if self._pos < len(self._lines):
+            return False
+        return all(not line for block in self._blocks for line in block.split(b"\n"))
+
+    def close(self) -> None:
+        self._blocks.close()
+
+
+def read_header_columns(path: str, sep: str) -> List[str]:
+    """Stripped column names of the header line, split by `sep` (as sniff_csv_header)."""
+    header = _read_header_line(path)
+    return [c.strip('"').strip() for c in header.split(sep)]
+
+
+def iter_scored_csv(raw_path: str, slim_path: str, sep: str) -> Iterator[bytes]:
+    """Scored CSV rebuilt from the raw input + its slim predictions file, as a byte stream.
+
+    Byte-identical to the passthrough output it replaced (checked when the
+    slim file is made). ValueError if the two files do not line up.
+    """
+    slim = _SlimRows(slim_path)
+    try:
+        header = read_header_columns(raw_path, sep)
+        yield from _iter_joined(
+            raw_path, sep, header, slim.columns, lambda row, n: [b"," + line for line in slim.take(n)]
+        )
+        if not slim.exhausted():
+            raise ValueError("slim file has more rows than the input")
+    finally:
+        slim.close()
+
+
+def _same_bytes(a: Iterable[bytes], b: Iterable[bytes]) -> bool:
+    """Compare two byte streams with arbitrary block boundaries."""
+    a, b = iter(a), iter(b)
+    buf_a = buf_b = b""
+    while True:
+        if not buf_a:
+            buf_a = next(a, b"")
+        if not buf_b:
+            buf_b = next(b, b"")
+        if not buf_a or not buf_b:
+            return not buf_a and not buf_b
+        n = min(len(buf_a), len(buf_b))
+        if buf_a[:n] != buf_b[:n]:
+            return False
+        buf_a, buf_b = buf_a[n:], buf_b[n:]
+
+
+def write_slim_scored(raw_path: str, scored_path: str, slim_path: str, extra_count: int = 2) -> Optional[str]:
+    """Keep only the last `extra_count` columns of a scored CSV in slim_path.
+
+    The raw columns duplicate the input file, so they are dropped and
+    re-joined on download (iter_scored_csv). Done only when the rebuild is
+    byte-identical to scored_path - verified here by streaming both. Returns
+    the input separator to rebuild with, or None (nothing written) when the
+    scored file came from the pandas path (quoting, dropped columns, ...).
+    """
+    scored_header = _read_header_line(scored_path).strip()
+    sep = next(
+        (
+            s
+            for s in (",", ";", "\t")
+            if ",".join(read_header_columns(raw_path, s)) == scored_header.rsplit(",", extra_count)[0]
+        ),
+        None,
+    )
+    if sep is None:
+        return None
+
+    # the temp name keeps the suffix: the check below reads it back compressed
+    stem, suffix = split_csv_name(slim_path)
+    tmp_path = f"{stem}.tmp{suffix}"
+    try:
+        with open_write(tmp_path) as out:
+            for block in _line_blocks(scored_path):
+                lines = [line.rsplit(b",", extra_count) for line in block.split(b"\n") if line]
+                if any(len(parts) != extra_count + 1 for parts in lines):
+                    raise ValueError("short line")
+                out.write(b"".join(b",".join(parts[1:]) + b"\n" for parts in lines))
+        if not _same_bytes(iter_scored_csv(raw_path, tmp_path, sep), _iter_blocks(scored_path)):
+            raise ValueError("rebuild differs")
+    except ValueError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    os.replace(tmp_path, slim_path)
+    return sep
+
+
+def write_scored_csv(
+    src_path: str,
+    dst_path: str,
+    data: NumericCsv,
+    extra_columns: List[str],
+    codes: np.ndarray,
+    code_values: List[Tuple[object, ...]],
+    drop_columns: Iterable[str] = (),
+) -> None:
+    """Write the input rows plus `extra_columns` (comma separated, like before).
+
+    Row i gets the values code_values[codes[i]]. Raw lines are streamed
+    through when possible; files with `drop_columns`, quoting or odd line
+    structure go through pandas instead.
+    """
+    drop = [c for c in drop_columns if c in data.header]
+    if not drop and _write_passthrough(
+        src_path, dst_path, data.sep, data.header, data.rows, extra_columns, codes, code_values
+    ):
+        return
+
+    df = _read_csv(src_path, sep=data.sep)
+    df.columns = [c.strip() for c in df.columns]
+    if len(df) != data.rows:
+        raise ValueError(f"CSV re-read gave {len(df)} rows, expected {data.rows}")
+    if drop:
+        df = df.drop(columns=drop)
+    write_scored_frame(df, dst_path, extra_columns, codes, code_values)
+
+
+def write_scored_frame(
+    df: pd.DataFrame,
+    dst_path: str,
+    extra_columns: List[str],
+    codes: np.ndarray,
+    code_values: List[Tuple[object, ...]],
+) -> None:
+    """df plus `extra_columns` (row i gets code_values[codes[i]]) -> CSV."""
+    for k, name in enumerate(extra_columns):
+        df[name] = np.asarray([values[k] for values in code_values], dtype=object)[codes]
+    write_frame_csv(df, dst_path)
+
+
+def write_frame_csv(df: pd.DataFrame, path: str) -> None:
+    """df.to_csv, compressed like the path's suffix (.csv.gz / .csv.zst)."""
+    if compression_of(path) is None:
+        df.to_csv(path, index=False)
+        return
+    with open_write(path) as f:
+        df.to_csv(f, index=False, mode="wb")
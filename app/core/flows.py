@@ -0,0 +1,304 @@
+"""Flow aggregation for packet captures and flow exports (BoT-IoT / Argus style).
+
+Two levels, as Argus produced the BoT-IoT data:
+  - records: packets of one bidirectional 5-tuple within one FLOW_RECORD_SECONDS
+    interval (for NetFlow/IPFIX input, each export record is one record);
+  - flows: consecutive records of a 5-tuple, split after FLOW_IDLE_TIMEOUT_SECONDS
+    of silence. `mean/stddev/sum/min/max` are statistics of the record
+    durations, `rate/srate/drate` packets per second.
+
+The source side of a flow is the endpoint that sent its first packet.
+Everything is columnar (numpy / pandas groupby), packets are reduced to
+records chunk by chunk, so memory follows the number of records, not packets.
+
+Addresses are kept as two uint64 (IPv6 layout, IPv4 as ::ffff:a.b.c.d) and
+turned into strings only for the output frame.
+"""
+from __future__ import annotations
+
+import ipaddress
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+KEY = ["proto", "a_hi", "a_lo", "a_port", "b_hi", "b_lo", "b_port"]
+
+# output columns, BoT-IoT names and order (context columns are not model features)
+FLOW_COLUMNS = [
+    "pkSeqID", "stime", "proto", "saddr", "sport", "daddr", "dport", "pkts", "bytes", "ltime",
+    "dur", "mean", "stddev", "sum", "min", "max", "spkts", "dpkts", "sbytes", "dbytes",
+    "rate", "srate", "drate",
+]
+
+PROTO_NAMES = {1: "icmp", 2: "igmp", 6: "tcp", 17: "udp", 58: "ipv6-icmp", 132: "sctp"}
+
+V4_MAPPED = np.uint64(0xFFFF << 32)
+
+# pending record frames merged into one above this many rows
+_COMPACT_ROWS = 2_000_000
+
+
+def ipv4_to_lo(addr: np.ndarray) -> np.ndarray:
+    """IPv4 (uint32) -> low half of its ::ffff:a.b.c.d form."""
+    return addr.astype(np.uint64) | V4_MAPPED
+
+
+def _canonical(
+    proto: np.ndarray,
+    s_hi: np.ndarray,
+    s_lo: np.ndarray,
+    sport: np.ndarray,
+    d_hi: np.ndarray,
+    d_lo: np.ndarray,
+    dport: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Both directions of a conversation under one key: a = the lower endpoint."""
+    swap = (s_hi > d_hi) | ((s_hi == d_hi) & ((s_lo > d_lo) | ((s_lo == d_lo) & (sport > dport))))
+    return {
+        "proto": proto.astype(np.int16),
+        "a_hi": np.where(swap, d_hi, s_hi),
+        "a_lo": np.where(swap, d_lo, s_lo),
+        "a_port": np.where(swap, dport, sport).astype(np.int32),
+        "b_hi": np.where(swap, s_hi, d_hi),
+        "b_lo": np.where(swap, s_lo, d_lo),
+        "b_port": np.where(swap, sport, dport).astype(np.int32),
+        "_ab": ~swap,
+    }
+
+
+def directional_records(
+    proto: np.ndarray,
+    s_hi: np.ndarray,
+    s_lo: np.ndarray,
+    sport: np.ndarray,
+    d_hi: np.ndarray,
+    d_lo: np.ndarray,
+    dport: np.ndarray,
+    first: np.ndarray,
+    last: np.ndarray,
+    pkts: np.ndarray,
+    nbytes: np.ndarray,
+    bins: np.ndarray,
+) -> pd.DataFrame:
+    """Record frame from one-direction entries (packets or export records)."""
+    cols = _canonical(proto, s_hi, s_lo, sport, d_hi, d_lo, dport)
+    ab = cols.pop("_ab")
+    pkts = pkts.astype(np.int64)
+    nbytes = nbytes.astype(np.int64)
+    first = first.astype(np.float64)
+    zero = np.zeros(len(ab), dtype=np.int64)
+    cols.update(
+        bin=bins.astype(np.int64),
+        first_ab=np.where(ab, first, np.inf),
+        first_ba=np.where(ab, np.inf, first),
+        last=last.astype(np.float64),
+        pkts_ab=np.where(ab, pkts, zero),
+        pkts_ba=np.where(ab, zero, pkts),
+        bytes_ab=np.where(ab, nbytes, zero),
+        bytes_ba=np.where(ab, zero, nbytes),
+    )
+    return pd.DataFrame(cols)
+
+
+def merge_records(records: pd.DataFrame) -> pd.DataFrame:
+    """One row per (5-tuple, interval)."""
+    return records.groupby(KEY + ["bin"], sort=False, as_index=False).agg(
+        first_ab=("first_ab", "min"),
+        first_ba=("first_ba", "min"),
+        last=("last", "max"),
+        pkts_ab=("pkts_ab", "sum"),
+        pkts_ba=("pkts_ba", "sum"),
+        bytes_ab=("bytes_ab", "sum"),
+        bytes_ba=("bytes_ba", "sum"),
+    )
+
+
+def _addr_strings(hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+    v4 = (hi == 0) & ((lo >> np.uint64(32)) == np.uint64(0xFFFF))
+    out = np.empty(len(hi), dtype=object)
+    if v4.any():
+        a = lo[v4].astype(np.uint32)
+        parts = [((a >> np.uint32(s)) & np.uint32(255)).astype(str) for s in (24, 16, 8, 0)]
+        out[v4] = np.char.add(
+            np.char.add(np.char.add(parts[0], "."), np.char.add(parts[1], ".")),
+            np.char.add(np.char.add(parts[2], "."), parts[3]),
+        )
+    if (~v4).any():
+        pairs = pd.MultiIndex.from_arrays([hi[~v4], lo[~v4]])
+        uniq = pairs.unique()
+        text = {(h, l): str(ipaddress.IPv6Address((int(h) << 64) | int(l))) for h, l in uniq}
+        out[~v4] = [text[p] for p in pairs]
+    return out
+
+
+class FlowAggregator:
+    """Streaming aggregator: feed packet/record batches, finish() gives the flow frame.
+
+    merge=True for packets (records of one interval may come from several
+    chunks); export records are records already and are kept as they are.
+    """
+
+    def __init__(self, record_seconds: float, idle_timeout: float, merge: bool = True) -> None:
+        self.record_seconds = float(record_seconds)
+        self.idle_timeout = float(idle_timeout)
+        self.merge = merge
+        self.packets = 0
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+        self._compact_at = _COMPACT_ROWS
+        self._next_bin = 0
+
+    def add_packets(
+        self,
+        ts: np.ndarray,
+        proto: np.ndarray,
+        s_hi: np.ndarray,
+        s_lo: np.ndarray,
+        sport: np.ndarray,
+        d_hi: np.ndarray,
+        d_lo: np.ndarray,
+        dport: np.ndarray,
+        length: np.ndarray,
+    ) -> None:
+        if not len(ts):
+            return
+        self.packets += len(ts)
+        bins = np.floor(ts / self.record_seconds).astype(np.int64)
+        ones = np.ones(len(ts), dtype=np.int64)
+        records = directional_records(proto, s_hi, s_lo, sport, d_hi, d_lo, dport, ts, ts, ones, length, bins)
+        self._add(merge_records(records))
+
+    def add_records(
+        self,
+        proto: np.ndarray,
+        s_hi: np.ndarray,
+        s_lo: np.ndarray,
+        sport: np.ndarray,
+        d_hi: np.ndarray,
+        d_lo: np.ndarray,
+        dport: np.ndarray,
+        first: np.ndarray,
+        last: np.ndarray,
+        pkts: np.ndarray,
+        nbytes: np.ndarray,
+    ) -> None:
+        n = len(proto)
+        if not n:
+            return
+        self.packets += int(pkts.sum())
+        # unique bins: export records are never merged with each other
+        bins = np.arange(self._next_bin, self._next_bin + n, dtype=np.int64)
+        self._next_bin += n
+        self._add(directional_records(proto, s_hi, s_lo, sport, d_hi, d_lo, dport, first, last, pkts, nbytes, bins))
+
+    def _add(self, records: pd.DataFrame) -> None:
+        self._pending.append(records)
+        self._pending_rows += len(records)
+        if self.merge and self._pending_rows > self._compact_at and len(self._pending) > 1:
+            merged = merge_records(pd.concat(self._pending, ignore_index=True))
+            self._pending = [merged]
+            self._pending_rows = len(merged)
+            # many distinct records (scans): compact less often instead of on every batch
+            self._compact_at = max(_COMPACT_ROWS, 2 * len(merged))
+
+    def finish(self) -> pd.DataFrame:
+        if not self._pending:
+            return pd.DataFrame(columns=FLOW_COLUMNS)
+        records = pd.concat(self._pending, ignore_index=True)
+        self._pending = []
+        if self.merge:
+            records = merge_records(records)
+        return _flows(records, self.idle_timeout)
+
+
+def _flows(records: pd.DataFrame, idle_timeout: float) -> pd.DataFrame:
+    records["start"] = np.minimum(records["first_ab"].to_numpy(), records["first_ba"].to_numpy())
+    records = records.sort_values(KEY + ["start"], kind="stable", ignore_index=True)
+    n = len(records)
+
+    key_change = np.ones(n, dtype=bool)
+    for col in KEY:
+        values = records[col].to_numpy()
+        key_change[1:] &= values[1:] == values[:-1]
+    key_change = ~key_change
+    key_change[0] = True
+
+    # a flow ends after idle_timeout without packets (latest end so far vs next start)
+    start = records["start"].to_numpy()
+    last = records["last"].to_numpy()
+    seen_last = pd.Series(last).groupby(np.cumsum(key_change)).cummax().to_numpy()
+    new_flow = key_change.copy()
+    new_flow[1:] |= start[1:] - seen_last[:-1] > idle_timeout
+    idx = np.flatnonzero(new_flow)
+    counts = np.diff(np.append(idx, n))
+
+    rec_dur = np.maximum(last - start, 0.0)
+    dur_sum = np.add.reduceat(rec_dur, idx)
+    dur_mean = dur_sum / counts
+    dur_var = np.maximum(np.add.reduceat(rec_dur * rec_dur, idx) / counts - dur_mean * dur_mean, 0.0)
+
+    first_ab = np.minimum.reduceat(records["first_ab"].to_numpy(), idx)
+    first_ba = np.minimum.reduceat(records["first_ba"].to_numpy(), idx)
+    stime = np.minimum(first_ab, first_ba)
+    ltime = np.maximum.reduceat(last, idx)
+    sums = {c: np.add.reduceat(records[c].to_numpy(), idx) for c in ("pkts_ab", "pkts_ba", "bytes_ab", "bytes_ba")}
+
+    # source = side of the first packet
+    a_src = first_ab <= first_ba
+    key = {c: records[c].to_numpy()[idx] for c in KEY}
+    spkts = np.where(a_src, sums["pkts_ab"], sums["pkts_ba"])
+    dpkts = np.where(a_src, sums["pkts_ba"], sums["pkts_ab"])
+    sbytes = np.where(a_src, sums["bytes_ab"], sums["bytes_ba"])
+    dbytes = np.where(a_src, sums["bytes_ba"], sums["bytes_ab"])
+    pkts = spkts + dpkts
+    dur = ltime - stime
+    safe_dur = np.where(dur > 0, dur, np.inf)
+
+    proto = key["proto"]
+    names = np.array([PROTO_NAMES.get(int(p), str(int(p))) for p in range(256)], dtype=object)
+
+    out = pd.DataFrame(
+        {
+            "pkSeqID": np.arange(1, len(idx) + 1),
+            "stime": np.round(stime, 6),
+            "proto": names[np.clip(proto, 0, 255)],
+            "saddr": _addr_strings(np.where(a_src, key["a_hi"], key["b_hi"]), np.where(a_src, key["a_lo"], key["b_lo"])),
+            "sport": np.where(a_src, key["a_port"], key["b_port"]),
+            "daddr": _addr_strings(np.where(a_src, key["b_hi"], key["a_hi"]), np.where(a_src, key["b_lo"], key["a_lo"])),
+            "dport": np.where(a_src, key["b_port"], key["a_port"]),
+            "pkts": pkts,
+            "bytes": sbytes + dbytes,
+            "ltime": np.round(ltime, 6),
+            "dur": np.round(dur, 6),
+            "mean": np.round(dur_mean, 6),
+            "stddev": np.round(np.sqrt(dur_var), 6),
+            "sum": np.round(dur_sum, 6),
+            "min": np.round(np.minimum.reduceat(rec_dur, idx), 6),
+            "max": np.round(np.maximum.reduceat(rec_dur, idx), 6),
+            "spkts": spkts,
+            "dpkts": dpkts,
+            "sbytes": sbytes,
+            "dbytes": dbytes,
+            "rate": np.round(pkts / safe_dur, 6),
+            "srate": np.round(spkts / safe_dur, 6),
+            "drate": np.round(dpkts / safe_dur, 6),
+        },
+        columns=FLOW_COLUMNS,
+    )
+    # flows in time order, like a BoT-IoT export
+    out = out.sort_values("stime", kind="stable", ignore_index=True)
+    out["pkSeqID"] = np.arange(1, len(out) + 1)
+    return out
+
+
+def flow_matrix(flows: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """float32 column-major matrix of `columns`, as read_numeric_matrix gives for a CSV.
+
+    Columns the aggregator does not produce are zeros, text columns NaN.
+    """
+    matrix = np.zeros((len(flows), len(columns)), dtype=np.float32, order="F")
+    for j, name in enumerate(columns):
+        if name in flows.columns:
+            matrix[:, j] = pd.to_numeric(flows[name], errors="coerce").to_numpy(dtype=np.float32)
+    return matrix
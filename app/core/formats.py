@@ -0,0 +1,370 @@
+"""Upload file formats: plain and compressed CSV (.csv.gz, .csv.zst), captures, tables.
+
+Compressed uploads stay compressed on the uploads volume. Readers decompress
+them as a stream, so no decompressed temp copy is ever written, and the scored
+output keeps the input's compression. gzip uses the stdlib, zstd the codec
+bundled with pyarrow (no extra package).
+
+The storage manager recompresses cold plain files to .csv.zst at rest;
+downloads are then decompressed (or re-encoded) on the fly.
+
+Packet captures and flow exports (.pcap, .pcapng, .ipfix, ...; optionally
+.gz/.zst) are uploads too: the worker turns them into flows itself
+(app/core/captures.py) and writes the scored flows as CSV.
+
+Tables - Parquet, Arrow IPC and JSON lines (.jsonl may be .gz/.zst) - are
+read by app/core/tables.py and scored into a file of the same format.
+
+The suffix only suggests a format: detect_upload() looks at the magic bytes
+of the stored upload and renames it when the name lies (report.csv holding
+Parquet becomes report.parquet).
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import zlib
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+# suffix -> compression (longest suffixes first)
+CSV_SUFFIXES = {".csv.gz": "gzip", ".csv.zst": "zstd", ".csv": None}
+
+# capture suffix -> reader (app/core/captures.py); may be followed by .gz / .zst
+CAPTURE_SUFFIXES = {
+    ".pcap": "pcap",
+    ".pcapng": "pcap",
+    ".cap": "pcap",
+    ".ipfix": "netflow",
+    ".netflow": "netflow",
+    ".nflow": "netflow",
+}
+# table suffix -> reader (app/core/tables.py)
+TABLE_SUFFIXES = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+# compressed inside the file and read with random access: never .gz/.zst on top
+COLUMNAR_KINDS = ("parquet", "arrow")
+
+_COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+# suffix a renamed upload gets for its detected format
+_CANONICAL_SUFFIXES = {
+    "csv": ".csv",
+    "pcap": ".pcap",
+    "netflow": ".netflow",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "jsonl": ".jsonl",
+}
+
+MEDIA_TYPES = {None: "text/csv", "gzip": "application/gzip", "zstd": "application/zstd"}
+_KIND_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+    "jsonl": "application/x-ndjson",
+}
+
+_MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+# first bytes of the (decompressed) capture content
+_CAPTURE_MAGIC = {
+    "pcap": (b"\xd4\xc3\xb2\xa1", b"\xa1\xb2\xc3\xd4", b"\x4d\x3c\xb2\xa1", b"\xa1\xb2\x3c\x4d", b"\x0a\x0d\x0d\x0a"),
+    # export version: NetFlow v5, v9, IPFIX
+    "netflow": (b"\x00\x05", b"\x00\x09", b"\x00\x0a"),
+}
+# Parquet, Arrow IPC file, Arrow IPC stream (continuation marker)
+_TABLE_MAGIC = {"parquet": (b"PAR1",), "arrow": (b"ARROW1", b"\xff\xff\xff\xff")}
+
+_SNIFF_BYTES = 4096
+
+# codec of files compressed at rest by the storage manager
+AT_REST_COMPRESSION = "zstd"
+
+_STREAM_BLOCK = 1024 * 1024
+
+# scored output: favour speed, CSV still compresses ~5x (zstd uses Arrow's default level 1)
+GZIP_LEVEL = 1
+
+
+def split_csv_name(name: str) -> Tuple[str, Optional[str]]:
+    """(stem, suffix) for a supported CSV name, (name, None) otherwise."""
+    lower = name.lower()
+    for suffix in CSV_SUFFIXES:
+        if lower.endswith(suffix):
+            return name[: -len(suffix)], name[-len(suffix) :]
+    return name, None
+
+
+def is_csv_name(name: str) -> bool:
+    return split_csv_name(name)[1] is not None
+
+
+def _split_compression(name: str) -> Tuple[str, Optional[str]]:
+    lower = name.lower()
+    for suffix, compression in _COMPRESSION_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return name[: -len(suffix)], compression
+    return name, None
+
+
+def _split_suffix(name: str, suffixes) -> Tuple[str, Optional[str]]:
+    base = _split_compression(name)[0]
+    lower = base.lower()
+    for suffix in suffixes:
+        if lower.endswith(suffix):
+            return base[: -len(suffix)], base[-len(suffix) :]
+    return name, None
+
+
+def split_capture_name(name: str) -> Tuple[str, Optional[str]]:
+    """(stem, capture suffix) for x.pcap / x.pcap.gz / ..., (name, None) otherwise."""
+    return _split_suffix(name, CAPTURE_SUFFIXES)
+
+
+def split_table_name(name: str) -> Tuple[str, Optional[str]]:
+    """(stem, table suffix) for x.parquet / x.arrow / x.jsonl(.gz), (name, None) otherwise."""
+    stem, suffix = _split_suffix(name, TABLE_SUFFIXES)
+    if suffix and TABLE_SUFFIXES[suffix.lower()] in COLUMNAR_KINDS and _split_compression(name)[1]:
+        return name, None
+    return stem, suffix
+
+
+def capture_kind(name: str) -> Optional[str]:
+    """"pcap" / "netflow" for capture uploads, None for CSV and anything else."""
+    suffix = split_capture_name(name)[1]
+    return CAPTURE_SUFFIXES[suffix.lower()] if suffix else None
+
+
+def table_kind(name: str) -> Optional[str]:
+    """"parquet" / "arrow" / "jsonl" for table uploads, None otherwise."""
+    suffix = split_table_name(name)[1]
+    return TABLE_SUFFIXES[suffix.lower()] if suffix else None
+
+
+def is_columnar(name: str) -> bool:
+    return table_kind(name) in COLUMNAR_KINDS
+
+
+def upload_kind(name: str) -> Optional[str]:
+    """Format an upload name claims: "csv", a capture_kind() or a table_kind()."""
+    if is_csv_name(name):
+        return "csv"
+    return capture_kind(name) or table_kind(name)
+
+
+def is_upload_name(name: str) -> bool:
+    return upload_kind(name) is not None
+
+
+def upload_stem(name: str) -> str:
+    """Name without the format and compression suffixes (x.pcap.gz -> x)."""
+    stem, suffix = split_csv_name(name)
+    if suffix:
+        return stem
+    for suffixes in (CAPTURE_SUFFIXES, TABLE_SUFFIXES):
+        stem, suffix = _split_suffix(name, suffixes)
+        if suffix:
+            return stem
+    return _split_compression(name)[0]
+
+
+def compression_of(path: str) -> Optional[str]:
+    suffix = split_csv_name(path)[1]
+    if suffix:
+        return CSV_SUFFIXES[suffix.lower()]
+    if capture_kind(path) is not None or table_kind(path) is not None:
+        return _split_compression(path)[1]
+    return None
+
+
+def with_compression(name: str, compression: Optional[str]) -> str:
+    """Same upload name with the suffix of `compression` (x.csv.zst, x.pcap.gz; None -> plain)."""
+    if is_columnar(name):
+        if compression is not None:
+            raise ValueError(f"{name} is compressed internally, not as {compression}")
+        return name
+    if capture_kind(name) is not None or table_kind(name) is not None:
+        ext = next((s for s, c in _COMPRESSION_SUFFIXES.items() if c == compression), "")
+        return _split_compression(name)[0] + ext
+    stem = split_csv_name(name)[0]
+    suffix = next(s for s, c in CSV_SUFFIXES.items() if c == compression)
+    return stem + suffix
+
+
+def codec_available(compression: Optional[str]) -> bool:
+    if compression in (None, "gzip"):
+        return True
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False
+    return pa.Codec.is_available(compression)
+
+
+def media_type(name: str) -> str:
+    compression = compression_of(name)
+    if compression is not None:
+        return MEDIA_TYPES[compression]
+    return _KIND_MEDIA_TYPES.get(upload_kind(name) or "", MEDIA_TYPES[None])
+
+
+def _content_kind(head: bytes, claimed: Optional[str]) -> Optional[str]:
+    """Format of decompressed leading bytes; `claimed` breaks ties magic cannot."""
+    for kinds in (_TABLE_MAGIC, _CAPTURE_MAGIC):
+        for kind, magics in kinds.items():
+            # a NetFlow version is just two bytes: trusted only for flow export names
+            if kind == "netflow" and claimed != "netflow":
+                continue
+            if head.startswith(magics):
+                return kind
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if text.startswith(b"{"):
+        return "jsonl"
+    if claimed == "csv":
+        return "csv"
+    first_line = text.split(b"\n", 1)[0]
+    if text and b"\x00" not in head and any(sep in first_line for sep in (b",", b";", b"\t")):
+        return "csv"
+    return None
+
+
+def detect_upload(path: str, name: str) -> str:
+    """Upload name matching the stored file's content (magic bytes), e.g. for
+    x.csv holding gzipped JSON lines -> x.jsonl.gz; the name itself when it is right.
+
+    Raises ValueError when the content is no supported format.
+    """
+    with open(path, "rb") as f:
+        raw = f.read(4)
+    compression = next((c for c, magic in _MAGIC.items() if raw.startswith(magic)), None)
+    if not codec_available(compression):
+        raise ValueError(f"{compression} compression is not supported on this server")
+
+    try:
+        if compression is None:
+            with open(path, "rb") as f:
+                head = f.read(_SNIFF_BYTES)
+        elif compression == "gzip":
+            with gzip.open(path, "rb") as f:
+                head = f.read(_SNIFF_BYTES)
+        else:
+            import pyarrow as pa
+
+            with pa.input_stream(path, compression=compression) as f:
+                head = f.read(_SNIFF_BYTES)
+    except Exception as e:
+        raise ValueError(f"broken {compression} stream: {e}")
+
+    claimed = upload_kind(name)
+    kind = _content_kind(head, claimed)
+    if kind is None:
+        raise ValueError("unrecognized file format")
+    if kind in COLUMNAR_KINDS and compression is not None:
+        raise ValueError(f"{kind} must be uploaded as is, not {compression}-compressed")
+    if kind == claimed and compression == compression_of(name):
+        return name
+
+    ext = next((s for s, c in _COMPRESSION_SUFFIXES.items() if c == compression), "")
+    return upload_stem(name) + _CANONICAL_SUFFIXES[kind] + ext
+
+
+def open_read(path: str) -> BinaryIO:
+    """Binary stream of the (decompressed) CSV bytes."""
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, "rb")
+    if compression == "gzip":
+        return gzip.open(path, "rb")  # type: ignore[return-value]
+    import pyarrow as pa
+
+    return pa.input_stream(path, compression=compression)  # type: ignore[return-value]
+
+
+def arrow_input(path: str):
+    """pyarrow input stream with native (GIL-free) decompression, for compressed files."""
+    import pyarrow as pa
+
+    return pa.input_stream(path, compression=compression_of(path))
+
+
+def open_write(path: str, like: Optional[str] = None) -> BinaryIO:
+    """Binary writer compressing as `like` (default: as the path's own suffix)."""
+    compression = compression_of(like or path)
+    if compression is None:
+        return open(path, "wb")
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=GZIP_LEVEL)  # type: ignore[return-value]
+    import pyarrow as pa
+
+    return pa.CompressedOutputStream(pa.OSFile(path, "wb"), compression)  # type: ignore[return-value]
+
+
+def iter_read(path: str, block_size: int = _STREAM_BLOCK) -> Iterator[bytes]:
+    """Decompressed file content, block by block."""
+    with open_read(path) as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def iter_compress(blocks: Iterable[bytes], compression: Optional[str]) -> Iterator[bytes]:
+    """Compress a byte stream on the fly (downloads rebuilt from stored parts).
+
+    gzip is one member written incrementally; zstd is a sequence of frames,
+    one per block - valid for every zstd decoder.
+    """
+    if compression is None:
+        yield from blocks
+        return
+    if compression == "gzip":
+        z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for block in blocks:
+            out = z.compress(block)
+            if out:
+                yield out
+        yield z.flush()
+        return
+    import pyarrow as pa
+
+    codec = pa.Codec(compression)
+    for block in blocks:
+        if block:
+            yield codec.compress(block, asbytes=True)
+
+
+def compress_file(src_path: str, dst_path: str) -> int:
+    """Re-encode a CSV as dst_path's suffix (via a temp file). Returns the new size."""
+    tmp_path = dst_path + ".tmp"
+    try:
+        with open_read(src_path) as src, open_write(tmp_path, like=dst_path) as dst:
+            shutil.copyfileobj(src, dst, _STREAM_BLOCK)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, dst_path)
+    return os.path.getsize(dst_path)
+
+
+def scored_name(stored_name: str) -> str:
+    """<stem>_scored.csv with the input's compression suffix (captures: scored flows;
+    tables keep their format: x.parquet -> x_scored.parquet)."""
+    base = os.path.basename(stored_name)
+    if capture_kind(base) is not None:
+        stem = split_capture_name(base)[0]
+        return with_compression(f"{stem}_scored.csv", compression_of(base))
+    kind = table_kind(base)
+    if kind is not None:
+        stem = split_table_name(base)[0]
+        return with_compression(f"{stem}_scored{_CANONICAL_SUFFIXES[kind]}", compression_of(base))
+    stem, suffix = split_csv_name(base)
+    compressed = suffix[len(".csv") :].lower() if suffix else ""
+    return f"{stem}_scored.csv{compressed}"
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Iterable, List
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.cache import all_cache_stats
+
+# seconds buckets from ~1ms to ~30min: covers DB queries as well as 50M-row jobs
+_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_BYTES = tuple(float(1024 * 4**i) for i in range(12))  # 1 KiB .. 4 GiB
+_ROWS_PER_SEC = tuple(float(10**i) for i in range(2, 8)) + (3e7,)
+
+# ---------- API ----------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "clarus_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=_SECONDS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "clarus_db_query_duration_seconds",
+    "Latency of single SQL statements, by API route ('-' outside of requests)",
+    ["route"],
+    buckets=_SECONDS,
+)
+UPLOAD_BYTES = Histogram(
+    "clarus_upload_bytes",
+    "Size of stored uploads",
+    buckets=_BYTES,
+)
+PENDING_WORK_SECONDS = Gauge(
+    "clarus_pending_work_seconds",
+    "Estimated worker-seconds (job wall clock) of queued / running jobs (app/services/capacity.py), refreshed on scrape",
+    ["state"],
+)
+PENDING_JOBS = Gauge(
+    "clarus_pending_jobs",
+    "Queued / running jobs, refreshed on scrape",
+    ["state"],
+)
+ADMISSION_REJECTIONS_TOTAL = Counter(
+    "clarus_admission_rejections_total",
+    "Uploads refused by admission control (429 / 503), by the limit that was hit",
+    ["reason"],
+)
+
+# ---------- worker ----------
+
+JOB_STAGE_SECONDS = Histogram(
+    "clarus_job_stage_duration_seconds",
+    "Per-job time spent in a pipeline stage (read_csv, preprocess, infer_bin, infer_multi, write_scored, ...)",
+    ["stage"],
+    buckets=_SECONDS,
+)
+JOB_QUEUE_WAIT_SECONDS = Histogram(
+    "clarus_job_queue_wait_seconds",
+    "started_at - created_at",
+    buckets=_SECONDS,
+)
+JOB_RUNTIME_SECONDS = Histogram(
+    "clarus_job_runtime_seconds",
+    "finished_at - started_at",
+    buckets=_SECONDS,
+)
+JOB_ROWS_PER_SECOND = Histogram(
+    "clarus_job_rows_per_second",
+    "Scored rows / job runtime",
+    buckets=_ROWS_PER_SEC,
+)
+JOBS_TOTAL = Counter(
+    "clarus_jobs_total",
+    "Processed jobs by final status",
+    ["status"],
+)
+MODEL_RELOADS_TOTAL = Counter(
+    "clarus_model_reloads_total",
+    "Model manifest reloads that changed the resident bundles (ok) or failed (error)",
+    ["result"],
+)
+SHADOW_LABEL_AGREEMENT = Histogram(
+    "clarus_shadow_label_agreement",
+    "Share of sampled rows where the shadow model gives the primary's label",
+    ["shadow_version"],
+    buckets=(0.5, 0.8, 0.9, 0.95, 0.98, 0.99, 0.995, 0.999, 1.0),
+)
+SHADOW_OVERHEAD_RATIO = Histogram(
+    "clarus_shadow_overhead_ratio",
+    "Shadow scoring time / primary scoring time per job",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0),
+)
+
+
+# ---------- DB latency per route ----------
+
+# list of statement durations of the current request; the route template is only
+# known after routing, so the middleware labels them when the response is ready
+_db_timings: ContextVar[List[float] | None] = ContextVar("clarus_db_timings", default=None)
+
+
+def begin_request_db_timings() -> List[float]:
+    timings: List[float] = []
+    _db_timings.set(timings)
+    return timings
+
+
+def observe_request_db_timings(route: str, timings: Iterable[float]) -> None:
+    hist = DB_QUERY_SECONDS.labels(route=route)
+    for seconds in timings:
+        hist.observe(seconds)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach statement timing to a (sync) engine; for async use engine.sync_engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        conn.info.setdefault("clarus_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):  # noqa: ANN001
+        seconds = time.perf_counter() - conn.info["clarus_query_start"].pop()
+        timings = _db_timings.get()
+        if timings is not None:
+            timings.append(seconds)
+        else:
+            DB_QUERY_SECONDS.labels(route="-").observe(seconds)
+
+
+# ---------- in-process caches (app.core.cache) ----------
+
+class _CacheCollector:
+    def collect(self):
+        stats = all_cache_stats()
+
+        hits = CounterMetricFamily("clarus_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("clarus_cache_misses", "Cache misses", labels=["cache"])
+        evictions = CounterMetricFamily("clarus_cache_evictions", "LRU evictions", labels=["cache"])
+        size = GaugeMetricFamily("clarus_cache_entries", "Entries currently cached", labels=["cache"])
+
+        for name, s in stats.items():
+            hits.add_metric([name], s["hits"])
+            misses.add_metric([name], s["misses"])
+            evictions.add_metric([name], s["evictions"])
+            size.add_metric([name], s["size"])
+
+        yield from (hits, misses, evictions, size)
+
+
+REGISTRY.register(_CacheCollector())
@@ -0,0 +1,88 @@
+"""Model bundle manifest: which versions exist and which one is active.
+
+Layout under MODEL_DIR:
+
+    manifest.json   {"active": "2026-10-01", "versions": ["2026-09-01", "2026-10-01"]}
+    2026-09-01/     xgb_bin.json, xgb_multi.json, class_mapping.json, features_bin.json, features_multi.json
+    2026-10-01/     ...
+
+A version directory is immutable once listed; a rollout adds a directory and
+then replaces manifest.json atomically (write a tmp file + rename), so
+readers never see half a manifest. Without manifest.json the flat files in
+MODEL_DIR are the single version "default" (the original layout).
+
+Optional "shadow": "<version>" scores every job with that version too, on
+the same preprocessed features; only agreement stats are stored, users see
+the active (or pinned) version's output.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = "manifest.json"
+DEFAULT_VERSION = "default"
+
+# XGBBundle.load argument -> file name inside a version directory
+BUNDLE_FILES = {
+    "xgb_bin_path": "xgb_bin.json",
+    "xgb_multi_path": "xgb_multi.json",
+    "class_mapping_path": "class_mapping.json",
+    "features_bin_path": "features_bin.json",
+    "features_multi_path": "features_multi.json",
+}
+
+_VERSION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+@dataclass(frozen=True)
+class ModelManifest:
+    active: str
+    versions: Tuple[str, ...]
+    shadow: Optional[str] = None
+
+
+def is_valid_version(version: str) -> bool:
+    return bool(_VERSION_RE.match(version))
+
+
+def manifest_path(model_dir: str) -> str:
+    return os.path.join(model_dir, MANIFEST_NAME)
+
+
+def read_manifest(model_dir: str) -> Optional[ModelManifest]:
+    """None when there is no manifest; ValueError when it is malformed."""
+    path = manifest_path(model_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON: {e}")
+
+    active = str(raw.get("active") or "")
+    versions = tuple(dict.fromkeys(str(v) for v in raw.get("versions") or []))
+    shadow = str(raw.get("shadow") or "") or None
+    for v in (active, shadow):
+        if v and v not in versions:
+            versions += (v,)
+
+    bad = [v for v in versions if not is_valid_version(v)]
+    if not active or bad:
+        raise ValueError(f"{path}: needs 'active' and valid 'versions' (bad: {bad})")
+
+    return ModelManifest(active=active, versions=versions, shadow=shadow)
+
+
+def version_paths(model_dir: str, version: str) -> Dict[str, str]:
+    """XGBBundle.load kwargs for a version directory."""
+    return {arg: os.path.join(model_dir, version, name) for arg, name in BUNDLE_FILES.items()}
+
+
+def available_versions(model_dir: str) -> List[str]:
+    manifest = read_manifest(model_dir)
+    return list(manifest.versions) if manifest else [DEFAULT_VERSION]
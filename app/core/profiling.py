@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import Counter, deque
+from typing import Deque, Optional
+
+
+class StackSampler:
+    """Samples the stack of one thread every `interval` seconds.
+
+    Output is the "folded" format (`frame;frame;frame count` per line) that
+    flamegraph.pl, speedscope and inferno read directly.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.01) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class SlowJobProfiler:
+    """Profiles every job, keeps the dump only for the slowest `slowest_pct` %.
+
+    "Slowest" is relative to the runtimes of the last `window` jobs, so the
+    threshold follows the current load mix. Until `min_history` jobs are seen
+    nothing is dumped.
+    """
+
+    def __init__(self, out_dir: str, slowest_pct: float, interval: float = 0.01, window: int = 200,
+                 min_history: int = 20) -> None:
+        self.out_dir = out_dir
+        self.slowest_pct = slowest_pct
+        self.interval = interval
+        self.min_history = min_history
+        self.runtimes: Deque[float] = deque(maxlen=window)
+
+    def start(self) -> StackSampler:
+        return StackSampler(threading.get_ident(), self.interval).start()
+
+    def finish(self, sampler: StackSampler, job_id: str, runtime: float) -> Optional[str]:
+        sampler.stop()
+
+        history = sorted(self.runtimes)
+        self.runtimes.append(runtime)
+        if len(history) < self.min_history:
+            return None
+
+        idx = min(len(history) - 1, int(len(history) * (1.0 - self.slowest_pct / 100.0)))
+        if runtime < history[idx]:
+            return None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{job_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sampler.folded())
+        return path
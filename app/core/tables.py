@@ -0,0 +1,199 @@
+"""Table uploads: Parquet, Arrow IPC (file or stream) and JSON lines.
+
+No text parsing on the scoring side: only the feature columns are read
+(Parquet column projection, zero-copy slices of a memory-mapped Arrow file)
+and copied batch by batch into the same float32 matrix the CSV fast path
+builds, so for these formats the model is the bottleneck, not the reader.
+JSON lines are parsed by Arrow's multithreaded reader (pandas as a fallback
+for records whose types change between lines).
+
+The scored output has the input's format: every input column except the
+label columns, plus is_attack / attack_type, written batch by batch.
+"""
+from __future__ import annotations
+
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.csv_utils import NumericCsv
+from app.core.formats import arrow_input, compression_of, open_read, open_write, table_kind
+
+# rows per batch when streaming Parquet / re-batching Arrow tables
+_BATCH_ROWS = 256 * 1024
+
+
+def _read_jsonl(path: str):
+    import pyarrow as pa
+    from pyarrow import json as pajson
+
+    try:
+        source = arrow_input(path) if compression_of(path) is not None else path
+        return pajson.read_json(source)
+    except pa.ArrowInvalid:
+        # e.g. a field that is a number in one record and a string in another
+        with open_read(path) as f:
+            df = pd.read_json(f, lines=True, dtype=False)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _read_arrow(path: str):
+    """Whole IPC file or stream; memory-mapped, so zero-copy unless the buffers are compressed."""
+    import pyarrow as pa
+
+    source = pa.memory_map(path, "r")
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+
+_Batches = Callable[[List[str]], Iterator]
+
+
+def _open_table(path: str) -> Tuple[List[str], int, _Batches]:
+    """(column names, row count, batches(raw column names) -> record batches).
+
+    Parquet: names and rows come from the footer, batches decode only the
+    requested columns. Arrow / JSON lines: the table is loaded once here.
+    """
+    kind = table_kind(path)
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path, memory_map=True)
+
+        def parquet_batches(columns: List[str]) -> Iterator:
+            return pf.iter_batches(batch_size=_BATCH_ROWS, columns=columns, use_threads=True)
+
+        return list(pf.schema_arrow.names), pf.metadata.num_rows, parquet_batches
+
+    if kind == "arrow":
+        table = _read_arrow(path)
+    elif kind == "jsonl":
+        table = _read_jsonl(path)
+    else:
+        raise ValueError(f"not a table upload: {path}")
+
+    def table_batches(columns: List[str]) -> Iterator:
+        return iter(table.select(columns).to_batches(max_chunksize=_BATCH_ROWS))
+
+    return list(table.column_names), table.num_rows, table_batches
+
+
+def _to_float(arr) -> np.ndarray:
+    """Arrow column -> float values; nulls and non-numbers are NaN (like pd.to_numeric(errors="coerce"))."""
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    t = arr.type
+    if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t) or pa.types.is_decimal(t):
+        return arr.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(pd.Series(arr.to_numpy(zero_copy_only=False)), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def read_table_matrix(path: str, columns: Sequence[str], time_columns: Sequence[str] = ()) -> NumericCsv:
+    """`columns` of a Parquet / Arrow / JSON-lines upload as a float32 matrix.
+
+    Same contract as read_numeric_matrix: missing columns are zeros, header
+    names are stripped, the first of `time_columns` goes to `times`.
+    sep is "" (no text format).
+    """
+    names, rows, batches = _open_table(path)
+    header = [name.strip() for name in names]
+    raw_by_name = {name: raw for name, raw in zip(header, names) if name in columns}
+    wanted = [(j, raw_by_name[name]) for j, name in enumerate(columns) if name in raw_by_name]
+    time_raw = next((raw for name, raw in zip(header, names) if name in time_columns), None)
+
+    matrix = np.zeros((rows, len(columns)), dtype=np.float32, order="F")
+    times = np.full(rows, np.nan) if time_raw is not None else None
+    projection = [raw for _, raw in wanted] + ([time_raw] if time_raw is not None else [])
+    offset = 0
+    if projection:
+        for batch in batches(projection):
+            n = batch.num_rows
+            for k, (j, _) in enumerate(wanted):
+                matrix[offset : offset + n, j] = _to_float(batch.column(k))
+            if time_raw is not None:
+                times[offset : offset + n] = _to_float(batch.column(len(wanted)))
+            offset += n
+        if offset != rows:
+            raise ValueError(f"read {offset} rows, the file declares {rows}")
+
+    return NumericCsv(matrix=matrix, columns=list(columns), header=header, sep="", rows=rows, times=times)
+
+
+def read_table_columns(path: str, names: Sequence[str]) -> Dict[str, np.ndarray]:
+    """`names` of a table upload as numpy arrays (object for strings), by stripped name."""
+    columns, _, batches = _open_table(path)
+    raw_by_name = {raw.strip(): raw for raw in columns if raw.strip() in names}
+    if not raw_by_name:
+        return {}
+    parts: Dict[str, list] = {name: [] for name in raw_by_name}
+    for batch in batches(list(raw_by_name.values())):
+        for k, name in enumerate(raw_by_name):
+            parts[name].append(batch.column(k).to_numpy(zero_copy_only=False))
+    return {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=object) for name, chunks in parts.items()}
+
+
+def _extra_arrays(extra_columns: List[str], code_values: List[Tuple[object, ...]]) -> list:
+    import pyarrow as pa
+
+    return [pa.array([values[k] for values in code_values]) for k in range(len(extra_columns))]
+
+
+def write_scored_table(
+    src_path: str,
+    dst_path: str,
+    rows: int,
+    extra_columns: List[str],
+    codes: np.ndarray,
+    code_values: List[Tuple[object, ...]],
+    drop_columns: Iterable[str] = (),
+) -> None:
+    """The upload's rows plus `extra_columns` (row i gets code_values[codes[i]]),
+    in dst_path's format. Streams batches: Parquet row groups are written as
+    they are read, nothing holds the whole output."""
+    import pyarrow as pa
+
+    names, _, batches = _open_table(src_path)
+    drop = set(drop_columns) | set(extra_columns)
+    keep = [raw for raw in names if raw.strip() not in drop]
+    dictionaries = _extra_arrays(extra_columns, code_values)
+    kind = table_kind(dst_path)
+
+    offset = 0
+    with ExitStack() as stack:
+        writer = None
+        sink = stack.enter_context(open_write(dst_path)) if kind == "jsonl" else None
+        for batch in batches(keep):
+            n = batch.num_rows
+            idx = pa.array(codes[offset : offset + n])
+            arrays = [*batch.columns, *(d.take(idx) for d in dictionaries)]
+            out = pa.RecordBatch.from_arrays(arrays, names=[*(c.strip() for c in keep), *extra_columns])
+            offset += n
+
+            if kind == "jsonl":
+                text = out.to_pandas().to_json(orient="records", lines=True)
+                sink.write(text.encode("utf-8") if text.endswith("\n") else (text + "\n").encode("utf-8"))
+                continue
+            if writer is None:
+                if kind == "parquet":
+                    import pyarrow.parquet as pq
+
+                    # dictionary-encoding float columns costs more than zstd saves
+                    text = [f.name for f in out.schema if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+                    writer = stack.enter_context(
+                        pq.ParquetWriter(dst_path, out.schema, compression="zstd", use_dictionary=text)
+                    )
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression="zstd")
+                    writer = stack.enter_context(pa.ipc.new_file(dst_path, out.schema, options=options))
+            writer.write_batch(out)
+
+    if offset != rows:
+        raise ValueError(f"wrote {offset} rows, scored {rows}")
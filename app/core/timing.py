@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+
+class StageTimer:
+    """Wall-clock seconds per named stage; repeated stages accumulate.
+
+    Besides the per-stage totals it keeps the individual spans as
+    (name, start offset from the timer creation, duration) for tracing.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.spans: List[Tuple[str, float, float]] = []
+        self.started_perf = time.perf_counter()
+        self.started_epoch_ns = time.time_ns()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.spans.append((name, t0 - self.started_perf, seconds))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_perf
+
+    def as_record(self) -> Dict[str, float]:
+        """Compact form persisted on the job: stage -> milliseconds (+ total)."""
+        record = {name: round(seconds * 1000.0, 1) for name, seconds in self.stages.items()}
+        record["total"] = round(self.elapsed() * 1000.0, 1)
+        return record
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from app.core.config import settings
+from app.core.timing import StageTimer
+
+_tracer = None
+_disabled = False
+
+
+def _get_tracer():
+    """OTLP tracer, created lazily. OpenTelemetry is optional: without the
+    packages or without OTEL_EXPORTER_OTLP_ENDPOINT tracing is a no-op."""
+    global _tracer, _disabled
+    if _tracer is not None or _disabled:
+        return _tracer
+
+    if not settings.otel_exporter_endpoint:
+        _disabled = True
+        return None
+
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("[tracing] opentelemetry-sdk / otlp exporter not installed, tracing disabled")
+        _disabled = True
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_exporter_endpoint)))
+    _tracer = provider.get_tracer("clarus.worker")
+    return _tracer
+
+
+def emit_job_trace(job_id: str, status: str, timer: StageTimer, rows: Optional[int] = None) -> None:
+    """One trace per job: root span 'job' + a child span per recorded stage."""
+    tracer = _get_tracer()
+    if tracer is None:
+        return
+
+    from opentelemetry import trace
+
+    t0 = timer.started_epoch_ns
+    end_ns = t0 + int(timer.elapsed() * 1e9)
+
+    root = tracer.start_span("job", start_time=t0, attributes={"job.id": job_id, "job.status": status})
+    if rows is not None:
+        root.set_attribute("job.rows", rows)
+
+    ctx = trace.set_span_in_context(root)
+    for name, offset, seconds in timer.spans:
+        start = t0 + int(offset * 1e9)
+        span = tracer.start_span(name, context=ctx, start_time=start)
+        span.end(end_time=start + int(seconds * 1e9))
+    root.end(end_time=end_ns)
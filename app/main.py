@@ -1,15 +1,54 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import RedirectResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from app.api.auth import router as auth_router
 from app.api.billing import router as billing_router
+from app.api.capacity import router as capacity_router
 from app.api.predictions import router as predictions_router
+from app.api.stats import router as stats_router
+from app.core.cache import all_cache_stats
+from app.core.db import AsyncSessionLocal, async_engine, engine
+from app.core.metrics import (
+    HTTP_REQUEST_SECONDS,
+    PENDING_JOBS,
+    PENDING_WORK_SECONDS,
+    begin_request_db_timings,
+    instrument_engine,
+    observe_request_db_timings,
+)
+from app.services.capacity import snapshot
 
 app = FastAPI(title="Clarus-IoT", version="0.1.0")
 
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(billing_router, prefix="/billing", tags=["billing"])
 app.include_router(predictions_router, prefix="/predictions", tags=["predictions"])
+app.include_router(stats_router, prefix="/stats", tags=["stats"])
+app.include_router(capacity_router, prefix="/capacity", tags=["capacity"])
+
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    db_timings = begin_request_db_timings()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # route template (/predictions/{job_id}), not the raw path: bounded label cardinality
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(method=request.method, route=route, status=str(status)).observe(
+            time.perf_counter() - t0
+        )
+        observe_request_db_timings(route, db_timings)
 
 
 @app.get("/", include_in_schema=False)
@@ -21,3 +60,24 @@ def root():
 @app.get("/health", tags=["health"])
 def health():
     return {"status": "ok"}
+
+
+@app.get("/health/caches", tags=["health"])
+def health_caches():
+    """Hit/miss counters of in-process caches (auth_user, subscription_end)."""
+    return all_cache_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition format."""
+    try:
+        async with AsyncSessionLocal() as db:
+            state = await snapshot(db)
+        for name, work in (("queued", state.work.queued), ("running", state.work.running)):
+            PENDING_WORK_SECONDS.labels(state=name).set(work.seconds)
+            PENDING_JOBS.labels(state=name).set(work.jobs)
+    except Exception as e:
+        # the rest of the metrics is still worth serving
+        print(f"[metrics] pending work not refreshed: {e}")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
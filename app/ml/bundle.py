@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import json
+import time
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from xgboost import XGBClassifier
 
+from app.core.timing import StageTimer
+
 DROP_COMMON = [
     "pkSeqID",
     "stime",
@@ -47,6 +51,66 @@ def _drop_zero_var(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _fill_median_zero_var(X: np.ndarray) -> Dict[int, np.ndarray]:
+    """In-place matrix version of _fill_median + _drop_zero_var + _align_features.
+
+    Per column: NaN -> median of the column, then a constant column becomes
+    0.0 (a dropped column is re-added as zeros by _align_features). Columns are
+    contiguous in a column-major X, so this walks memory once per column.
+    Returns the NaN masks of the columns that had gaps, to redo the fill on a
+    row subset later.
+    """
+    nan_masks: Dict[int, np.ndarray] = {}
+    for j in range(X.shape[1]):
+        col = X[:, j]
+        nan = np.isnan(col)
+        if nan.any():
+            nan_masks[j] = nan
+            if nan.all():
+                col[:] = 0.0
+                continue
+            col[nan] = np.median(col[~nan].astype(np.float64))
+        if col.size and (col == col[0]).all():
+            col[:] = 0.0
+    return nan_masks
+
+
+def preprocess_subset(
+    X: np.ndarray,
+    nan_masks: Dict[int, np.ndarray],
+    rows: np.ndarray,
+    cols: List[int],
+) -> np.ndarray:
+    """Rows/columns of an already preprocessed X, preprocessed again as if alone.
+
+    The original gaps are restored from nan_masks, so medians and zero
+    variance come from the subset only (what _preprocess on df.iloc[rows] does).
+    """
+    sub = np.empty((rows.size, len(cols)), dtype=np.float32, order="F")
+    for k, j in enumerate(cols):
+        sub[:, k] = X[rows, j]
+        if j in nan_masks:
+            sub[nan_masks[j][rows], k] = np.nan
+    _fill_median_zero_var(sub)
+    return sub
+
+
+def _predict_blocks(predict, X: np.ndarray, columns: List[str], chunk_rows: int = 0) -> np.ndarray:
+    """predict() over blocks of chunk_rows rows of X (0 = one call).
+
+    XGBoost converts each input to its own dense copy before predicting;
+    blocks bound that copy and keep it cache-sized on big files.
+    """
+    if chunk_rows <= 0 or X.shape[0] <= chunk_rows:
+        return np.asarray(predict(pd.DataFrame(X, columns=columns, copy=False)))
+    return np.concatenate(
+        [
+            np.asarray(predict(pd.DataFrame(X[i : i + chunk_rows], columns=columns, copy=False)))
+            for i in range(0, X.shape[0], chunk_rows)
+        ]
+    )
+
+
 def _align_features(df: pd.DataFrame, features: List[str]) -> pd.DataFrame:
     df = df.copy()
     for f in features:
@@ -56,6 +120,43 @@ def _align_features(df: pd.DataFrame, features: List[str]) -> pd.DataFrame:
     return df
 
 
+@dataclass
+class SharedFeatures:
+    """Preprocessed matrices of one score_matrix call, for scoring other models on them."""
+
+    X: np.ndarray  # preprocessed feature_union columns, binary features first
+    nan_masks: Dict[int, np.ndarray]
+    idx_attack: np.ndarray  # rows routed to the multi-class model
+    Xm: Optional[np.ndarray]  # preprocessed multi-class matrix of idx_attack rows
+    proba_attack: np.ndarray  # float32, P(attack) of the binary model
+    seconds: float  # preprocessing + inference, for overhead accounting
+
+
+@dataclass
+class ScoreResult:
+    """Row-level predictions as arrays (no DataFrame around the input)."""
+
+    pred_attack: np.ndarray  # int8, 0/1
+    class_code: np.ndarray  # int16, multi-class id for attack rows, -1 for benign
+    class_mapping: Dict[int, str]
+    features: Optional[SharedFeatures] = None
+    # score_matrix(keep_proba=True): float32 P(attack), and the winning class probability (NaN for benign rows)
+    proba_attack: Optional[np.ndarray] = None
+    proba_class: Optional[np.ndarray] = None
+
+    @property
+    def rows(self) -> int:
+        return int(self.pred_attack.shape[0])
+
+    def output_codes(self) -> Tuple[np.ndarray, List[Tuple[object, ...]]]:
+        """(codes, values) for the product columns is_attack / attack_type:
+        row i gets values[codes[i]]; code 0 is benign, code k+1 is class k."""
+        n_classes = int(self.class_code.max()) + 1 if self.rows else 0
+        values: List[Tuple[object, ...]] = [(0, "benign")]
+        values += [(1, self.class_mapping.get(k, str(k))) for k in range(n_classes)]
+        return (self.class_code.astype(np.int32) + 1), values
+
+
 @dataclass(frozen=True)
 class XGBBundle:
     bin_model: XGBClassifier
@@ -73,13 +174,19 @@ class XGBBundle:
         class_mapping_path: str,
         features_bin_path: str,
         features_multi_path: str,
+        nthread: int = 0,
     ) -> "XGBBundle":
+        """nthread > 0: XGBoost threads per predict call (0 = the library default, all cores)."""
         bin_model = XGBClassifier()
         bin_model.load_model(xgb_bin_path)
 
         multi_model = XGBClassifier()
         multi_model.load_model(xgb_multi_path)
 
+        if nthread > 0:
+            bin_model.set_params(n_jobs=nthread)
+            multi_model.set_params(n_jobs=nthread)
+
         with open(features_bin_path, "r", encoding="utf-8") as f:
             features_bin = json.load(f)
 
@@ -118,20 +225,31 @@ class XGBBundle:
         df = _align_features(df, features)
         return df
 
+    @property
+    def feature_union(self) -> List[str]:
+        """Columns score_matrix expects: binary features first, then multi-only ones."""
+        return self.features_bin + [f for f in self.features_multi if f not in self.features_bin]
+
     def preprocess_binary(self, df: pd.DataFrame) -> pd.DataFrame:
         return self._preprocess(df, self.features_bin)
 
     def preprocess_multi(self, df: pd.DataFrame) -> pd.DataFrame:
         return self._preprocess(df, self.features_multi)
 
-    def score_df(self, df_raw: pd.DataFrame) -> pd.DataFrame:
+    def score_df(self, df_raw: pd.DataFrame, timer: Optional[StageTimer] = None) -> pd.DataFrame:
         """
         Возвращает df_raw + столбцы:
           - pred_attack (0/1)
           - pred_attack_proba (float или NaN)
           - pred_class (str)
           - pred_class_proba (float или NaN)
+
+        timer (optional) получает стадии preprocess / infer_bin / infer_multi.
         """
+
+        def stage(name: str):
+            return timer.stage(name) if timer is not None else nullcontext()
+
         if df_raw.shape[0] == 0:
             out = df_raw.copy()
             out["pred_attack"] = []
@@ -141,18 +259,20 @@ class XGBBundle:
             return out
 
         out = df_raw.copy()
-        Xb = self.preprocess_binary(df_raw)
+        with stage("preprocess"):
+            Xb = self.preprocess_binary(df_raw)
 
-        pred_bin = self.bin_model.predict(Xb)
-        pred_bin = np.asarray(pred_bin).astype(int)
+        with stage("infer_bin"):
+            pred_bin = self.bin_model.predict(Xb)
+            pred_bin = np.asarray(pred_bin).astype(int)
 
-        proba_bin = None
-        try:
-            pb = self.bin_model.predict_proba(Xb)
-            if pb is not None and pb.shape[1] >= 2:
-                proba_bin = pb[:, 1].astype(float)
-        except Exception:
             proba_bin = None
+            try:
+                pb = self.bin_model.predict_proba(Xb)
+                if pb is not None and pb.shape[1] >= 2:
+                    proba_bin = pb[:, 1].astype(float)
+            except Exception:
+                proba_bin = None
 
         out["pred_attack"] = pred_bin
         out["pred_attack_proba"] = proba_bin if proba_bin is not None else np.nan
@@ -164,19 +284,21 @@ class XGBBundle:
         if idx_attack.size == 0:
             return out
 
-        df_att = df_raw.iloc[idx_attack].copy()
-        Xm = self.preprocess_multi(df_att)
+        with stage("preprocess"):
+            df_att = df_raw.iloc[idx_attack].copy()
+            Xm = self.preprocess_multi(df_att)
 
-        pred_multi = self.multi_model.predict(Xm)
-        pred_multi = np.asarray(pred_multi).astype(int)
+        with stage("infer_multi"):
+            pred_multi = self.multi_model.predict(Xm)
+            pred_multi = np.asarray(pred_multi).astype(int)
 
-        proba_multi = None
-        try:
-            pm = self.multi_model.predict_proba(Xm)
-            if pm is not None and pm.ndim == 2 and pm.shape[1] >= 1:
-                proba_multi = pm.max(axis=1).astype(float)
-        except Exception:
             proba_multi = None
+            try:
+                pm = self.multi_model.predict_proba(Xm)
+                if pm is not None and pm.ndim == 2 and pm.shape[1] >= 1:
+                    proba_multi = pm.max(axis=1).astype(float)
+            except Exception:
+                proba_multi = None
 
         class_names = [self.class_mapping.get(int(c), str(int(c))) for c in pred_multi]
 
@@ -186,7 +308,95 @@ class XGBBundle:
 
         return out
 
-    def predict_rows(self, df_raw: pd.DataFrame) -> pd.DataFrame:
+    def score_matrix(
+        self,
+        X: np.ndarray,
+        timer: Optional[StageTimer] = None,
+        keep_features: bool = False,
+        keep_proba: bool = False,
+        chunk_rows: int = 0,
+    ) -> ScoreResult:
+        """
+        Same predictions as score_df, for a float32 column-major matrix with
+        the columns of feature_union (raw values, NaN for unparseable cells).
+
+        X is preprocessed in place; the binary model gets a view of it, only
+        the attack rows are copied for the multi-class model.
+        keep_features=True keeps the preprocessed matrices and P(attack) on
+        result.features (shadow scoring reuses them).
+        keep_proba=True returns the probabilities behind the predictions
+        (result.proba_attack / proba_class); same inference, no extra pass.
+        chunk_rows > 0 runs the inference in blocks of that many rows
+        (preprocessing stays per file: medians are over all rows).
+        """
+
+        def stage(name: str):
+            return timer.stage(name) if timer is not None else nullcontext()
+
+        t0 = time.perf_counter()
+        rows = X.shape[0]
+        class_code = np.full(rows, -1, dtype=np.int16)
+        if rows == 0:
+            return ScoreResult(np.zeros(0, dtype=np.int8), class_code, self.class_mapping)
+
+        union = self.feature_union
+        with stage("preprocess"):
+            # dropped by _preprocess and re-added as zeros
+            for j, name in enumerate(union):
+                if name in DROP_COMMON or name in LABEL_COLS:
+                    X[:, j] = 0.0
+            nan_masks = _fill_median_zero_var(X)
+            Xb = X[:, : len(self.features_bin)]
+
+        proba_attack = None
+        with stage("infer_bin"):
+            if keep_features or keep_proba:
+                # XGBClassifier.predict is exactly P(attack) > 0.5, one inference gives both
+                pb = _predict_blocks(self.bin_model.predict_proba, Xb, self.features_bin, chunk_rows)
+                proba_attack = pb[:, 1].astype(np.float32)
+                pred_attack = (proba_attack > 0.5).astype(np.int8)
+            else:
+                pred_attack = _predict_blocks(self.bin_model.predict, Xb, self.features_bin, chunk_rows).astype(np.int8)
+        del Xb
+
+        idx_attack = np.where(pred_attack == 1)[0]
+        Xm = None
+        proba_class = np.full(rows, np.nan, dtype=np.float32) if keep_proba else None
+        if idx_attack.size:
+            with stage("preprocess"):
+                # medians / zero variance are recomputed on the attack rows, as in score_df
+                Xm = preprocess_subset(X, nan_masks, idx_attack, [union.index(f) for f in self.features_multi])
+
+            with stage("infer_multi"):
+                if proba_class is not None:
+                    # predict is the argmax of predict_proba
+                    pm = _predict_blocks(self.multi_model.predict_proba, Xm, self.features_multi, chunk_rows)
+                    class_code[idx_attack] = pm.argmax(axis=1).astype(np.int16)
+                    proba_class[idx_attack] = pm.max(axis=1)
+                else:
+                    pred = _predict_blocks(self.multi_model.predict, Xm, self.features_multi, chunk_rows)
+                    class_code[idx_attack] = pred.astype(np.int16)
+
+        features = None
+        if keep_features:
+            features = SharedFeatures(
+                X=X,
+                nan_masks=nan_masks,
+                idx_attack=idx_attack,
+                Xm=Xm,
+                proba_attack=proba_attack,  # type: ignore[arg-type]
+                seconds=time.perf_counter() - t0,
+            )
+        return ScoreResult(
+            pred_attack,
+            class_code,
+            self.class_mapping,
+            features,
+            proba_attack=proba_attack if keep_proba else None,
+            proba_class=proba_class,
+        )
+
+    def predict_rows(self, df_raw: pd.DataFrame, timer: Optional[StageTimer] = None) -> pd.DataFrame:
         """
         Продуктовый row-level output:
           - is_attack (0/1)
@@ -195,7 +405,7 @@ class XGBBundle:
         Важно: если во входном CSV случайно есть target-колонки,
         мы НЕ возвращаем их в scored CSV.
         """
-        scored_internal = self.score_df(df_raw)
+        scored_internal = self.score_df(df_raw, timer=timer)
 
         out = df_raw.copy()
         for col in LABEL_COLS:
@@ -206,6 +416,21 @@ class XGBBundle:
         out["attack_type"] = scored_internal["pred_class"].astype(str)
         return out
 
+    def summary_from_result(self, result: ScoreResult) -> Tuple[int, int, float, str | None, float | None]:
+        """summary_from_scored for a ScoreResult."""
+        total = result.rows
+        if total == 0:
+            return 0, 0, 0.0, None, None
+
+        attack_rows = int(result.pred_attack.sum(dtype=np.int64))
+        if attack_rows == 0:
+            return total, 0, 0.0, "benign", 1.0
+
+        counts = np.bincount(result.class_code[result.class_code >= 0])
+        top = int(counts.argmax())
+        top_class = self.class_mapping.get(top, str(top))
+        return total, attack_rows, float(attack_rows / total), top_class, float(counts[top] / attack_rows)
+
     def summary_from_scored(self, scored_df: pd.DataFrame) -> Tuple[int, int, float, str | None, float | None]:
         """
         total_rows, attack_rows, attack_ratio, top_class, top_class_share
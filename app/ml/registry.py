@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core.metrics import MODEL_RELOADS_TOTAL
+from app.core.model_manifest import DEFAULT_VERSION, manifest_path, read_manifest, version_paths
+from app.ml.bundle import XGBBundle
+
+
+class ModelVersionError(LookupError):
+    pass
+
+
+class BundleRegistry:
+    """Resident model versions + the active one.
+
+    The state (active version, version -> bundle) is replaced as a whole under
+    a lock, readers take a consistent snapshot. Jobs resolve their bundle once
+    at start, so a swap only affects jobs started after it - between jobs,
+    never inside one. New versions are loaded outside the lock (by the watcher
+    thread), the consumer never waits for a load.
+
+    nthread > 0 is applied to every bundle it loads (XGBBundle.load).
+    """
+
+    def __init__(self, model_dir: str, default_paths: Dict[str, str], nthread: int = 0) -> None:
+        self.model_dir = model_dir
+        self.default_paths = default_paths
+        self.nthread = nthread
+
+        self._lock = threading.Lock()
+        self._active = DEFAULT_VERSION
+        self._shadow: Optional[str] = None
+        self._bundles: Dict[str, XGBBundle] = {}
+        # (mtime_ns, size) of the manifest seen by the last refresh; None = no manifest
+        self._seen: Optional[Tuple[int, int]] = (-1, -1)
+
+    @classmethod
+    def single(cls, bundle: XGBBundle, version: str = DEFAULT_VERSION) -> "BundleRegistry":
+        """Fixed registry around one loaded bundle (scripts, benchmarks)."""
+        registry = cls(model_dir="", default_paths={})
+        registry._active = version
+        registry._bundles = {version: bundle}
+        registry._seen = None
+        return registry
+
+    @property
+    def active_version(self) -> str:
+        return self._active
+
+    @property
+    def versions(self) -> List[str]:
+        with self._lock:
+            return sorted(self._bundles)
+
+    @property
+    def shadow_version(self) -> Optional[str]:
+        return self._shadow
+
+    def get_shadow(self) -> Optional[Tuple[str, XGBBundle]]:
+        """(version, bundle) of the shadow candidate, None when none is configured."""
+        with self._lock:
+            version = self._shadow
+            bundle = self._bundles.get(version) if version else None
+        return (version, bundle) if bundle is not None else None
+
+    def get(self, version: str | None = None) -> Tuple[str, XGBBundle]:
+        """(version, bundle) for a pinned version, or the active one."""
+        with self._lock:
+            version = version or self._active
+            bundle = self._bundles.get(version)
+            resident = sorted(self._bundles)
+        if bundle is None:
+            raise ModelVersionError(f"Model version '{version}' is not available (resident: {', '.join(resident)})")
+        return version, bundle
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        if not self.model_dir:
+            return None
+        try:
+            st = os.stat(manifest_path(self.model_dir))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self, raise_errors: bool = False) -> bool:
+        """Load what the manifest lists and swap. Returns True if the state changed.
+
+        A failed load keeps the current state; it is retried only after the
+        manifest changes again.
+        """
+        stamp = self._stamp()
+        if stamp == self._seen:
+            return False
+        self._seen = stamp
+
+        try:
+            manifest = read_manifest(self.model_dir)
+            if manifest is None:
+                active, shadow = DEFAULT_VERSION, None
+                wanted = {DEFAULT_VERSION: self.default_paths}
+            else:
+                active, shadow = manifest.active, manifest.shadow
+                wanted = {v: version_paths(self.model_dir, v) for v in manifest.versions}
+
+            with self._lock:
+                resident = dict(self._bundles)
+
+            t = time.perf_counter()
+            # versions are immutable: whatever is resident is reused as is
+            bundles = {v: resident.get(v) or XGBBundle.load(**paths, nthread=self.nthread) for v, paths in wanted.items()}
+            loaded = sorted(set(bundles) - set(resident))
+        except Exception as e:
+            MODEL_RELOADS_TOTAL.labels(result="error").inc()
+            if raise_errors:
+                raise
+            print(f"[models] reload failed, keeping active={self._active}: {e}")
+            return False
+
+        with self._lock:
+            changed = active != self._active or shadow != self._shadow or set(bundles) != set(self._bundles)
+            self._active = active
+            self._shadow = shadow
+            self._bundles = bundles
+
+        if changed:
+            MODEL_RELOADS_TOTAL.labels(result="ok").inc()
+            print(
+                f"[models] active={active} shadow={shadow} resident={sorted(bundles)} "
+                f"loaded={loaded} in {time.perf_counter() - t:.2f}s"
+            )
+        return changed
+
+    def start_watcher(self, poll_seconds: float) -> threading.Thread:
+        def loop() -> None:
+            while True:
+                time.sleep(poll_seconds)
+                self.refresh()
+
+        thread = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        thread.start()
+        return thread
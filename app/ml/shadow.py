@@ -0,0 +1,142 @@
+"""Shadow scoring: a candidate bundle scored on the primary's preprocessed features.
+
+The primary call keeps its preprocessed matrices (score_matrix(keep_features=True)),
+the candidate runs only its own inference on them - preprocessing is not paid
+twice. Output files and summaries come from the primary only; the comparison
+goes to prediction_summaries.shadow_stats.
+
+Cost is bounded by row sampling: ShadowBudget picks the fraction of rows
+scored in shadow so that shadow time stays under max_overhead x primary time.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from app.ml.bundle import ScoreResult, XGBBundle, preprocess_subset
+
+BENIGN = "benign"
+
+
+class ShadowBudget:
+    """Adaptive sample fraction from the overhead measured on previous jobs.
+
+    Shadow cost is ~linear in sampled rows, so overhead / fraction estimates
+    the cost of a full shadow. The first job assumes shadow ~ primary cost.
+    """
+
+    def __init__(self, max_overhead: float, min_fraction: float = 0.01) -> None:
+        self.max_overhead = max_overhead
+        self.min_fraction = min_fraction
+        self.fraction = float(min(1.0, max(min_fraction, max_overhead)))
+
+    def update(self, overhead: float, fraction: float) -> None:
+        if overhead <= 0 or fraction <= 0:
+            return
+        full = overhead / fraction
+        self.fraction = float(min(1.0, max(self.min_fraction, self.max_overhead / full)))
+
+
+def _labels(codes: np.ndarray, mapping: Dict[int, str]) -> np.ndarray:
+    """Class names per row, BENIGN for -1 (versions may number classes differently)."""
+    out = np.full(codes.size, BENIGN, dtype=object)
+    for code in np.unique(codes[codes >= 0]):
+        out[codes == code] = mapping.get(int(code), str(int(code)))
+    return out
+
+
+def shadow_compare(
+    primary: XGBBundle,
+    candidate: XGBBundle,
+    result: ScoreResult,
+    fraction: float = 1.0,
+    seed: int = 0,
+) -> Dict:
+    """Agreement of candidate vs primary on (a sample of) the rows of result.
+
+    Rows the primary routed to its multi-class model reuse its preprocessed
+    matrix (medians taken over the primary's attack rows); rows only the
+    candidate flags are preprocessed as a subset of their own. Standalone the
+    candidate would take medians over its own attack set, so the multi-class
+    inputs are an approximation where the binary models disagree.
+    """
+    f = result.features
+    if f is None:
+        raise ValueError("score_matrix(keep_features=True) is required for shadow scoring")
+    if candidate.features_bin != primary.features_bin or candidate.features_multi != primary.features_multi:
+        return {"skipped": "feature lists differ, shared preprocessing is not possible"}
+
+    t0 = time.perf_counter()
+    n = result.rows
+    if fraction >= 1.0 or n == 0:
+        fraction = 1.0
+        sample = np.arange(n)
+        Xb = f.X[:, : len(primary.features_bin)]
+    else:
+        size = max(1, int(round(n * fraction)))
+        sample = np.sort(np.random.default_rng(seed).choice(n, size=size, replace=False))
+        Xb = f.X[sample, : len(primary.features_bin)]
+
+    s_proba = candidate.bin_model.predict_proba(pd.DataFrame(Xb, columns=primary.features_bin, copy=False))[:, 1]
+    s_proba = s_proba.astype(np.float32)
+    del Xb
+    s_attack = s_proba > 0.5
+
+    s_class = np.full(sample.size, -1, dtype=np.int16)
+    att = np.where(s_attack)[0]
+    if att.size:
+        rows = sample[att]
+        pos = np.searchsorted(f.idx_attack, rows)
+        shared = pos < f.idx_attack.size
+        shared[shared] = f.idx_attack[pos[shared]] == rows[shared]
+
+        cols = primary.features_multi
+        if shared.any():
+            Xm = f.Xm[pos[shared]]  # type: ignore[index]
+            s_class[att[shared]] = candidate.multi_model.predict(pd.DataFrame(Xm, columns=cols, copy=False))
+        if (~shared).any():
+            union = primary.feature_union
+            Xm = preprocess_subset(f.X, f.nan_masks, rows[~shared], [union.index(c) for c in cols])
+            s_class[att[~shared]] = candidate.multi_model.predict(pd.DataFrame(Xm, columns=cols, copy=False))
+
+    p_attack = result.pred_attack[sample].astype(bool)
+    p_label = _labels(result.class_code[sample], primary.class_mapping)
+    s_label = _labels(s_class, candidate.class_mapping)
+
+    confusion: Dict[str, Dict[str, int]] = {}
+    if sample.size:
+        pairs, counts = np.unique(np.stack([p_label, s_label]).astype(str), axis=1, return_counts=True)
+        for (p, s), c in zip(pairs.T, counts):
+            confusion.setdefault(str(p), {})[str(s)] = int(c)
+
+    p_proba = f.proba_attack[sample]
+    drift = np.abs(p_proba - s_proba)
+    seconds = time.perf_counter() - t0
+
+    return {
+        "rows": int(n),
+        "sampled_rows": int(sample.size),
+        "fraction": round(fraction, 6),
+        "attack_agreement": float(np.mean(p_attack == s_attack)) if sample.size else None,
+        "label_agreement": float(np.mean(p_label == s_label)) if sample.size else None,
+        "attack_share": {
+            "primary": float(p_attack.mean()) if sample.size else None,
+            "shadow": float(s_attack.mean()) if sample.size else None,
+        },
+        # rows = primary label, columns = shadow label
+        "confusion": confusion,
+        "proba_drift": {
+            "mean_abs": float(drift.mean()) if sample.size else None,
+            "p95_abs": float(np.percentile(drift, 95)) if sample.size else None,
+            "max_abs": float(drift.max()) if sample.size else None,
+            "mean_primary": float(p_proba.mean()) if sample.size else None,
+            "mean_shadow": float(s_proba.mean()) if sample.size else None,
+        },
+        "seconds": round(seconds, 4),
+        "primary_seconds": round(f.seconds, 4),
+        "overhead": round(seconds / f.seconds, 4) if f.seconds > 0 else None,
+    }
+
@@ -0,0 +1,141 @@
+"""Synthetic BoT-IoT-shaped traffic for benchmarks and calibration.
+
+Generates the full BoT-IoT column layout (context columns like saddr/stime
+plus the numeric features listed in features_*.json). Attack rows are drawn
+from a flood-like distribution (many small packets, high rate), benign rows
+from a regular-traffic one, so `attack_ratio` roughly controls what the
+binary model will flag. Values are plausible, not realistic.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# BoT-IoT column order (as in data/test_data.csv)
+BOT_IOT_COLUMNS = [
+    "pkSeqID", "stime", "flgs", "proto", "saddr", "sport", "daddr", "dport", "pkts", "bytes",
+    "state", "ltime", "seq", "dur", "mean", "stddev", "smac", "dmac", "sum", "min", "max",
+    "soui", "doui", "sco", "dco", "spkts", "dpkts", "sbytes", "dbytes", "rate", "srate", "drate",
+]
+
+
+def load_feature_names(*paths: str) -> List[str]:
+    names: List[str] = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for name in json.load(f):
+                if name not in names:
+                    names.append(str(name))
+    return names
+
+
+def synthetic_frame(
+    rows: int,
+    attack_ratio: float = 0.5,
+    features: Optional[List[str]] = None,
+    seed: int = 0,
+    start_id: int = 1,
+) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    is_attack = rng.random(rows) < attack_ratio
+    n_att = int(is_attack.sum())
+    n_ben = rows - n_att
+
+    def mix(attack_values: np.ndarray, benign_values: np.ndarray, dtype=np.float64) -> np.ndarray:
+        out = np.empty(rows, dtype=dtype)
+        out[is_attack] = attack_values
+        out[~is_attack] = benign_values
+        return out
+
+    spkts = mix(rng.integers(1, 12, n_att), rng.integers(2, 60, n_ben), np.int64)
+    dpkts = mix(np.zeros(n_att, dtype=np.int64), rng.integers(1, 60, n_ben), np.int64)
+    pkts = spkts + dpkts
+    sbytes = spkts * mix(rng.integers(54, 120, n_att), rng.integers(60, 1400, n_ben), np.int64)
+    dbytes = dpkts * rng.integers(60, 1400, rows)
+    dur = mix(rng.exponential(15.0, n_att), rng.exponential(3.0, n_ben))
+    safe_dur = np.maximum(dur, 1e-6)
+
+    rec = np.abs(rng.normal(dur / np.maximum(pkts, 1), 0.3))
+    stime = 1528087297.0 + np.sort(rng.random(rows)) * 3600.0
+
+    data = {
+        "pkSeqID": np.arange(start_id, start_id + rows),
+        "stime": np.round(stime, 6),
+        "flgs": "e",
+        "proto": np.where(is_attack, "udp", "tcp"),
+        "saddr": np.char.add("192.168.100.", rng.integers(2, 255, rows).astype(str)),
+        "sport": rng.integers(1024, 65535, rows),
+        "daddr": np.char.add("192.168.100.", rng.integers(2, 255, rows).astype(str)),
+        "dport": mix(rng.choice([80, 53, 1900], n_att), rng.choice([443, 22, 8080, 1883], n_ben), np.int64),
+        "pkts": pkts,
+        "bytes": sbytes + dbytes,
+        "state": np.where(is_attack, "INT", "CON"),
+        "ltime": np.round(stime + dur, 6),
+        "seq": rng.integers(1, 262143, rows),
+        "dur": np.round(dur, 6),
+        "mean": np.round(rec, 6),
+        "stddev": np.round(np.abs(rng.normal(0.5, 0.4, rows)), 6),
+        "smac": "",
+        "dmac": "",
+        "sum": np.round(rec * pkts, 6),
+        "min": np.round(rec * rng.random(rows), 6),
+        "max": np.round(rec * (1.0 + rng.random(rows)), 6),
+        "soui": "",
+        "doui": "",
+        "sco": "",
+        "dco": "",
+        "spkts": spkts,
+        "dpkts": dpkts,
+        "sbytes": sbytes,
+        "dbytes": dbytes,
+        "rate": np.round(pkts / safe_dur, 6),
+        "srate": np.round(spkts / safe_dur, 6),
+        "drate": np.round(dpkts / safe_dur, 6),
+    }
+
+    columns = list(BOT_IOT_COLUMNS)
+    # features unknown to the BoT-IoT layout (custom retrains) get random values
+    for name in features or []:
+        if name not in data:
+            data[name] = np.round(rng.random(rows), 6)
+            columns.append(name)
+
+    return pd.DataFrame(data, columns=columns)
+
+
+def iter_synthetic_chunks(
+    rows: int,
+    attack_ratio: float = 0.5,
+    features: Optional[List[str]] = None,
+    seed: int = 0,
+    chunk_rows: int = 1_000_000,
+) -> Iterator[pd.DataFrame]:
+    done = 0
+    chunk_idx = 0
+    while done < rows:
+        n = min(chunk_rows, rows - done)
+        yield synthetic_frame(n, attack_ratio, features, seed=seed + chunk_idx, start_id=done + 1)
+        done += n
+        chunk_idx += 1
+
+
+def write_synthetic_csv(
+    path: str,
+    rows: int,
+    sep: str = ",",
+    attack_ratio: float = 0.5,
+    features: Optional[List[str]] = None,
+    seed: int = 0,
+    chunk_rows: int = 1_000_000,
+) -> str:
+    """Stream `rows` synthetic rows to `path` chunk by chunk (bounded memory, fine for 50M rows)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    first = True
+    for chunk in iter_synthetic_chunks(rows, attack_ratio, features, seed, chunk_rows):
+        chunk.to_csv(path, sep=sep, index=False, header=first, mode="w" if first else "a")
+        first = False
+    return path
@@ -0,0 +1,128 @@
+"""Attack timeline of a job: rows / attacks / per-class counts per time bucket.
+
+Built in the scoring pass from arrays that are already in memory - the flow
+start times the reader parsed next to the features (stime, ltime if there is
+no stime) and the output codes - so it is one bincount over the rows. The
+result is small (at most TIMELINE_MAX_BUCKETS non-empty buckets) and stored
+per job, the API serves it without touching the scored file.
+
+Layout (JSON in prediction_timelines.buckets):
+    {"offsets": [...], "rows": [...], "attacks": [...], "counts": [[...], ...]}
+bucket i starts at start + offsets[i] * resolution; counts[i][k] is the
+number of rows of classes[k]. Empty buckets are not stored.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# flow start, flow end (BoT-IoT / Argus); the first one present is used
+TIME_COLUMNS = ("stime", "ltime")
+
+
+@dataclass
+class Timeline:
+    resolution: int  # seconds
+    start: int  # epoch seconds of bucket 0, a multiple of resolution
+    classes: List[str]  # classes[0] is benign
+    buckets: Dict[str, list]
+    untimed_rows: int  # rows without a usable time
+
+
+def _pick_resolution(lo: float, hi: float, resolution: int, max_buckets: int) -> int:
+    """The configured resolution, or its smallest multiple that fits the span in max_buckets."""
+    span = hi - math.floor(lo / resolution) * resolution
+    factor = max(1, math.ceil((span + resolution) / (resolution * max_buckets)))
+    while True:
+        res = resolution * factor
+        if math.floor(hi / res) - math.floor(lo / res) < max_buckets:
+            return res
+        factor += 1
+
+
+def build_timeline(
+    times: Optional[np.ndarray],
+    codes: np.ndarray,
+    classes: Sequence[str],
+    resolution: int,
+    max_buckets: int,
+) -> Optional[Timeline]:
+    """Bucket rows by time. codes[i] indexes classes (0 = benign). None when no row has a time."""
+    if times is None or resolution <= 0 or not len(times):
+        return None
+    valid = np.isfinite(times) & (times > 0)
+    if not valid.any():
+        return None
+    t = times[valid] if not valid.all() else times
+    c = codes[valid] if not valid.all() else codes
+
+    lo, hi = float(t.min()), float(t.max())
+    res = _pick_resolution(lo, hi, resolution, max(1, max_buckets))
+    start = math.floor(lo / res) * res
+    idx = ((t - start) // res).astype(np.int64)
+
+    n_classes = len(classes)
+    n_buckets = int(idx.max()) + 1
+    counts = np.bincount(idx * n_classes + c, minlength=n_buckets * n_classes).reshape(n_buckets, n_classes)
+    rows = counts.sum(axis=1)
+    offsets = np.flatnonzero(rows)
+    counts = counts[offsets]
+    rows = rows[offsets]
+
+    return Timeline(
+        resolution=int(res),
+        start=int(start),
+        classes=list(classes),
+        buckets={
+            "offsets": offsets.tolist(),
+            "rows": rows.tolist(),
+            "attacks": (rows - counts[:, 0]).tolist(),
+            "counts": counts.tolist(),
+        },
+        untimed_rows=int((~valid).sum()),
+    )
+
+
+def codes_from_labels(is_attack: np.ndarray, attack_type: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """(codes, classes) from the product columns of a scored frame (pandas path)."""
+    attack = np.asarray(is_attack).astype(bool)
+    labels = np.asarray(attack_type).astype(str)
+    names = sorted(set(labels[attack].tolist()))
+    codes = np.zeros(len(labels), dtype=np.int64)
+    if names:
+        lookup = {name: k + 1 for k, name in enumerate(names)}
+        codes[attack] = [lookup[label] for label in labels[attack]]
+    return codes, ["benign", *names]
+
+
+def rebucket(
+    offsets: Sequence[int],
+    start: int,
+    resolution: int,
+    new_resolution: int,
+    *series: Sequence,
+) -> Tuple[int, List[int], List[list]]:
+    """Merge stored buckets into buckets of new_resolution (a multiple of resolution).
+
+    series are per-bucket values (ints or lists of ints), summed element-wise.
+    Returns (new_start, new_offsets, merged series).
+    """
+    new_start = math.floor(start / new_resolution) * new_resolution
+    merged: Dict[int, List] = {}
+    for i, off in enumerate(offsets):
+        key = (start + off * resolution - new_start) // new_resolution
+        values = [s[i] for s in series]
+        if key not in merged:
+            merged[key] = [list(v) if isinstance(v, list) else v for v in values]
+            continue
+        acc = merged[key]
+        for k, v in enumerate(values):
+            if isinstance(v, list):
+                acc[k] = [a + b for a, b in zip(acc[k], v)]
+            else:
+                acc[k] += v
+    keys = sorted(merged)
+    return int(new_start), keys, [[merged[key][k] for key in keys] for k in range(len(series))]
@@ -0,0 +1,149 @@
+"""Inference tuning profile: XGBoost threads, inference block size, job slots per worker.
+
+Good values depend on the host (cores, caches, the container's CPU quota -
+XGBoost's default takes every core it sees, not the quota), so they are
+measured there: `python -m app.scripts.autotune_inference` scores synthetic
+rows with the active models over a grid and writes the fastest setting to
+TUNING_PROFILE_PATH. The worker reads it once at start.
+
+A profile keeps the host it was measured on (usable CPUs, CPU model) and is
+ignored on any other: one models volume may serve workers on several nodes.
+Non-zero XGB_NTHREAD / INFER_CHUNK_ROWS / WORKER_JOB_SLOTS override it. The
+API reads the same profile for the job slots behind its capacity estimates.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+
+def usable_cpus() -> int:
+    """CPUs this process may use: the affinity mask, capped by a cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "max 100000" or "<quota> <period>"
+        with open("/sys/fs/cgroup/cpu.max", "r", encoding="utf-8") as f:
+            q, period = f.read().split()[:2]
+        if q != "max":
+            quota = int(q) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r", encoding="utf-8") as f:
+                q = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r", encoding="utf-8") as f:
+                period = int(f.read())
+            if q > 0 and period > 0:
+                quota = q / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return ""
+
+
+def host_info() -> Dict[str, object]:
+    return {"cpus": usable_cpus(), "cpu_model": cpu_model()}
+
+
+@dataclass
+class InferenceTuning:
+    nthread: int = 0  # XGBoost threads per predict call, 0 = library default
+    chunk_rows: int = 0  # rows per predict call, 0 = the whole file at once
+    job_slots: int = 1  # jobs one worker process runs at the same time
+    # measured by the autotuner (preprocessing + inference of synthetic rows, all slots busy)
+    rows_per_second: Optional[float] = None
+    host: Dict[str, object] = field(default_factory=dict)
+    model_version: Optional[str] = None
+    measured_at: Optional[str] = None
+
+    def describe(self) -> str:
+        out = (
+            f"nthread={self.nthread or 'default'} chunk_rows={self.chunk_rows or 'all'} job_slots={self.job_slots}"
+        )
+        if self.rows_per_second:
+            out += f" (measured {self.rows_per_second:,.0f} rows/s on {self.measured_at})"
+        return out
+
+
+def read_profile(path: str) -> Optional[InferenceTuning]:
+    """None when there is no profile; ValueError when it is malformed."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: invalid JSON: {e}")
+    try:
+        return InferenceTuning(
+            nthread=int(raw.get("nthread") or 0),
+            chunk_rows=int(raw.get("chunk_rows") or 0),
+            job_slots=max(1, int(raw.get("job_slots") or 1)),
+            rows_per_second=raw.get("rows_per_second"),
+            host=dict(raw.get("host") or {}),
+            model_version=raw.get("model_version"),
+            measured_at=raw.get("measured_at"),
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{path}: {e}")
+
+
+def write_profile(path: str, tuning: InferenceTuning) -> None:
+    """Atomic replace (tmp file + rename): a starting worker never reads half a profile."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(asdict(tuning), f, indent=2)
+    os.replace(tmp, path)
+
+
+def worker_tuning(check_host: bool = True) -> InferenceTuning:
+    """The profile measured on this host (or defaults), with the env overrides applied.
+
+    check_host=False: the API's view of the workers - it shares their models
+    volume, not necessarily their host or CPU quota.
+    """
+    tuning = InferenceTuning()
+    path = settings.tuning_profile_path
+    if path:
+        try:
+            profile = read_profile(path)
+        except ValueError as e:
+            print(f"[tuning] profile ignored: {e}")
+            profile = None
+        if profile is not None:
+            host = host_info()
+            if not check_host or profile.host == host:
+                tuning = profile
+            else:
+                print(f"[tuning] {path} was measured on {profile.host}, this host is {host}: ignored")
+
+    if settings.xgb_nthread > 0:
+        tuning.nthread = settings.xgb_nthread
+    if settings.infer_chunk_rows > 0:
+        tuning.chunk_rows = settings.infer_chunk_rows
+    if settings.worker_job_slots > 0:
+        tuning.job_slots = settings.worker_job_slots
+    return tuning
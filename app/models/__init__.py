@@ -7,6 +7,9 @@ from .subscription import Subscription
 from .traffic_file import TrafficFile
 from .inference_job import InferenceJob
 from .prediction_summary import PredictionSummary
+from .prediction_timeline import PredictionTimeline
+from .user_rollup import UserDailyClassCount, UserDailyStats
+from .flow_prediction import FlowClass, FlowPrediction
 
 __all__ = [
     "Base",
@@ -17,4 +20,9 @@ __all__ = [
     "TrafficFile",
     "InferenceJob",
     "PredictionSummary",
+    "PredictionTimeline",
+    "UserDailyStats",
+    "UserDailyClassCount",
+    "FlowClass",
+    "FlowPrediction",
 ]
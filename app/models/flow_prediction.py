@@ -0,0 +1,54 @@
+import uuid
+from datetime import date
+
+from sqlalchemy import BigInteger, Boolean, Date, Float, Index, Integer, SmallInteger, String
+from sqlalchemy.dialects.postgresql import INET, UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+# inet in Postgres; plain text where the tables are created without it (SQLite in bench_pipeline)
+_Address = String(45).with_variant(INET(), "postgresql")
+
+
+class FlowClass(Base):
+    """Class names of flow_predictions.class_id (0 = benign, attack classes get ids on first use)."""
+
+    __tablename__ = "flow_classes"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+
+
+class FlowPrediction(Base):
+    """Row-level predictions loaded by COPY (app/services/flow_sink.py, FLOW_SINK_ENABLED).
+
+    Партиционирована по дню загрузки job-а (RANGE (day), партиция flow_predictions_pYYYYMMDD
+    создаётся при первой записи): retention = DROP партиции. Без внешнего ключа на
+    inference_jobs - проверка на каждую строку COPY дороже самой вставки.
+    """
+
+    __tablename__ = "flow_predictions"
+    __table_args__ = (
+        # "все Reconnaissance-потоки из 192.168.100.0/24": saddr << '192.168.100.0/24' идёт по btree как диапазон
+        Index("ix_flow_predictions_saddr_class", "saddr", "class_id"),
+        Index("ix_flow_predictions_daddr_class", "daddr", "class_id"),
+        {"postgresql_partition_by": "RANGE (day)"},
+    )
+
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    # номер строки в загрузке (= строка scored-файла), с 0
+    row_no: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # ключ партиции, входит в PK (так требует Postgres)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    saddr: Mapped[str | None] = mapped_column(_Address, nullable=True)
+    sport: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    daddr: Mapped[str | None] = mapped_column(_Address, nullable=True)
+    dport: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    is_attack: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    class_id: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    # P(attack) бинарной модели и вероятность выбранного класса (NULL: benign или pandas-путь)
+    attack_proba: Mapped[float | None] = mapped_column(Float(precision=24), nullable=True)
+    class_proba: Mapped[float | None] = mapped_column(Float(precision=24), nullable=True)
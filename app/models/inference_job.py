@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import String, DateTime, ForeignKey, func, Text
+from sqlalchemy import JSON, String, DateTime, ForeignKey, Index, func, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -10,8 +10,11 @@ class InferenceJob(Base):
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
 
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    # индекс по user_id — составной ix_inference_jobs_user_created_id (см. ниже)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     file_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("traffic_files.id"), nullable=False, index=True)
+    # общий id для файлов, загруженных одним batch-запросом
+    batch_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True, index=True)
 
     status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued")  # queued/running/done/failed
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -20,6 +23,35 @@ class InferenceJob(Base):
 
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # версия модели, закреплённая при загрузке (None = активная на момент обработки)
+    model_version: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    # время по стадиям пайплайна, мс: {"read_csv": 12.3, "infer_bin": 40.1, ..., "total": 80.0}
+    timings: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
     user = relationship("User", back_populates="jobs")
     file = relationship("TrafficFile", back_populates="jobs")
     summary = relationship("PredictionSummary", back_populates="job", uselist=False)
+
+
+# история задач пользователя: WHERE user_id = ? ORDER BY created_at DESC, id DESC (keyset)
+Index(
+    "ix_inference_jobs_user_created_id",
+    InferenceJob.user_id,
+    InferenceJob.created_at.desc(),
+    InferenceJob.id.desc(),
+)
+
+# admission control: jobs in flight, per user and in total (only queued / running rows are indexed)
+Index(
+    "ix_inference_jobs_in_flight",
+    InferenceJob.user_id,
+    postgresql_where=InferenceJob.status.in_(("queued", "running")),
+)
+
+# throughput of recently finished jobs
+Index(
+    "ix_inference_jobs_done_finished",
+    InferenceJob.finished_at,
+    postgresql_where=InferenceJob.status == "done",
+)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Integer, Float, String, DateTime, ForeignKey, func
+from sqlalchemy import JSON, BigInteger, Integer, Float, String, DateTime, ForeignKey, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -34,6 +34,21 @@ class PredictionSummary(Base):
     # путь к scored CSV
     scored_path: Mapped[str | None] = mapped_column(String(512), nullable=True)
 
+    # storage manager: hot / compressed / slim (только предсказания, сырые колонки берутся из upload) / expired
+    scored_state: Mapped[str] = mapped_column(String(16), nullable=False, default="hot", server_default="hot")
+    scored_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # разделитель исходного CSV, нужен для сборки slim-файла обратно
+    scored_sep: Mapped[str | None] = mapped_column(String(8), nullable=True)
+
+    # версия модели, которой фактически посчитан job
+    model_version: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    # строк по классам атак {"DDoS": 120, ...} (benign = rows_scored - attack_rows); для rollup-ов
+    class_counts: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
+    # сравнение с shadow-моделью: agreement, confusion, drift вероятностей (только для анализа, в API не отдаётся)
+    shadow_stats: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     job = relationship("InferenceJob", back_populates="summary")
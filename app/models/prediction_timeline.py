@@ -0,0 +1,33 @@
+import uuid
+from sqlalchemy import JSON, BigInteger, Integer, DateTime, ForeignKey, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+
+class PredictionTimeline(Base):
+    """Attack timeline of a job (app/ml/timeline.py).
+
+    Отдельная таблица, а не колонка prediction_summaries: summary грузится в каждом
+    списке job-ов, timeline нужен только эндпоинту /predictions/{job_id}/timeline.
+    """
+
+    __tablename__ = "prediction_timelines"
+
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("inference_jobs.id"), primary_key=True)
+
+    # ширина бакета, секунды (может быть больше TIMELINE_RESOLUTION_SECONDS, если не влезло в TIMELINE_MAX_BUCKETS)
+    resolution_seconds: Mapped[int] = mapped_column(Integer, nullable=False)
+    # epoch seconds начала бакета 0
+    start_ts: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    # classes[0] = benign, дальше классы атак; индексы совпадают с buckets["counts"][i]
+    classes: Mapped[list] = mapped_column(JSON, nullable=False)
+    # {"offsets": [...], "rows": [...], "attacks": [...], "counts": [[...]]}, только непустые бакеты
+    buckets: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+    # строки без stime/ltime (или с нулевым временем)
+    untimed_rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import String, Integer, DateTime, ForeignKey, func
+from sqlalchemy import BigInteger, String, Integer, DateTime, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -15,7 +15,16 @@ class TrafficFile(Base):
     stored_path: Mapped[str] = mapped_column(String(512), nullable=False)
     rows_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
+    # storage manager: hot (as uploaded) / compressed (.csv.zst at rest) / expired (deleted by retention)
+    storage_state: Mapped[str] = mapped_column(String(16), nullable=False, default="hot", server_default="hot")
+    stored_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    storage_updated_at: Mapped["DateTime | None"] = mapped_column(DateTime(timezone=True), nullable=True)
+
     created_at: Mapped["DateTime"] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     user = relationship("User", back_populates="files")
     jobs = relationship("InferenceJob", back_populates="file")
+
+
+# storage manager scans: "hot files older than X", "non-expired files older than Y"
+Index("ix_traffic_files_state_created", TrafficFile.storage_state, TrafficFile.created_at)
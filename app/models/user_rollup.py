@@ -0,0 +1,42 @@
+import uuid
+from datetime import date
+
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+
+class UserDailyStats(Base):
+    """Per-user, per-day totals of finished jobs (app/services/rollups.py).
+
+    День = дата загрузки job-а (inference_jobs.created_at, UTC): повторный прогон
+    job-а обновляет тот же день, а не переносит его.
+    """
+
+    __tablename__ = "user_daily_stats"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    jobs_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    jobs_failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rows_scored: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    attack_rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    updated_at: Mapped["DateTime"] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+class UserDailyClassCount(Base):
+    """Rows per attack class, per user and day (benign = rows_scored - attack_rows)."""
+
+    __tablename__ = "user_daily_class_counts"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    class_name: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    rows: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from pydantic import BaseModel
+
+
+class WorkOut(BaseModel):
+    jobs: int
+    bytes: int
+    # estimated worker-seconds: wall clock of one job slot (what is left for running jobs), not CPU time
+    seconds: float
+
+
+class ThroughputFitOut(BaseModel):
+    kind: str  # csv, csv.gz, parquet, pcap, ...; "*" = all kinds
+    jobs: int  # finished jobs fitted on
+    bytes_per_row: float
+    overhead_seconds: float
+    rows_per_second: float
+
+
+class CapacityOut(BaseModel):
+    """Pending work for the worker autoscaler (see app/services/capacity.py)."""
+
+    queued: WorkOut
+    running: WorkOut
+    pending_seconds: float
+    queue_messages: int | None = None  # None: RabbitMQ did not answer
+    consumers: int
+    job_slots: int  # jobs one worker runs at once (WORKER_JOB_SLOTS or the tuning profile)
+    # pending_seconds / (consumers * job_slots)
+    drain_seconds: float
+    model: list[ThroughputFitOut]
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import uuid
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PredictionSummaryOut(BaseModel):
@@ -16,6 +16,12 @@ class PredictionJobOut(BaseModel):
     job_id: uuid.UUID
     status: str
     summary: PredictionSummaryOut
+    # per-stage worker timings in ms (only on GET /predictions/{job_id})
+    timings: dict[str, float] | None = None
+    # model version that scored the job (before that: the pinned one, if any)
+    model_version: str | None = None
+    # upload responses only: seconds until the job is expected to be done (admission control estimate)
+    estimated_wait_seconds: float | None = None
 
 
 class PredictionJobListItemOut(PredictionJobOut):
@@ -23,3 +29,42 @@ class PredictionJobListItemOut(PredictionJobOut):
 
     created_at: str | None = None
     original_filename: str | None = None
+
+
+class PredictionStatusIn(BaseModel):
+    job_ids: list[uuid.UUID] = Field(default_factory=list, max_length=500)
+
+
+class PredictionJobStatusOut(PredictionJobListItemOut):
+    """Item of POST /predictions/status: error is inlined instead of X-Job-Error header."""
+
+    error_message: str | None = None
+
+
+class PredictionBatchOut(BaseModel):
+    """Aggregate view over jobs created by one batch upload."""
+
+    batch_id: uuid.UUID
+    status: str  # queued/running/done/failed/partial
+    total_jobs: int
+    status_counts: dict[str, int]
+    jobs: list[PredictionJobListItemOut]
+    # upload responses only: seconds until the whole batch is expected to be done
+    estimated_wait_seconds: float | None = None
+
+
+class TimelineBucketOut(BaseModel):
+    start: int  # epoch seconds
+    rows: int
+    attack_rows: int
+    class_counts: list[int]  # aligned with PredictionTimelineOut.classes
+
+
+class PredictionTimelineOut(BaseModel):
+    """Rows / attacks / classes per time bucket of the flows (stime), empty buckets omitted."""
+
+    job_id: uuid.UUID
+    resolution_seconds: int
+    classes: list[str]  # classes[0] = benign
+    untimed_rows: int  # rows without stime/ltime
+    buckets: list[TimelineBucketOut]
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import date
+
+from pydantic import BaseModel
+
+
+class DailyStatsOut(BaseModel):
+    day: date | None = None  # None in totals
+    jobs_done: int = 0
+    jobs_failed: int = 0
+    rows_scored: int = 0
+    attack_rows: int = 0
+    # rows per attack class; "unknown" = attacks of jobs from before per-class counts
+    class_counts: dict[str, int] = {}
+
+
+class DailyStatsPageOut(BaseModel):
+    """Per-day rollups of the user's jobs (by upload day, UTC), days without jobs omitted."""
+
+    since: date
+    until: date
+    days: list[DailyStatsOut]
+    totals: DailyStatsOut
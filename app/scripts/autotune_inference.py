@@ -0,0 +1,156 @@
+"""Autotune inference for this host: XGBoost threads, inference block size, job slots.
+
+Usage (inside the worker container, while the worker is idle - it uses the same CPUs):
+
+    python -m app.scripts.autotune_inference
+    python -m app.scripts.autotune_inference --rows 500000 --max-slots 8 --dry-run
+
+Scores synthetic BoT-IoT rows with the active model version (preprocessing +
+both models, what a job does between reading and writing the file) and
+measures the rows/s of the whole process:
+
+  1. threads x slots: every (nthread, job slots) with nthread * slots <= usable
+     CPUs (cgroup quota included), each slot scoring its own copy of the rows;
+  2. block size: the best pair again with inference in blocks of --chunks rows.
+
+A setting within --tolerance of the fastest wins when it is simpler (fewer
+slots, then fewer threads, then no blocks): every slot holds a file in memory.
+
+The winner is written to TUNING_PROFILE_PATH (restart the workers to apply)
+and printed as JSON. Reading / writing files is not measured, so the expected
+rows/s is an upper bound for real jobs.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.flows import flow_matrix
+from app.ml.bundle import XGBBundle
+from app.ml.synthetic import synthetic_frame
+from app.ml.tuning import InferenceTuning, host_info, usable_cpus, write_profile
+from app.worker import _load_models
+
+
+def _powers_of_two(limit: int) -> List[int]:
+    out = {1, limit}
+    k = 2
+    while k < limit:
+        out.add(k)
+        k *= 2
+    return sorted(out)
+
+
+def _measure(bundle: XGBBundle, X: np.ndarray, nthread: int, chunk_rows: int, slots: int, repeats: int) -> Dict:
+    for model in (bundle.bin_model, bundle.multi_model):
+        model.set_params(n_jobs=nthread)
+    # warm-up: thread pools of the new nthread
+    bundle.score_matrix(np.array(X[:1000], order="F"), chunk_rows=chunk_rows)
+
+    def run() -> None:
+        for _ in range(repeats):
+            # score_matrix preprocesses in place
+            bundle.score_matrix(np.array(X, order="F"), chunk_rows=chunk_rows)
+
+    t = time.perf_counter()
+    if slots == 1:
+        run()
+    else:
+        with ThreadPoolExecutor(slots) as pool:
+            for future in [pool.submit(run) for _ in range(slots)]:
+                future.result()
+    seconds = time.perf_counter() - t
+
+    rows_per_s = slots * repeats * X.shape[0] / seconds
+    return {
+        "nthread": nthread,
+        "job_slots": slots,
+        "chunk_rows": chunk_rows,
+        "rows_per_s": round(rows_per_s),
+        # one job of --rows rows while all slots are busy
+        "job_seconds": round(seconds / repeats, 3),
+    }
+
+
+def _pick(results: List[Dict], tolerance: float, simpler: Callable[[Dict], tuple]) -> Dict:
+    best = max(r["rows_per_s"] for r in results)
+    return min((r for r in results if r["rows_per_s"] >= best * (1.0 - tolerance)), key=simpler)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=200_000, help="rows per synthetic job")
+    p.add_argument("--attack-ratio", type=float, default=0.5)
+    p.add_argument("--repeats", type=int, default=3, help="jobs per slot and measurement")
+    p.add_argument("--max-slots", type=int, default=4)
+    p.add_argument("--chunks", default="16384,65536,262144", help="inference block sizes to try (rows)")
+    p.add_argument("--tolerance", type=float, default=0.03, help="slower by at most this share is a tie")
+    p.add_argument("--out", default=settings.tuning_profile_path)
+    p.add_argument("--dry-run", action="store_true", help="Only report, do not write the profile")
+    args = p.parse_args()
+
+    models = _load_models()
+    version, bundle = models.get()
+    frame = synthetic_frame(args.rows, args.attack_ratio, features=bundle.feature_union, seed=0)
+    X = flow_matrix(frame, bundle.feature_union)
+    del frame
+
+    cpus = usable_cpus()
+    print(f"[autotune] models={version} rows={args.rows} usable_cpus={cpus} host={host_info()}")
+
+    grid = [
+        (nthread, slots)
+        for slots in _powers_of_two(max(1, min(cpus, args.max_slots)))
+        for nthread in _powers_of_two(cpus)
+        if nthread * slots <= cpus
+    ]
+    results = []
+    for nthread, slots in grid:
+        results.append(_measure(bundle, X, nthread, 0, slots, args.repeats))
+        print(f"[threads x slots] {results[-1]}")
+    best = _pick(results, args.tolerance, lambda r: (r["job_slots"], r["nthread"]))
+
+    chunked = [best]
+    for chunk_rows in sorted({int(c) for c in args.chunks.split(",") if c.strip()}):
+        if 0 < chunk_rows < args.rows:
+            chunked.append(_measure(bundle, X, best["nthread"], chunk_rows, best["job_slots"], args.repeats))
+            print(f"[block size] {chunked[-1]}")
+    best = _pick(chunked, args.tolerance, lambda r: (r["chunk_rows"] > 0, r["chunk_rows"]))
+
+    tuning = InferenceTuning(
+        nthread=best["nthread"],
+        chunk_rows=best["chunk_rows"],
+        job_slots=best["job_slots"],
+        rows_per_second=float(best["rows_per_s"]),
+        host=host_info(),
+        model_version=version,
+        measured_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    )
+    if not args.dry_run:
+        write_profile(args.out, tuning)
+
+    default = next(r for r in results if r["nthread"] == cpus and r["job_slots"] == 1)
+    print(
+        "\n"
+        + json.dumps(
+            {
+                "chosen": tuning.describe(),
+                "expected_rows_per_s": best["rows_per_s"],
+                "job_seconds": best["job_seconds"],
+                "all_cpus_one_slot_rows_per_s": default["rows_per_s"],
+                "profile": None if args.dry_run else args.out,
+                "results": results + chunked[1:],
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Rebuild the per-user daily rollups (user_daily_stats, user_daily_class_counts)
+from the whole job history.
+
+Usage (inside the app container, after `alembic upgrade head`):
+
+    python -m app.scripts.backfill_rollups
+
+Run once after the migration that adds the rollups; safe to repeat (the tables
+are recomputed, not appended to) and safe while workers run - on Postgres
+they wait for the rebuild's lock and add their jobs afterwards. Jobs from
+before per-class counts were stored contribute their top class, the rest of
+their attacks goes to "unknown".
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.core.db import SessionLocal
+from app.services.rollups import rebuild
+
+
+def main() -> None:
+    argparse.ArgumentParser(description="Recompute per-user daily rollups from job history").parse_args()
+
+    t = time.perf_counter()
+    db = SessionLocal()
+    try:
+        jobs, days = rebuild(db)
+    finally:
+        db.close()
+    print(f"[rollups] {jobs} jobs -> {days} user-day rows in {time.perf_counter() - t:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark: flow_predictions load throughput (rows/s) through the worker's COPY sink.
+
+Usage (inside the app container, after `alembic upgrade head`):
+
+    python -m app.scripts.bench_flow_sink --rows 1000000 --jobs 3 --cleanup
+
+Synthetic rows shaped like a BoT-IoT upload (addresses / ports as strings,
+as the CSV reader returns them, ~70% attacks over 4 classes). Per job it
+times the CSV encoding alone and the full load (DELETE of the job's old
+rows + COPY into today's partition, indexes included) up to the commit.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import delete, select, text
+
+from app.core.db import SessionLocal
+from app.models import FlowPrediction, InferenceJob, TrafficFile, User
+from app.services import flow_sink
+from app.services.flow_sink import FlowRows
+from app.services.rollups import upload_day
+
+BENCH_EMAIL = "bench_flow_sink@clarus.local"
+CLASSES = ["benign", "DDoS", "DoS", "Reconnaissance", "Theft"]
+
+
+def _rows(n: int, seed: int) -> FlowRows:
+    rng = np.random.default_rng(seed)
+    hosts = np.array([f"192.168.100.{i}" for i in range(1, 255)] + [f"10.0.{i // 250}.{i % 250}" for i in range(2000)])
+    ports = np.array([str(p) for p in range(65536)], dtype=object)
+    codes = np.where(rng.random(n) < 0.7, rng.integers(1, len(CLASSES), n), 0).astype(np.int32)
+    proba_attack = np.where(codes > 0, rng.uniform(0.5, 1.0, n), rng.uniform(0.0, 0.5, n)).astype(np.float32)
+    proba_class = np.where(codes > 0, rng.uniform(0.3, 1.0, n), np.nan).astype(np.float32)
+    keys = {
+        "saddr": hosts[rng.integers(0, len(hosts), n)].astype(object),
+        "sport": ports[rng.integers(1024, 65536, n)],
+        "daddr": hosts[rng.integers(0, 254, n)].astype(object),
+        "dport": ports[rng.choice([22, 53, 80, 443, 1900, 8080], n)],
+    }
+    return FlowRows(codes, CLASSES, keys, proba_attack, proba_class)
+
+
+def _seed(db, n_jobs: int) -> tuple[uuid.UUID, list[uuid.UUID]]:
+    user = db.scalar(select(User).where(User.email == BENCH_EMAIL))
+    if not user:
+        user = User(email=BENCH_EMAIL, password_hash="bench", role="user", is_active=True)
+        db.add(user)
+        db.commit()
+    tf = TrafficFile(id=uuid.uuid4(), user_id=user.id, original_filename="bench.csv", stored_path="/dev/null")
+    db.add(tf)
+    jobs = [InferenceJob(id=uuid.uuid4(), user_id=user.id, file_id=tf.id, status="done") for _ in range(n_jobs)]
+    db.add_all(jobs)
+    db.commit()
+    return user.id, [job.id for job in jobs]
+
+
+def _cleanup(db, user_id: uuid.UUID, job_ids: list[uuid.UUID]) -> None:
+    db.execute(delete(FlowPrediction).where(FlowPrediction.job_id.in_(job_ids)))
+    db.execute(delete(InferenceJob).where(InferenceJob.user_id == user_id))
+    db.execute(delete(TrafficFile).where(TrafficFile.user_id == user_id))
+    db.commit()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1_000_000, help="rows per job")
+    p.add_argument("--jobs", type=int, default=3)
+    p.add_argument("--cleanup", action="store_true", help="Delete seeded jobs and their rows afterwards")
+    args = p.parse_args()
+
+    db = SessionLocal()
+    try:
+        user_id, job_ids = _seed(db, args.jobs)
+        results = []
+        for i, job_id in enumerate(job_ids):
+            job = db.get(InferenceJob, job_id)
+            rows = _rows(args.rows, seed=i)
+
+            t = time.perf_counter()
+            encoded = sum(len(chunk) for chunk in flow_sink.copy_chunks(job.id, upload_day(job.created_at), rows, range(5)))
+            encode_s = time.perf_counter() - t
+
+            t = time.perf_counter()
+            flow_sink.load(db, job, rows)
+            db.commit()
+            load_s = time.perf_counter() - t
+
+            results.append(
+                {
+                    "rows": args.rows,
+                    "csv_mb": round(encoded / 1e6, 1),
+                    "encode_rows_per_s": round(args.rows / encode_s),
+                    "load_s": round(load_s, 2),
+                    "load_rows_per_s": round(args.rows / load_s),
+                }
+            )
+            print(f"[job {i + 1}/{args.jobs}] {results[-1]}")
+
+        partition = flow_sink.partition_name(upload_day(db.get(InferenceJob, job_ids[0]).created_at))
+        size = db.scalar(text("SELECT pg_total_relation_size(:name)"), {"name": partition})
+        summary = {
+            "jobs": args.jobs,
+            "rows_per_job": args.rows,
+            "median_load_rows_per_s": round(statistics.median(r["load_rows_per_s"] for r in results)),
+            "partition": partition,
+            "partition_mb": round((size or 0) / 1e6, 1),
+            "results": results,
+        }
+        print("\n" + json.dumps(summary))
+
+        if args.cleanup:
+            _cleanup(db, user_id, job_ids)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Seeded benchmark: job history page latency vs page depth (OFFSET vs keyset).
+
+Usage (inside the app container, after `alembic upgrade head`):
+
+    python -m app.scripts.bench_job_history --jobs 50000 --limit 50
+
+Seeds N jobs for a dedicated bench user, then fetches pages at several depths
+through the same query as GET /predictions/jobs. With keyset pagination the
+latency should stay flat, with OFFSET it grows with depth.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from app.core.db import AsyncSessionLocal, SessionLocal
+from app.models import InferenceJob, TrafficFile, User
+from app.services.predictions import encode_cursor, fetch_jobs, list_jobs_page, user_jobs_select
+
+BENCH_EMAIL = "bench_history@clarus.local"
+
+
+def _seed(db, n_jobs: int) -> uuid.UUID:
+    user = db.scalar(select(User).where(User.email == BENCH_EMAIL))
+    if user:
+        have = db.query(InferenceJob).filter(InferenceJob.user_id == user.id).count()
+        if have == n_jobs:
+            print(f"[seed] reuse {have} jobs of {BENCH_EMAIL}")
+            return user.id
+        _cleanup(db, user.id)
+    else:
+        user = User(email=BENCH_EMAIL, password_hash="bench", role="user", is_active=True)
+        db.add(user)
+        db.commit()
+
+    user_id = user.id
+    file_id = uuid.uuid4()
+    db.execute(
+        insert(TrafficFile),
+        [{"id": file_id, "user_id": user_id, "original_filename": "bench.csv", "stored_path": "/dev/null"}],
+    )
+
+    t0 = datetime.now(timezone.utc) - timedelta(seconds=n_jobs)
+    chunk = 10_000
+    for start in range(0, n_jobs, chunk):
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "file_id": file_id,
+                "status": "done",
+                "created_at": t0 + timedelta(seconds=i),
+            }
+            for i in range(start, min(n_jobs, start + chunk))
+        ]
+        db.execute(insert(InferenceJob), rows)
+    db.commit()
+    print(f"[seed] inserted {n_jobs} jobs for {BENCH_EMAIL}")
+    return user_id
+
+
+def _cleanup(db, user_id: uuid.UUID) -> None:
+    db.execute(delete(InferenceJob).where(InferenceJob.user_id == user_id))
+    db.execute(delete(TrafficFile).where(TrafficFile.user_id == user_id))
+    db.commit()
+
+
+async def _timed(make_call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        async with AsyncSessionLocal() as adb:
+            t = time.perf_counter()
+            await make_call(adb)
+            samples.append((time.perf_counter() - t) * 1000.0)
+    return statistics.median(samples)
+
+
+async def _measure(user_id: uuid.UUID, n_jobs: int, limit: int, repeat: int) -> list[dict]:
+    depths = sorted({0, n_jobs // 10, n_jobs // 2, n_jobs * 9 // 10, max(0, n_jobs - limit)})
+
+    results = []
+    for depth in depths:
+        # cursor = last job of the previous page, found once outside the timing
+        cursor = None
+        if depth:
+            async with AsyncSessionLocal() as adb:
+                [prev] = await fetch_jobs(
+                    adb,
+                    user_jobs_select(user_id)
+                    .order_by(InferenceJob.created_at.desc(), InferenceJob.id.desc())
+                    .offset(depth - 1)
+                    .limit(1),
+                )
+            cursor = encode_cursor(prev)
+
+        offset_ms = await _timed(lambda adb: list_jobs_page(adb, user_id, limit=limit, offset=depth), repeat)
+        keyset_ms = await _timed(lambda adb: list_jobs_page(adb, user_id, limit=limit, cursor=cursor), repeat)
+        results.append({"depth": depth, "offset_ms": round(offset_ms, 2), "keyset_ms": round(keyset_ms, 2)})
+
+    return results
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--jobs", type=int, default=50_000)
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--cleanup", action="store_true", help="Delete seeded rows afterwards")
+    args = p.parse_args()
+
+    db = SessionLocal()
+    try:
+        user_id = _seed(db, args.jobs)
+
+        results = asyncio.run(_measure(user_id, args.jobs, args.limit, args.repeat))
+
+        print(f"\n{'depth':>10} {'offset ms':>12} {'keyset ms':>12}")
+        for r in results:
+            print(f"{r['depth']:>10} {r['offset_ms']:>12.2f} {r['keyset_ms']:>12.2f}")
+        print("\n" + json.dumps({"jobs": args.jobs, "limit": args.limit, "results": results}))
+
+        if args.cleanup:
+            _cleanup(db, user_id)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
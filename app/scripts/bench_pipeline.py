@@ -0,0 +1,309 @@
+"""Offline benchmark of the scoring pipeline (XGBBundle + worker stages).
+
+Generates synthetic BoT-IoT-shaped CSVs from the model feature schema and runs
+every case in a fresh process, so peak RSS is per case and nothing is warm:
+
+    python -m app.scripts.bench_pipeline --rows 1000,100000,1000000 --seps ",;" \\
+        --attack-ratios 0.1,0.5,0.9 --out /tmp/bench_new.json
+    python -m app.scripts.bench_pipeline --compare /tmp/bench_base.json /tmp/bench_new.json
+
+Nothing external is needed: by default the job goes through the real
+worker `_process_job` against an in-memory SQLite stand-in (`--db-url` can
+point to a local Postgres instead, `--db-url ""` scores the file without any
+DB). RabbitMQ is not involved - the job id is handed to the worker directly.
+
+Per case: stage times (load_models, read_csv, preprocess, infer_bin, infer_multi,
+summary, write_scored, db_commit), rows/s, peak RSS and the input size.
+Generated CSVs are cached in --work-dir by (rows, sep, attack ratio, seed).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+DEFAULT_ROWS = "1000,100000,1000000"
+SEP_NAMES = {",": "comma", ";": "semicolon", "\t": "tab"}
+
+# stage medians/throughput compared with --compare; lower is better except rows_per_s
+COMPARED = ("total_s", "rows_per_s", "peak_rss_mb")
+
+
+def _model_paths(models_dir: str) -> Dict[str, str]:
+    return {
+        "xgb_bin_path": os.path.join(models_dir, "xgb_bin.json"),
+        "xgb_multi_path": os.path.join(models_dir, "xgb_multi.json"),
+        "class_mapping_path": os.path.join(models_dir, "class_mapping.json"),
+        "features_bin_path": os.path.join(models_dir, "features_bin.json"),
+        "features_multi_path": os.path.join(models_dir, "features_multi.json"),
+    }
+
+
+def _ensure_input(work_dir: str, models_dir: str, rows: int, sep: str, attack_ratio: float, seed: int) -> str:
+    from app.ml.synthetic import load_feature_names, write_synthetic_csv
+
+    name = f"bot_iot_{rows}_{SEP_NAMES.get(sep, 'sep')}_{int(attack_ratio * 100)}_{seed}.csv"
+    path = os.path.join(work_dir, "inputs", name)
+    if not os.path.exists(path):
+        paths = _model_paths(models_dir)
+        features = load_feature_names(paths["features_bin_path"], paths["features_multi_path"])
+        t = time.perf_counter()
+        write_synthetic_csv(path + ".tmp", rows, sep=sep, attack_ratio=attack_ratio, features=features, seed=seed)
+        os.replace(path + ".tmp", path)
+        print(f"[bench] generated {name} in {time.perf_counter() - t:.1f}s")
+    return path
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def _seed_job(db, stored_path: str) -> uuid.UUID:
+    from app.models import InferenceJob, TrafficFile, User
+
+    user = User(id=uuid.uuid4(), email=f"bench_{uuid.uuid4().hex[:8]}@clarus.local", password_hash="bench")
+    tf = TrafficFile(
+        id=uuid.uuid4(),
+        user_id=user.id,
+        original_filename=os.path.basename(stored_path),
+        stored_path=stored_path,
+    )
+    job = InferenceJob(id=uuid.uuid4(), user_id=user.id, file_id=tf.id, status="queued")
+    db.add_all([user, tf, job])
+    db.commit()
+    return job.id
+
+
+def _run_case(models_dir: str, stored_path: str, out_dir: str, db_url: str) -> Dict[str, object]:
+    """Child process body: load models, run one file through the worker, report."""
+    from app.core.timing import StageTimer
+    from app.ml.bundle import XGBBundle
+
+    rss_start = _peak_rss_mb()
+    t = time.perf_counter()
+    bundle = XGBBundle.load(**_model_paths(models_dir))
+    load_s = time.perf_counter() - t
+
+    if db_url:
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+
+        from app import worker
+        from app.core.config import settings
+        from app.core.db import Base
+        from app.ml.registry import BundleRegistry
+        from app.models import InferenceJob
+
+        settings.uploads_dir = out_dir
+        engine = create_engine(db_url)
+        Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            job_id = _seed_job(db, stored_path)
+            t = time.perf_counter()
+            # the UUID itself: unlike Postgres, SQLite does not cast a str id
+            worker._process_job(db, BundleRegistry.single(bundle), job_id)  # type: ignore[arg-type]
+            total_s = time.perf_counter() - t
+
+            job = db.get(InferenceJob, job_id)
+            if job is None or job.status != "done":
+                raise RuntimeError(f"bench job failed: {job.error_message if job else 'missing'}")
+            stages = {k: v / 1000.0 for k, v in (job.timings or {}).items() if k != "total"}
+            rows = job.summary.rows_scored
+            attack_share = job.summary.attack_share
+        engine.dispose()
+    else:
+        from app.worker import _score_file
+
+        timer = StageTimer()
+        result = _score_file(bundle, stored_path, timer, out_dir=out_dir)
+        total_s = timer.elapsed()
+        stages = dict(timer.stages)
+        rows = result.total
+        attack_share = result.attack_ratio
+
+    stages = {"load_models": load_s, **stages}
+    return {
+        "rows": rows,
+        "attack_share": round(float(attack_share or 0.0), 4),
+        "total_s": round(total_s, 4),
+        "rows_per_s": round(rows / total_s, 1) if total_s > 0 else 0.0,
+        "stages_s": {k: round(v, 4) for k, v in stages.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_after_import_mb": rss_start,
+    }
+
+
+def _run_isolated(*args) -> Dict[str, object]:
+    # spawn: a clean interpreter per case, RSS of the parent does not leak in
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_run_case, args)
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, object]:
+    import numpy
+    import pandas
+    import xgboost
+
+    return {
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "xgboost": xgboost.__version__,
+        "db": args.db_url.split(":", 1)[0] if args.db_url else None,
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
+
+def _merge_runs(runs: List[Dict[str, object]]) -> Dict[str, object]:
+    """Median over repeats, stage by stage."""
+    merged = dict(runs[-1])
+    for key in ("total_s", "rows_per_s", "peak_rss_mb"):
+        merged[key] = round(_median([float(r[key]) for r in runs]), 4)
+    stage_names = runs[-1]["stages_s"].keys()  # type: ignore[union-attr]
+    merged["stages_s"] = {
+        name: round(_median([float(r["stages_s"].get(name, 0.0)) for r in runs]), 4)  # type: ignore[union-attr]
+        for name in stage_names
+    }
+    return merged
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    os.makedirs(args.work_dir, exist_ok=True)
+    out_dir = os.path.join(args.work_dir, "scored")
+
+    cases: List[Dict[str, object]] = []
+    for rows in [int(x) for x in args.rows.split(",") if x]:
+        for sep in args.seps:
+            for ratio in [float(x) for x in args.attack_ratios.split(",") if x]:
+                stored_path = _ensure_input(args.work_dir, args.models_dir, rows, sep, ratio, args.seed)
+                runs = [
+                    _run_isolated(args.models_dir, stored_path, out_dir, args.db_url)
+                    for _ in range(max(1, args.repeat))
+                ]
+                case = {
+                    "case": f"{rows}/{SEP_NAMES.get(sep, sep)}/{ratio:g}",
+                    "sep": sep,
+                    "attack_ratio": ratio,
+                    "input_mb": round(os.path.getsize(stored_path) / (1024.0 * 1024.0), 2),
+                    **_merge_runs(runs),
+                }
+                cases.append(case)
+                print(
+                    f"[bench] {case['case']:<24} {case['total_s']:>9.3f}s "
+                    f"{case['rows_per_s']:>12.0f} rows/s {case['peak_rss_mb']:>9.1f} MB"
+                )
+
+                if not args.keep_files:
+                    for name in os.listdir(out_dir):
+                        os.remove(os.path.join(out_dir, name))
+
+    return {"meta": _meta(args), "cases": cases}
+
+
+def print_report(result: Dict[str, object]) -> None:
+    cases = result["cases"]
+    stages: List[str] = []
+    for c in cases:  # type: ignore[union-attr]
+        stages += [s for s in c["stages_s"] if s not in stages]
+
+    print(f"\n{'case':<24} {'rows/s':>12} {'rss MB':>8} " + " ".join(f"{s[:12]:>12}" for s in stages))
+    for c in cases:  # type: ignore[union-attr]
+        print(
+            f"{c['case']:<24} {c['rows_per_s']:>12.0f} {c['peak_rss_mb']:>8.1f} "
+            + " ".join(f"{c['stages_s'].get(s, 0.0):>12.4f}" for s in stages)
+        )
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> bool:
+    """Prints per-case deltas; returns True if some metric regressed beyond threshold."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"base: {base['meta'].get('git_rev')}  new: {new['meta'].get('git_rev')}  threshold: {threshold:.0%}")
+    print(f"{'case':<24} {'metric':<14} {'base':>12} {'new':>12} {'delta':>8}")
+
+    base_cases = {c["case"]: c for c in base["cases"]}
+    regressed = False
+    for n in new["cases"]:
+        b = base_cases.get(n["case"])
+        if not b:
+            continue
+        metrics = [(m, b[m], n[m]) for m in COMPARED]
+        metrics += [(f"  {s}", b["stages_s"].get(s), v) for s, v in n["stages_s"].items()]
+        for name, old, cur in metrics:
+            if not old or cur is None:
+                continue
+            delta = (cur - old) / old
+            worse = -delta if name == "rows_per_s" else delta
+            flag = ""
+            # stage lines are informational, the gate is on the case totals
+            if worse > threshold and not name.startswith(" "):
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"{n['case']:<24} {name:<14} {old:>12.4f} {cur:>12.4f} {delta:>+8.1%}{flag}")
+    return regressed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--models-dir", default="models")
+    p.add_argument("--work-dir", default="/tmp/clarus_bench")
+    p.add_argument("--rows", default=DEFAULT_ROWS, help="Comma-separated row counts (up to 50000000)")
+    p.add_argument("--seps", default=",;", help="Separators to generate, e.g. ',;'")
+    p.add_argument("--attack-ratios", default="0.1,0.5,0.9")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=1, help="Runs per case, the median is reported")
+    p.add_argument("--db-url", default="sqlite://", help="DB stand-in for the worker path; '' = no DB")
+    p.add_argument("--keep-files", action="store_true", help="Keep scored outputs")
+    p.add_argument("--out", default=None, help="Write JSON result here")
+    p.add_argument("--compare", nargs=2, metavar=("BASE_JSON", "NEW_JSON"))
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative regression allowed by --compare")
+    p.add_argument("--fail-on-regression", action="store_true")
+    args = p.parse_args()
+
+    if args.compare:
+        regressed = compare(*args.compare, threshold=args.threshold)
+        if regressed and args.fail_on_regression:
+            sys.exit(1)
+        return
+
+    result = run(args)
+    print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
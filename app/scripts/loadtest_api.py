@@ -0,0 +1,501 @@
+"""HTTP load test for the Clarus-IoT API (stdlib only, no extra deps).
+
+Run against a started stack (docker compose up - api, worker, Postgres and
+RabbitMQ all local), e.g. to compare the sync and the async DB layer at 500
+concurrent clients:
+
+    python -m app.scripts.loadtest_api --base-url http://localhost --clients 500 \\
+        --duration 30 --out /tmp/async.json
+    python -m app.scripts.loadtest_api --compare /tmp/sync.json /tmp/async.json
+
+Scenarios: auth (register + login), renew, upload (bursts of CSV uploads),
+polling, history (cursor walk over job history), download (scored CSVs) and
+mixed (weighted analyst session). To find how many analysts fit before p99
+degrades, give several client counts - every step runs the same scenario and
+the last step within the budget is reported as capacity:
+
+    python -m app.scripts.loadtest_api --scenario mixed --clients 50,100,200,500 \\
+        --p99-budget-ms 500 --out /tmp/capacity.json
+
+Every client is a thread with its own keep-alive connection looping over the
+scenario. Reported per endpoint: requests/sec, latency p50/p95/p99, error rate.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+class Stats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    def add_bytes(self, name: str, n: int) -> None:
+        with self._lock:
+            self.bytes[name] += n
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self, duration: float) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        names = sorted(self.latencies)
+        for name in names + ["TOTAL"]:
+            lat = (
+                [x for n in names for x in self.latencies[n]]
+                if name == "TOTAL"
+                else self.latencies[name]
+            )
+            if not lat:
+                continue
+            errors = sum(self.errors.values()) if name == "TOTAL" else self.errors[name]
+            lat_ms = sorted(x * 1000.0 for x in lat)
+            out[name] = {
+                "requests": len(lat_ms),
+                "rps": round(len(lat_ms) / duration, 2),
+                "p50_ms": round(_percentile(lat_ms, 50), 2),
+                "p95_ms": round(_percentile(lat_ms, 95), 2),
+                "p99_ms": round(_percentile(lat_ms, 99), 2),
+                "mean_ms": round(statistics.fmean(lat_ms), 2),
+                "error_rate": round(errors / len(lat_ms), 4),
+            }
+            if name in self.bytes:
+                out[name]["mb_per_s"] = round(self.bytes[name] / duration / (1024.0 * 1024.0), 2)
+        return out
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Client:
+    """One simulated analyst: keep-alive connection + bearer token."""
+
+    def __init__(self, base_url: str, stats: Stats, timeout: float = 30.0) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self.stats = stats
+        self.token: Optional[str] = None
+        self.state: Dict[str, object] = {}
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def request(
+        self,
+        name: str,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: Optional[Dict[str, str]] = None,
+        expect: tuple = (200, 201),
+    ) -> tuple[int, bytes, Dict[str, str]]:
+        hdrs = {"accept": "application/json"}
+        if self.token:
+            hdrs["Authorization"] = f"Bearer {self.token}"
+        hdrs.update(headers or {})
+
+        t = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=hdrs)
+            resp = conn.getresponse()
+            data = resp.read()
+            status, resp_headers = resp.status, {k.lower(): v for k, v in resp.getheaders()}
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, data, resp_headers = 0, b"", {}
+        self.stats.record(name, time.perf_counter() - t, status in expect)
+        return status, data, resp_headers
+
+    def json(self, name: str, method: str, path: str, payload: object | None = None, **kw):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else None
+        status, data, _ = self.request(name, method, path, body=body, headers=headers, **kw)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------- setup ----------
+
+def login(client: Client, email: str, password: str) -> None:
+    client.json("POST /auth/register", "POST", "/auth/register", {"email": email, "password": password}, expect=(201, 409))
+    form = urlencode({"username": email, "password": password}).encode("utf-8")
+    status, data, _ = client.request(
+        "POST /auth/login",
+        "POST",
+        "/auth/login",
+        body=form,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+    if status != 200:
+        raise RuntimeError(f"login failed for {email}: HTTP {status} {data[:200]!r}")
+    client.token = json.loads(data)["access_token"]
+
+
+def multipart(field: str, filename: str, content: bytes, content_type: str = "text/csv") -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode("utf-8"),
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode("utf-8"),
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8"),
+            content,
+            f"\r\n--{boundary}--\r\n".encode("utf-8"),
+        ]
+    )
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def upload(client: Client, filename: str, content: bytes) -> Optional[str]:
+    body, content_type = multipart("csv_file", filename, content)
+    status, data, _ = client.request(
+        "POST /predictions/upload",
+        "POST",
+        "/predictions/upload",
+        body=body,
+        headers={"Content-Type": content_type},
+    )
+    if status != 200:
+        return None
+    return json.loads(data)["job_id"]
+
+
+def wait_done(client: Client, job_ids: List[str], timeout: float) -> List[str]:
+    """Poll until the jobs are finished; returns the ids that ended up done."""
+    deadline = time.monotonic() + timeout
+    pending = list(job_ids)
+    done: List[str] = []
+    while pending and time.monotonic() < deadline:
+        status, items = client.json("POST /predictions/status", "POST", "/predictions/status", {"job_ids": pending})
+        if status == 200 and items:
+            finished = {j["job_id"]: j["status"] for j in items if j["status"] in ("done", "failed")}
+            done += [jid for jid, st in finished.items() if st == "done"]
+            pending = [jid for jid in pending if jid not in finished]
+        if pending:
+            time.sleep(1.0)
+    return done
+
+
+# ---------- scenarios: one iteration of a simulated client ----------
+
+def scenario_auth(client: Client) -> None:
+    """New analyst: register + login. Dominated by bcrypt on the API side."""
+    client.token = None
+    try:
+        login(client, f"loadtest_{uuid.uuid4().hex[:12]}@clarus.local", "loadtest123")
+    except RuntimeError:
+        pass  # already counted as an error of POST /auth/login
+
+
+def scenario_renew(client: Client) -> None:
+    """Subscription renew + the status read right after it (cache invalidation path)."""
+    client.json("POST /billing/renew", "POST", "/billing/renew", {"plan_code": "MONTHLY_1M"})
+    client.json("GET /billing/subscription", "GET", "/billing/subscription")
+
+
+def scenario_upload(client: Client) -> None:
+    """Burst of uploads back to back, as when an analyst drops a folder of captures."""
+    content: bytes = client.state["upload_body"]  # type: ignore[assignment]
+    name: str = client.state["upload_name"]  # type: ignore[assignment]
+    for _ in range(int(client.state.get("burst", 1))):  # type: ignore[arg-type]
+        upload(client, name, content)
+
+
+def scenario_polling(client: Client) -> None:
+    """Dashboard refresh: history page + subscription + batched statuses."""
+    status, jobs = client.json("GET /predictions/jobs", "GET", "/predictions/jobs?limit=20")
+    client.json("GET /billing/subscription", "GET", "/billing/subscription")
+    if status == 200 and jobs:
+        ids = [j["job_id"] for j in jobs[:20]]
+        client.json("POST /predictions/status", "POST", "/predictions/status", {"job_ids": ids})
+
+
+def scenario_history(client: Client) -> None:
+    """Scroll through job history following X-Next-Cursor."""
+    cursor: Optional[str] = None
+    for _ in range(int(client.state.get("history_pages", 5))):  # type: ignore[arg-type]
+        path = "/predictions/jobs?" + urlencode({"limit": 50, **({"cursor": cursor} if cursor else {})})
+        status, _, headers = client.request("GET /predictions/jobs?cursor", "GET", path)
+        cursor = headers.get("x-next-cursor")
+        if status != 200 or not cursor:
+            break
+
+
+def scenario_download(client: Client) -> None:
+    """Scored CSV download of a finished (large) job."""
+    job_ids: List[str] = client.state.get("download_jobs") or []  # type: ignore[assignment]
+    if not job_ids:
+        return
+    job_id = random.choice(job_ids)
+    status, data, _ = client.request("GET /predictions/{id}/download", "GET", f"/predictions/{job_id}/download")
+    if status == 200:
+        client.stats.add_bytes("GET /predictions/{id}/download", len(data))
+
+
+# weights of the mixed analyst session
+MIXED = [
+    (scenario_polling, 70),
+    (scenario_history, 12),
+    (scenario_download, 6),
+    (scenario_upload, 6),
+    (scenario_renew, 5),
+    (scenario_auth, 1),
+]
+
+
+def scenario_mixed(client: Client) -> None:
+    steps, weights = zip(*MIXED)
+    step = random.choices(steps, weights=weights)[0]
+    token = client.token
+    step(client)
+    # auth replaces the token with a fresh account without a subscription
+    client.token = token
+
+
+SCENARIOS: Dict[str, Callable[[Client], None]] = {
+    "auth": scenario_auth,
+    "renew": scenario_renew,
+    "upload": scenario_upload,
+    "polling": scenario_polling,
+    "history": scenario_history,
+    "download": scenario_download,
+    "mixed": scenario_mixed,
+}
+
+# scenarios that need finished jobs to exist before the clock starts
+NEEDS_JOBS = {"polling", "history", "download", "mixed"}
+
+
+def _setup_users(base_url: str, users: int, options: Dict[str, object]) -> List[Dict[str, object]]:
+    """Shared accounts with an active subscription (and finished jobs when needed).
+
+    A few shared accounts: per-client registration would measure bcrypt, not the API.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    accounts: List[Dict[str, object]] = []
+    for i in range(max(1, users)):
+        c = Client(base_url, Stats())
+        login(c, f"loadtest_{run_id}_{i}@clarus.local", "loadtest123")
+        c.json("POST /billing/renew", "POST", "/billing/renew", {"plan_code": "MONTHLY_1M"})
+        accounts.append({"token": c.token or "", "download_jobs": []})
+
+        if options.get("seed_jobs"):
+            ids = [
+                upload(c, options["download_name"], options["download_body"])  # type: ignore[arg-type]
+                for _ in range(int(options.get("seed_jobs", 0)))  # type: ignore[arg-type]
+            ]
+            accounts[-1]["pending"] = [x for x in ids if x]
+        c.close()
+
+    if options.get("seed_jobs"):
+        c = Client(base_url, Stats())
+        for acc in accounts:
+            c.token = acc["token"]  # type: ignore[assignment]
+            acc["download_jobs"] = wait_done(c, acc.pop("pending"), float(options.get("seed_timeout", 300.0)))  # type: ignore[arg-type]
+        c.close()
+        if not any(acc["download_jobs"] for acc in accounts):
+            print("[loadtest] warning: no seeded job finished, downloads will be skipped")
+
+    return accounts
+
+
+def run(
+    base_url: str,
+    scenario: str,
+    clients: int,
+    duration: float,
+    accounts: List[Dict[str, object]],
+    options: Dict[str, object],
+) -> Dict[str, object]:
+    stats = Stats()
+    step = SCENARIOS[scenario]
+    deadline = time.monotonic() + duration
+    barrier = threading.Barrier(clients)
+
+    def worker(idx: int) -> None:
+        client = Client(base_url, stats)
+        acc = accounts[idx % len(accounts)]
+        client.token = acc["token"]  # type: ignore[assignment]
+        client.state.update(options)
+        client.state["download_jobs"] = acc["download_jobs"]
+        barrier.wait()
+        try:
+            while time.monotonic() < deadline:
+                step(client)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        "base_url": base_url,
+        "scenario": scenario,
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "endpoints": stats.report(elapsed),
+    }
+
+
+def capacity(steps: List[Dict[str, object]], p99_budget_ms: float, max_error_rate: float) -> Optional[int]:
+    """Largest client count whose overall p99 and error rate stay within budget."""
+    best: Optional[int] = None
+    for result in sorted(steps, key=lambda r: r["clients"]):  # type: ignore[arg-type, return-value]
+        total = result["endpoints"].get("TOTAL")  # type: ignore[union-attr]
+        if not total or total["p99_ms"] > p99_budget_ms or total["error_rate"] > max_error_rate:
+            break
+        best = result["clients"]  # type: ignore[assignment]
+    return best
+
+
+def print_report(result: Dict[str, object]) -> None:
+    print(f"\nscenario={result['scenario']} clients={result['clients']} duration={result['duration_s']}s")
+    print(f"{'endpoint':<36} {'req':>8} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}")
+    for name, r in result["endpoints"].items():  # type: ignore[union-attr]
+        mbps = f" {r['mb_per_s']:.1f} MB/s" if "mb_per_s" in r else ""
+        print(
+            f"{name:<36} {r['requests']:>8} {r['rps']:>9.1f} {r['p50_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['error_rate'] * 100:>7.2f}{mbps}"
+        )
+
+
+def _steps(doc: Dict[str, object]) -> List[Dict[str, object]]:
+    # single run or a ramp of runs
+    return doc["steps"] if "steps" in doc else [doc]  # type: ignore[return-value]
+
+
+def compare(base_path: str, new_path: str) -> None:
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    base_steps = {s["clients"]: s for s in _steps(base)}
+    for step in _steps(new):
+        b_step = base_steps.get(step["clients"])
+        if not b_step:
+            continue
+        print(f"\nclients={step['clients']}")
+        print(f"{'endpoint':<36} {'rps base':>10} {'rps new':>10} {'x':>6} {'p99 base':>10} {'p99 new':>10}")
+        for name, b in b_step["endpoints"].items():
+            n = step["endpoints"].get(name)
+            if not n:
+                continue
+            ratio = n["rps"] / b["rps"] if b["rps"] else float("inf")
+            print(
+                f"{name:<36} {b['rps']:>10.1f} {n['rps']:>10.1f} {ratio:>6.2f} "
+                f"{b['p99_ms']:>10.1f} {n['p99_ms']:>10.1f}"
+            )
+
+    if "capacity" in base or "capacity" in new:
+        print(f"\ncapacity (clients): base={base.get('capacity')} new={new.get('capacity')}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--base-url", default="http://localhost")
+    p.add_argument("--scenario", default="polling", choices=sorted(SCENARIOS))
+    p.add_argument("--clients", default="500", help="Concurrent clients; a comma-separated list runs a ramp")
+    p.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    p.add_argument("--users", type=int, default=20, help="Distinct accounts shared by the clients")
+    p.add_argument("--upload-file", default="data/test_data.csv", help="CSV sent by the upload scenario")
+    p.add_argument("--burst", type=int, default=5, help="Uploads per iteration of the upload scenario")
+    p.add_argument("--history-pages", type=int, default=5)
+    p.add_argument("--download-file", default=None, help="CSV seeded for downloads (default: --upload-file)")
+    p.add_argument("--seed-jobs", type=int, default=2, help="Finished jobs per account before the run")
+    p.add_argument("--p99-budget-ms", type=float, default=500.0)
+    p.add_argument("--max-error-rate", type=float, default=0.01)
+    p.add_argument("--out", default=None, help="Write JSON result here")
+    p.add_argument("--compare", nargs=2, metavar=("BASE_JSON", "NEW_JSON"))
+    args = p.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    download_file = args.download_file or args.upload_file
+    with open(args.upload_file, "rb") as f:
+        upload_body = f.read()
+    with open(download_file, "rb") as f:
+        download_body = f.read()
+
+    options: Dict[str, object] = {
+        "upload_name": os.path.basename(args.upload_file),
+        "upload_body": upload_body,
+        "burst": args.burst,
+        "history_pages": args.history_pages,
+        "download_name": os.path.basename(download_file),
+        "download_body": download_body,
+        "seed_jobs": args.seed_jobs if args.scenario in NEEDS_JOBS else 0,
+    }
+
+    accounts = _setup_users(args.base_url, args.users, options)
+    # the bodies stay in the options of every client, drop the seeding-only one
+    options.pop("download_body")
+
+    steps = []
+    for clients in [int(x) for x in args.clients.split(",") if x]:
+        result = run(args.base_url, args.scenario, clients, args.duration, accounts, options)
+        print_report(result)
+        steps.append(result)
+
+    doc: Dict[str, object] = steps[0]
+    if len(steps) > 1:
+        cap = capacity(steps, args.p99_budget_ms, args.max_error_rate)
+        print(f"\ncapacity: {cap} clients within p99 <= {args.p99_budget_ms:g} ms, errors <= {args.max_error_rate:.1%}")
+        doc = {
+            "scenario": args.scenario,
+            "p99_budget_ms": args.p99_budget_ms,
+            "max_error_rate": args.max_error_rate,
+            "capacity": cap,
+            "steps": steps,
+        }
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,46 @@
+"""Train the binary + multi-class XGBoost bundle on BoT-IoT.
+
+Two modes:
+  default   whole CSV in pandas (fine for bot_iot_small.csv, ~71k rows)
+  --stream  out-of-core for the full dataset (tens of millions of rows):
+            pass 1 parses the CSV chunk by chunk into float32 spill files and
+            collects column stats (min/max, a uniform row sample for medians);
+            then both models read the spill through xgboost.DataIter into a
+            QuantileDMatrix (or an external-memory DMatrix with --cache-dir).
+            The CSV is parsed once; memory is ~one chunk + the quantized matrix.
+
+Both modes train the two models concurrently, each with its own thread
+budget, and write wall time / peak RSS to meta.json.
+
+--search replaces the fixed 400 trees x depth 6 with a parallel grid search
+over depth / learning rate, early-stopped on the held-out split. Candidates
+are ranked by held-out error + cost_weight x inference cost (trees x depth,
+relative to the fixed config); the winner is cut at its best iteration.
+
+Feature importances (total gain, or mean |SHAP| on held-out rows) are
+always written to meta.json. --prune retrains on the top-k features
+(binary search on k) and keeps the smallest set within --prune-tolerance
+of the full model's held-out accuracy; features_*.json then list only
+those columns, and the worker's CSV reader parses only them.
+"""
 from __future__ import annotations
 
 import argparse
 import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from xgboost import XGBClassifier
@@ -30,6 +65,14 @@ DROP_COLS_COMMON = [
 TARGET_BIN = "attack"
 TARGET_MULTI = "category"
 
+# the fixed config (and the cost unit of --search)
+BASE_ROUNDS = 400
+BASE_DEPTH = 6
+BASE_LR = 0.1
+
+# held-out rows for the measured inference throughput
+THROUGHPUT_ROWS = 200_000
+
 
 def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -50,7 +93,329 @@ def _drop_zero_var(df: pd.DataFrame) -> tuple[pd.DataFrame, list[str]]:
     return df.drop(columns=zero_var, errors="ignore"), zero_var
 
 
-def train_and_export(input_csv: Path, out_dir: Path, test_size: float = 0.2, seed: int = 42) -> None:
+def _peak_rss_mb() -> float:
+    # ru_maxrss: kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def _thread_budgets(threads: int, cost_bin: float, cost_multi: float, bin_threads: int = 0) -> Tuple[int, int]:
+    """Split `threads` between the two concurrent trainings, proportional to their cost.
+
+    With a single core both get 1 thread (time-sliced), otherwise the budgets
+    add up to `threads` so the trainings do not oversubscribe the CPU.
+    """
+    total = max(1, threads or os.cpu_count() or 1)
+    if total == 1:
+        return 1, 1
+    if bin_threads > 0:
+        b = bin_threads
+    else:
+        b = round(total * cost_bin / max(cost_bin + cost_multi, 1e-9))
+    b = min(max(1, b), total - 1)
+    return b, total - b
+
+
+def _run_concurrently(tasks: Dict[str, Callable[[], object]]) -> Tuple[Dict[str, object], Dict[str, float]]:
+    """Run callables in parallel threads (xgboost releases the GIL). Returns (results, seconds)."""
+
+    def timed(fn: Callable[[], object]) -> Tuple[object, float]:
+        t = time.perf_counter()
+        return fn(), time.perf_counter() - t
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = {name: pool.submit(timed, fn) for name, fn in tasks.items()}
+        done = {name: f.result() for name, f in futures.items()}
+    return {k: v[0] for k, v in done.items()}, {k: round(v[1], 3) for k, v in done.items()}
+
+
+def _xgb_params(task: str, seed: int, n_classes: int = 2) -> dict:
+    """xgb.train params of the fixed config (same as the XGBClassifier of the in-memory mode)."""
+    params = {
+        "max_depth": BASE_DEPTH,
+        "eta": BASE_LR,
+        "subsample": 0.8,
+        "colsample_bytree": 0.8,
+        "tree_method": "hist",
+        "seed": seed,
+    }
+    if task == "bin":
+        # error first: early stopping watches the last metric
+        params.update(objective="binary:logistic", eval_metric=["error", "logloss"])
+    else:
+        params.update(objective="multi:softprob", num_class=n_classes, eval_metric=["merror", "mlogloss"])
+    return params
+
+
+def _as_classifier(booster: xgb.Booster, n_classes: int, seed: int, chosen: Optional[dict] = None) -> XGBClassifier:
+    """Native booster as a fitted XGBClassifier: save_model then stores the
+    scikit-learn meta (n_classes_, classes_) that XGBBundle.load relies on."""
+    chosen = chosen or {}
+    clf = XGBClassifier(
+        n_estimators=chosen.get("n_estimators", BASE_ROUNDS),
+        max_depth=chosen.get("max_depth", BASE_DEPTH),
+        learning_rate=chosen.get("learning_rate", BASE_LR),
+        subsample=0.8,
+        colsample_bytree=0.8,
+        n_jobs=-1,
+        tree_method="hist",
+        eval_metric="logloss" if n_classes == 2 else "mlogloss",
+        random_state=seed,
+    )
+    clf._Booster = booster
+    clf.n_classes_ = n_classes
+    clf.classes_ = np.arange(n_classes)
+    return clf
+
+
+@dataclass
+class SearchSpace:
+    depths: Tuple[int, ...] = (4, 6, 8)
+    learning_rates: Tuple[float, ...] = (0.05, 0.1, 0.3)
+    max_rounds: int = 1000
+    early_stopping: int = 30
+    # score = error + cost_weight * (trees * depth) / (BASE_ROUNDS * BASE_DEPTH)
+    cost_weight: float = 0.01
+    workers: int = 0  # parallel candidates per model (0 = as many as the thread budget allows)
+
+
+def _search(
+    task: str,
+    dtrain: xgb.DMatrix,
+    dtest: xgb.DMatrix,
+    base_params: dict,
+    space: SearchSpace,
+    nthread: int,
+    trees_per_round: int = 1,
+) -> Tuple[xgb.Booster, dict]:
+    """Grid over depth x learning rate, each candidate early-stopped on dtest.
+
+    Returns the winner cut at its best iteration and a report of all candidates.
+    Metrics are read from the eval history (no extra predict pass over dtest).
+    """
+    error_metric, loss_metric = base_params["eval_metric"]
+    grid = [(d, lr) for d in space.depths for lr in space.learning_rates]
+    workers = max(1, min(len(grid), space.workers or nthread))
+    per_candidate = max(1, nthread // workers)
+    unit = BASE_ROUNDS * BASE_DEPTH * trees_per_round
+
+    def fit(depth: int, lr: float) -> Tuple[xgb.Booster, dict]:
+        history: dict = {}
+        t = time.perf_counter()
+        booster = xgb.train(
+            {**base_params, "max_depth": depth, "eta": lr, "nthread": per_candidate},
+            dtrain,
+            num_boost_round=space.max_rounds,
+            evals=[(dtest, "test")],
+            early_stopping_rounds=space.early_stopping,  # on the last eval metric (logloss)
+            evals_result=history,
+            verbose_eval=False,
+        )
+        best = booster.best_iteration
+        error = float(history["test"][error_metric][best])
+        cost = (best + 1) * trees_per_round * depth
+        return booster, {
+            "max_depth": depth,
+            "learning_rate": lr,
+            "n_estimators": best + 1,
+            "accuracy": round(1.0 - error, 6),
+            loss_metric: round(float(history["test"][loss_metric][best]), 6),
+            "cost": cost,
+            "score": round(error + space.cost_weight * cost / unit, 6),
+            "seconds": round(time.perf_counter() - t, 3),
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda c: fit(*c), grid))
+
+    booster, chosen = min(results, key=lambda r: (r[1]["score"], r[1]["cost"]))
+    booster = booster[: chosen["n_estimators"]]
+    print(
+        f"[search] {task}: depth={chosen['max_depth']} lr={chosen['learning_rate']} "
+        f"trees={chosen['n_estimators']} accuracy={chosen['accuracy']} cost={chosen['cost']} "
+        f"(fixed config cost {unit})"
+    )
+    return booster, {
+        "chosen": chosen,
+        "candidates": sorted((r[1] for r in results), key=lambda r: r["score"]),
+        "workers": workers,
+        "threads_per_candidate": per_candidate,
+    }
+
+
+def _rows_per_s(model: XGBClassifier, X: pd.DataFrame) -> float:
+    """Inference throughput as the worker calls it (predict on a DataFrame)."""
+    if not len(X):
+        return 0.0
+    model.predict(X.iloc[: min(len(X), 1000)])  # warm-up
+    t = time.perf_counter()
+    model.predict(X)
+    return round(len(X) / max(time.perf_counter() - t, 1e-9), 1)
+
+
+@dataclass
+class PruneOptions:
+    importance: str = "gain"  # "gain" (total gain per feature) or "shap" (mean |SHAP| on held-out rows)
+    prune: bool = False
+    tolerance: float = 0.002  # max held-out accuracy drop of the pruned model
+    min_features: int = 3  # the worker's column-overlap check needs at least 3
+    sample_rows: int = 20_000  # held-out rows for SHAP
+
+
+# columns -> (X, y) batches of the held-out split
+TestBatches = Callable[[List[str]], Iterator[Tuple[object, np.ndarray]]]
+
+
+def _final_params(task: str, seed: int, n_classes: int, chosen: Optional[dict]) -> Tuple[dict, int]:
+    """xgb.train params + rounds of the exported model (fixed config or the search winner)."""
+    params = _xgb_params(task, seed, n_classes)
+    if not chosen:
+        return params, BASE_ROUNDS
+    params.update(max_depth=chosen["max_depth"], eta=chosen["learning_rate"])
+    return params, chosen["n_estimators"]
+
+
+def _predict_labels(booster: xgb.Booster, X, columns: List[str]) -> np.ndarray:
+    p = booster.predict(xgb.DMatrix(X, feature_names=columns))
+    return p.argmax(axis=1) if p.ndim == 2 else (p > 0.5).astype(int)
+
+
+def _accuracy(booster: xgb.Booster, batches: Iterator[Tuple[object, np.ndarray]], columns: List[str]) -> float:
+    correct = total = 0
+    for X, y in batches:
+        correct += int((_predict_labels(booster, X, columns) == y).sum())
+        total += len(y)
+    return correct / max(total, 1)
+
+
+def _importances(booster: xgb.Booster, features: List[str], method: str, sample: pd.DataFrame) -> Dict[str, float]:
+    """Share of total importance per feature, most important first."""
+    if method == "shap":
+        contrib = np.abs(booster.predict(xgb.DMatrix(sample, feature_names=features), pred_contribs=True))
+        if contrib.ndim == 3:  # multi-class: (rows, classes, features + bias)
+            contrib = contrib.sum(axis=1)
+        values = contrib[:, :-1].mean(axis=0) if len(contrib) else np.zeros(len(features))
+    else:
+        gain = booster.get_score(importance_type="total_gain")
+        values = np.array([gain.get(f, 0.0) for f in features])
+    total = float(values.sum()) or 1.0
+    ranked = sorted(zip(features, values), key=lambda fv: -fv[1])
+    return {f: round(float(v) / total, 6) for f, v in ranked}
+
+
+def _select_features(
+    task: str,
+    booster: xgb.Booster,
+    features: List[str],
+    params: dict,
+    rounds: int,
+    train_matrix: Callable[[List[str]], xgb.DMatrix],
+    test_batches: TestBatches,
+    opts: PruneOptions,
+    nthread: int,
+) -> Tuple[xgb.Booster, List[str], dict]:
+    """Importances of the trained model; with opts.prune the smallest top-k set within tolerance.
+
+    Accuracy is ~monotone in k along the importance ranking, so k is found by
+    binary search: ~log2(n) retrains instead of one per dropped feature.
+    Collinear features share gain, so a retrain (not the ranking alone) decides.
+    """
+    parts, rows = [], 0
+    for X, _ in test_batches(features):
+        parts.append(pd.DataFrame(X, columns=features))
+        rows += len(X)
+        if rows >= opts.sample_rows:
+            break
+    sample = pd.concat(parts).iloc[: opts.sample_rows] if parts else pd.DataFrame(columns=features)
+    importance = _importances(booster, features, opts.importance, sample)
+    report: dict = {"method": opts.importance, "importance": importance}
+    if not opts.prune:
+        return booster, features, report
+
+    full = _accuracy(booster, test_batches(features), features)
+    ranked = list(importance)
+
+    def fit(k: int) -> Tuple[List[str], xgb.Booster, float]:
+        top = set(ranked[:k])
+        cols = [f for f in features if f in top]  # original column order
+        pruned = xgb.train({**params, "nthread": nthread}, train_matrix(cols), num_boost_round=rounds)
+        return cols, pruned, _accuracy(pruned, test_batches(cols), cols)
+
+    best = (features, booster, full)
+    trials = []
+    lo, hi = min(opts.min_features, len(features)), len(features)
+    while lo < hi:
+        k = (lo + hi) // 2
+        cols, pruned, acc = fit(k)
+        trials.append({"features": k, "accuracy": round(acc, 6)})
+        if acc >= full - opts.tolerance:
+            hi, best = k, (cols, pruned, acc)
+        else:
+            lo = k + 1
+
+    cols, booster, acc = best
+    print(f"[prune] {task}: {len(features)} -> {len(cols)} features, accuracy {full:.4f} -> {acc:.4f}")
+    report.update(
+        tolerance=opts.tolerance,
+        accuracy_full=round(full, 6),
+        accuracy_pruned=round(acc, 6),
+        kept=cols,
+        dropped=[f for f in features if f not in cols],
+        trials=trials,
+    )
+    return booster, cols, report
+
+
+def _write_artifacts(
+    out_dir: Path,
+    bin_model,
+    multi_model,
+    classes: List[str],
+    features_bin: List[str],
+    features_multi: List[str],
+    meta: dict,
+) -> None:
+    # модели
+    (out_dir / "xgb_bin.json").write_bytes(b"")  # ensure file exists even if save_model fails early
+    bin_model.save_model(str(out_dir / "xgb_bin.json"))
+    multi_model.save_model(str(out_dir / "xgb_multi.json"))
+
+    # маппинг классов multiclass: index -> label
+    class_mapping = {int(i): cls for i, cls in enumerate(classes)}
+    (out_dir / "class_mapping.json").write_text(json.dumps(class_mapping, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    # список фичей (важно для инференса, чтобы выровнять колонки)
+    (out_dir / "features_bin.json").write_text(json.dumps(features_bin, ensure_ascii=False, indent=2), encoding="utf-8")
+    (out_dir / "features_multi.json").write_text(
+        json.dumps(features_multi, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+
+    # мета-инфо (для отладки)
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    print("Saved artifacts to:", out_dir)
+    print(" - xgb_bin.json")
+    print(" - xgb_multi.json")
+    print(" - class_mapping.json")
+    print(" - features_bin.json")
+    print(" - features_multi.json")
+    print(" - meta.json")
+    print(f"wall {meta['wall_s']}s, peak RSS {meta['peak_rss_mb']} MB, threads {meta['threads']}")
+
+
+def train_and_export(
+    input_csv: Path,
+    out_dir: Path,
+    test_size: float = 0.2,
+    seed: int = 42,
+    threads: int = 0,
+    bin_threads: int = 0,
+    search: Optional[SearchSpace] = None,
+    prune: Optional[PruneOptions] = None,
+) -> None:
+    prune = prune or PruneOptions()
+    t_start = time.perf_counter()
+    stages: Dict[str, float] = {}
     out_dir.mkdir(parents=True, exist_ok=True)
 
     df = pd.read_csv(input_csv)
@@ -75,9 +440,9 @@ def train_and_export(input_csv: Path, out_dir: Path, test_size: float = 0.2, see
     )
 
     bin_model = XGBClassifier(
-        n_estimators=400,
-        max_depth=6,
-        learning_rate=0.1,
+        n_estimators=BASE_ROUNDS,
+        max_depth=BASE_DEPTH,
+        learning_rate=BASE_LR,
         subsample=0.8,
         colsample_bytree=0.8,
         n_jobs=-1,
@@ -85,7 +450,6 @@ def train_and_export(input_csv: Path, out_dir: Path, test_size: float = 0.2, see
         eval_metric="logloss",
         random_state=seed,
     )
-    bin_model.fit(X_train, y_train)
 
     # ---------- Multiclass model: type of attack (only for attack rows) ----------
     if TARGET_MULTI not in df.columns:
@@ -113,9 +477,9 @@ def train_and_export(input_csv: Path, out_dir: Path, test_size: float = 0.2, see
     )
 
     multi_model = XGBClassifier(
-        n_estimators=400,
-        max_depth=6,
-        learning_rate=0.1,
+        n_estimators=BASE_ROUNDS,
+        max_depth=BASE_DEPTH,
+        learning_rate=BASE_LR,
         subsample=0.8,
         colsample_bytree=0.8,
         n_jobs=-1,
@@ -123,45 +487,453 @@ def train_and_export(input_csv: Path, out_dir: Path, test_size: float = 0.2, see
         eval_metric="mlogloss",
         random_state=seed,
     )
-    multi_model.fit(X_train_m, y_train_m)
-
-    # ---------- Export artifacts ----------
-    # модели
-    (out_dir / "xgb_bin.json").write_bytes(b"")  # ensure file exists even if save_model fails early
-    bin_model.save_model(str(out_dir / "xgb_bin.json"))
-    multi_model.save_model(str(out_dir / "xgb_multi.json"))
-
-    # маппинг классов multiclass: index -> label
-    class_mapping = {int(i): cls for i, cls in enumerate(le.classes_)}
-    (out_dir / "class_mapping.json").write_text(json.dumps(class_mapping, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    # список фичей (важно для инференса, чтобы выровнять колонки)
-    (out_dir / "features_bin.json").write_text(
-        json.dumps(list(X_bin.columns), ensure_ascii=False, indent=2), encoding="utf-8"
-    )
-    (out_dir / "features_multi.json").write_text(
-        json.dumps(list(X_multi.columns), ensure_ascii=False, indent=2), encoding="utf-8"
+    stages["load_preprocess"] = round(time.perf_counter() - t_start, 3)
+
+    # ---------- Train both models concurrently ----------
+    n_classes = len(le.classes_)
+    threads_bin, threads_multi = _thread_budgets(threads, len(X_train), len(X_train_m) * n_classes, bin_threads)
+    bin_model.set_params(n_jobs=threads_bin)
+    multi_model.set_params(n_jobs=threads_multi)
+
+    search_report = None
+    chosen: Dict[str, Optional[dict]] = {"bin": None, "multi": None}
+    if search is None:
+        _, train_s = _run_concurrently(
+            {
+                "bin": lambda: bin_model.fit(X_train, y_train),
+                "multi": lambda: multi_model.fit(X_train_m, y_train_m),
+            }
+        )
+    else:
+
+        def run(task: str, X_tr, y_tr, X_te, y_te, params: dict, nthread: int, per_round: int):
+            dtrain = xgb.QuantileDMatrix(X_tr, y_tr, nthread=nthread)
+            dtest = xgb.QuantileDMatrix(X_te, y_te, ref=dtrain, nthread=nthread)
+            return _search(task, dtrain, dtest, params, search, nthread, per_round)
+
+        found, train_s = _run_concurrently(
+            {
+                "bin": lambda: run(
+                    "bin", X_train, y_train, X_test, y_test,
+                    _xgb_params("bin", seed), threads_bin, 1,
+                ),
+                "multi": lambda: run(
+                    "multi", X_train_m, y_train_m, X_test_m, y_test_m,
+                    _xgb_params("multi", seed, n_classes), threads_multi, n_classes,
+                ),
+            }
+        )
+        bin_model = _as_classifier(found["bin"][0], 2, seed, found["bin"][1]["chosen"])
+        multi_model = _as_classifier(found["multi"][0], n_classes, seed, found["multi"][1]["chosen"])
+        search_report = {k: v[1] for k, v in found.items()}
+        chosen = {k: v["chosen"] for k, v in search_report.items()}
+    stages.update({f"train_{k}": v for k, v in train_s.items()})
+
+    # ---------- Feature importance / pruning ----------
+    split = {"bin": (X_train, y_train, X_test, y_test), "multi": (X_train_m, y_train_m, X_test_m, y_test_m)}
+    trained = {"bin": bin_model.get_booster(), "multi": multi_model.get_booster()}
+
+    def select(task: str, n_cls: int, nthread: int):
+        X_tr, y_tr, X_te, y_te = split[task]
+        params, rounds = _final_params(task, seed, n_cls, chosen[task])
+        return _select_features(
+            task,
+            trained[task],
+            list(X_tr.columns),
+            params,
+            rounds,
+            lambda cols: xgb.QuantileDMatrix(X_tr[cols], y_tr, nthread=nthread),
+            lambda cols: iter([(X_te[cols], np.asarray(y_te))]),
+            prune,
+            nthread,
+        )
+
+    t = time.perf_counter()
+    selected, _ = _run_concurrently(
+        {"bin": lambda: select("bin", 2, threads_bin), "multi": lambda: select("multi", n_classes, threads_multi)}
     )
+    stages["features"] = round(time.perf_counter() - t, 3)
+    bin_model = _as_classifier(selected["bin"][0], 2, seed, chosen["bin"])
+    multi_model = _as_classifier(selected["multi"][0], n_classes, seed, chosen["multi"])
+    features_bin, features_multi = selected["bin"][1], selected["multi"][1]
+    rows_per_s = {
+        "bin": _rows_per_s(bin_model, X_test[features_bin].iloc[:THROUGHPUT_ROWS]),
+        "multi": _rows_per_s(multi_model, X_test_m[features_multi].iloc[:THROUGHPUT_ROWS]),
+    }
 
-    # мета-инфо (для отладки)
+    # ---------- Export artifacts ----------
     meta = {
+        "mode": "memory",
         "input_csv": str(input_csv),
         "rows_total": int(len(df)),
         "rows_attack": int(len(df_attack)),
-        "features_bin": int(len(X_bin.columns)),
-        "features_multi": int(len(X_multi.columns)),
+        "features_bin": len(features_bin),
+        "features_multi": len(features_multi),
         "zero_var_dropped_bin": zero_var_bin,
         "zero_var_dropped_multi": zero_var_multi,
+        "feature_selection": {k: v[2] for k, v in selected.items()},
+        "rows_per_s": rows_per_s,
+        "threads": {"bin": threads_bin, "multi": threads_multi},
+        "stages_s": stages,
+        "wall_s": round(time.perf_counter() - t_start, 3),
+        "peak_rss_mb": _peak_rss_mb(),
     }
-    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+    if search_report is not None:
+        meta["search"] = search_report
+    _write_artifacts(out_dir, bin_model, multi_model, list(le.classes_), features_bin, features_multi, meta)
+
+# ---------------------------------------------------------------------------
+# Out-of-core mode
+# ---------------------------------------------------------------------------
+
+
+class _ColumnStats:
+    """Streaming per-column stats of a float32 matrix: min/max, non-NaN count, row sample.
+
+    Medians come from a uniform row sample (smallest random keys), exact while
+    the stream fits in `sample_rows`. Zero variance follows _drop_zero_var
+    after _fillna_median: all non-NaN values equal, or no values at all.
+    """
+
+    def __init__(self, ncols: int, sample_rows: int, rng: np.random.Generator) -> None:
+        self.rows = 0
+        self.lo = np.full(ncols, np.inf)
+        self.hi = np.full(ncols, -np.inf)
+        self.count = np.zeros(ncols, dtype=np.int64)
+        self.sample_rows = sample_rows
+        self.rng = rng
+        self.sample = np.empty((0, ncols), dtype=np.float32)
+        self.keys = np.empty(0)
+
+    def add(self, X: np.ndarray) -> None:
+        if not len(X):
+            return
+        self.rows += len(X)
+        # fmin/fmax skip NaN (NaN only when the whole column is NaN)
+        self.lo = np.fmin(self.lo, np.fmin.reduce(X, axis=0))
+        self.hi = np.fmax(self.hi, np.fmax.reduce(X, axis=0))
+        self.count += (~np.isnan(X)).sum(axis=0)
+
+        new_keys = self.rng.random(len(X))
+        if len(self.keys) >= self.sample_rows:
+            # only rows with a key below the current max can enter a full sample
+            enter = new_keys < self.keys.max()
+            new_keys, X = new_keys[enter], X[enter]
+        keys = np.concatenate([self.keys, new_keys])
+        sample = np.concatenate([self.sample, X])
+        if len(keys) > self.sample_rows:
+            keep = np.argpartition(keys, self.sample_rows)[: self.sample_rows]
+            keys, sample = keys[keep], sample[keep]
+        self.keys, self.sample = keys, sample
+
+    def medians(self) -> np.ndarray:
+        med = np.full(self.sample.shape[1], np.nan, dtype=np.float32)
+        has = self.count > 0
+        if has.any() and len(self.sample):
+            med[has] = np.nanmedian(self.sample[:, has], axis=0)
+        return med
+
+    def zero_var(self) -> np.ndarray:
+        return (self.count == 0) | (self.lo == self.hi)
+
+
+def _chunk_matrix(chunk: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """Candidate feature columns as float32 (non-numeric cells -> NaN, like _coerce_numeric)."""
+    X = np.empty((len(chunk), len(columns)), dtype=np.float32)
+    for j, col in enumerate(columns):
+        values = chunk[col]
+        if values.dtype == object:
+            values = pd.to_numeric(values, errors="coerce")
+        X[:, j] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+    return X
+
+
+def _spill_csv(
+    input_csv: Path,
+    spill_dir: Path,
+    chunk_rows: int,
+    test_size: float,
+    seed: int,
+    sample_rows: int,
+) -> dict:
+    """Pass 1: CSV -> per-chunk .npy files (features, labels, split) + column stats."""
+    header = [c.strip() for c in pd.read_csv(input_csv, nrows=0).columns]
+    for target in (TARGET_BIN, TARGET_MULTI):
+        if target not in header:
+            raise RuntimeError(f"Column '{target}' not found in dataset")
+    skip = set(DROP_COLS_COMMON) | {TARGET_BIN, TARGET_MULTI}
+    columns = [c for c in header if c not in skip]
+
+    rng = np.random.default_rng(seed)
+    stats_bin = _ColumnStats(len(columns), sample_rows, rng)
+    stats_multi = _ColumnStats(len(columns), sample_rows, rng)
+    class_codes: Dict[str, int] = {}  # first-seen order, remapped to sorted order at the end
+
+    reader = pd.read_csv(
+        input_csv,
+        chunksize=chunk_rows,
+        usecols=lambda c: c.strip() not in DROP_COLS_COMMON,
+    )
+    chunks = 0
+    for chunk in reader:
+        chunk.columns = [c.strip() for c in chunk.columns]
+        X = _chunk_matrix(chunk, columns)
+        attack = chunk[TARGET_BIN].astype(int).to_numpy(dtype=np.int8)
+        is_attack = attack == 1
+
+        cls = np.full(len(chunk), -1, dtype=np.int16)
+        names = chunk.loc[is_attack, TARGET_MULTI].astype(str).to_numpy()
+        for name in np.unique(names):
+            class_codes.setdefault(str(name), len(class_codes))
+        if names.size:
+            cls[is_attack] = np.array([class_codes[n] for n in names], dtype=np.int16)
+
+        # held-out rows: per-row Bernoulli (no global shuffle in a stream, so not stratified)
+        test = np.random.default_rng([seed, chunks]).random(len(chunk)) < test_size
+
+        stats_bin.add(X)
+        stats_multi.add(X[is_attack])
+        np.save(spill_dir / f"X_{chunks}.npy", X)
+        np.save(spill_dir / f"attack_{chunks}.npy", attack)
+        np.save(spill_dir / f"cls_{chunks}.npy", cls)
+        np.save(spill_dir / f"test_{chunks}.npy", test)
+        chunks += 1
+
+    if stats_multi.rows == 0:
+        raise RuntimeError("No attack rows found (attack == 1). Cannot train multiclass model.")
 
-    print("Saved artifacts to:", out_dir)
-    print(" - xgb_bin.json")
-    print(" - xgb_multi.json")
-    print(" - class_mapping.json")
-    print(" - features_bin.json")
-    print(" - features_multi.json")
-    print(" - meta.json")
+    classes = sorted(class_codes)  # LabelEncoder order
+    remap = np.zeros(len(class_codes), dtype=np.int16)
+    for name, code in class_codes.items():
+        remap[code] = classes.index(name)
+
+    return {
+        "chunks": chunks,
+        "columns": columns,
+        "classes": classes,
+        "remap": remap,
+        "bin": stats_bin,
+        "multi": stats_multi,
+    }
+
+
+class _SpillIter(xgb.DataIter):
+    """Feeds one task's rows from the spill files to XGBoost, chunk by chunk.
+
+    NaN are filled with the task medians and zero-variance columns dropped
+    per chunk, so only one preprocessed chunk is in memory at a time.
+    """
+
+    def __init__(
+        self,
+        spill_dir: Path,
+        chunks: int,
+        task: str,
+        keep: np.ndarray,
+        medians: np.ndarray,
+        feature_names: List[str],
+        remap: np.ndarray,
+        test: bool = False,
+        cache_prefix: Optional[str] = None,
+    ) -> None:
+        self.spill_dir = spill_dir
+        self.chunks = chunks
+        self.task = task
+        self.keep = keep
+        self.medians = medians[keep]
+        self.feature_names = feature_names
+        self.remap = remap
+        self.test = test
+        self._it = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data: Callable) -> int:
+        while self._it < self.chunks:
+            i = self._it
+            self._it += 1
+
+            attack = np.load(self.spill_dir / f"attack_{i}.npy")
+            mask = np.load(self.spill_dir / f"test_{i}.npy") == self.test
+            if self.task == "multi":
+                mask &= attack == 1
+            rows = np.flatnonzero(mask)
+            if not rows.size:
+                continue
+
+            X = np.load(self.spill_dir / f"X_{i}.npy", mmap_mode="r")[np.ix_(rows, self.keep)]
+            nan_r, nan_c = np.nonzero(np.isnan(X))
+            X[nan_r, nan_c] = self.medians[nan_c]
+
+            if self.task == "bin":
+                y = attack[rows]
+            else:
+                y = self.remap[np.load(self.spill_dir / f"cls_{i}.npy")[rows]]
+            input_data(data=X, label=y, feature_names=self.feature_names)
+            return 1
+        return 0
+
+    def reset(self) -> None:
+        self._it = 0
+
+
+def _batches(it: _SpillIter) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(X, y) chunks of an iterator outside of XGBoost (evaluation, samples)."""
+    out: List[Tuple[np.ndarray, np.ndarray]] = []
+    it.reset()
+    while it.next(lambda data, label, **_: out.append((data, label))):
+        yield out.pop()
+
+
+def _collect(it: _SpillIter, max_rows: int) -> pd.DataFrame:
+    """First max_rows rows of an iterator, as the DataFrame the worker would predict on."""
+    parts: List[np.ndarray] = []
+    rows = 0
+    for X, _ in _batches(it):
+        parts.append(X)
+        rows += len(X)
+        if rows >= max_rows:
+            break
+    X = np.concatenate(parts)[:max_rows] if parts else np.empty((0, len(it.feature_names)), dtype=np.float32)
+    return pd.DataFrame(X, columns=it.feature_names)
+
+
+def train_and_export_streaming(
+    input_csv: Path,
+    out_dir: Path,
+    test_size: float = 0.2,
+    seed: int = 42,
+    threads: int = 0,
+    bin_threads: int = 0,
+    chunk_rows: int = 100_000,
+    sample_rows: int = 500_000,
+    max_bin: int = 256,
+    spill_dir: Optional[Path] = None,
+    cache_dir: Optional[Path] = None,
+    search: Optional[SearchSpace] = None,
+    prune: Optional[PruneOptions] = None,
+) -> None:
+    prune = prune or PruneOptions()
+    t_start = time.perf_counter()
+    stages: Dict[str, float] = {}
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    spill_root = Path(tempfile.mkdtemp(prefix="train_spill_", dir=str(spill_dir) if spill_dir else None))
+    try:
+        spill = _spill_csv(input_csv, spill_root, chunk_rows, test_size, seed, sample_rows)
+        stages["spill"] = round(time.perf_counter() - t_start, 3)
+
+        columns: List[str] = spill["columns"]
+        stats_bin: _ColumnStats = spill["bin"]
+        stats_multi: _ColumnStats = spill["multi"]
+        classes: List[str] = spill["classes"]
+
+        keep: Dict[str, np.ndarray] = {}
+        zero_var: Dict[str, List[str]] = {}
+        for task, stats in (("bin", stats_bin), ("multi", stats_multi)):
+            zv = stats.zero_var()
+            keep[task] = np.flatnonzero(~zv)
+            zero_var[task] = [c for c, z in zip(columns, zv) if z]
+        features = {task: [columns[j] for j in keep[task]] for task in keep}
+
+        threads_bin, threads_multi = _thread_budgets(
+            threads, stats_bin.rows, stats_multi.rows * len(classes), bin_threads
+        )
+
+        medians = {"bin": stats_bin.medians(), "multi": stats_multi.medians()}
+
+        def make_iter(task: str, test: bool, cols: Optional[List[str]] = None) -> _SpillIter:
+            cols = cols or features[task]
+            part = "test" if test else "train"
+            prefix = str(cache_dir / f"{task}_{part}_{len(cols)}") if cache_dir else None
+            return _SpillIter(
+                spill_root, spill["chunks"], task, np.array([columns.index(c) for c in cols]), medians[task], cols,
+                spill["remap"], test=test, cache_prefix=prefix,
+            )
+
+        def train_matrix(task: str, nthread: int, cols: Optional[List[str]] = None) -> xgb.DMatrix:
+            if cache_dir:
+                # external memory: quantized pages are cached on disk
+                return xgb.DMatrix(make_iter(task, False, cols), nthread=nthread)
+            return xgb.QuantileDMatrix(make_iter(task, False, cols), max_bin=max_bin, nthread=nthread)
+
+        def train(task: str, nthread: int, params: dict, per_round: int):
+            params = {**params, "max_bin": max_bin}
+            dtrain = train_matrix(task, nthread)
+            if search is None:
+                return xgb.train({**params, "nthread": nthread}, dtrain, num_boost_round=BASE_ROUNDS), None
+
+            if cache_dir:
+                dtest = xgb.DMatrix(make_iter(task, True), nthread=nthread)
+            else:
+                dtest = xgb.QuantileDMatrix(make_iter(task, True), ref=dtrain, nthread=nthread)
+            return _search(task, dtrain, dtest, params, search, nthread, per_round)
+
+        if cache_dir:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+
+        n_classes = len(classes)
+        found, train_s = _run_concurrently(
+            {
+                "bin": lambda: train("bin", threads_bin, _xgb_params("bin", seed), 1),
+                "multi": lambda: train("multi", threads_multi, _xgb_params("multi", seed, n_classes), n_classes),
+            }
+        )
+        search_report = {k: v[1] for k, v in found.items()} if search is not None else None
+        chosen = {k: v[1] and v[1]["chosen"] for k, v in found.items()}
+        stages.update({f"train_{k}": v for k, v in train_s.items()})
+
+        def select(task: str, n_cls: int, nthread: int):
+            params, rounds = _final_params(task, seed, n_cls, chosen[task])
+            return _select_features(
+                task,
+                found[task][0],
+                features[task],
+                {**params, "max_bin": max_bin},
+                rounds,
+                lambda cols: train_matrix(task, nthread, cols),
+                lambda cols: _batches(make_iter(task, True, cols)),
+                prune,
+                nthread,
+            )
+
+        t = time.perf_counter()
+        selected, _ = _run_concurrently(
+            {"bin": lambda: select("bin", 2, threads_bin), "multi": lambda: select("multi", n_classes, threads_multi)}
+        )
+        stages["features"] = round(time.perf_counter() - t, 3)
+        bin_model = _as_classifier(selected["bin"][0], 2, seed, chosen["bin"])
+        multi_model = _as_classifier(selected["multi"][0], n_classes, seed, chosen["multi"])
+        features = {k: v[1] for k, v in selected.items()}
+        rows_per_s = {
+            "bin": _rows_per_s(bin_model, _collect(make_iter("bin", True), THROUGHPUT_ROWS)),
+            "multi": _rows_per_s(multi_model, _collect(make_iter("multi", True), THROUGHPUT_ROWS)),
+        }
+    finally:
+        shutil.rmtree(spill_root, ignore_errors=True)
+
+    meta = {
+        "mode": "stream",
+        "input_csv": str(input_csv),
+        "rows_total": int(stats_bin.rows),
+        "rows_attack": int(stats_multi.rows),
+        "features_bin": len(features["bin"]),
+        "features_multi": len(features["multi"]),
+        "zero_var_dropped_bin": zero_var["bin"],
+        "zero_var_dropped_multi": zero_var["multi"],
+        "feature_selection": {k: v[2] for k, v in selected.items()},
+        "rows_per_s": rows_per_s,
+        "chunk_rows": chunk_rows,
+        "median_sample_rows": sample_rows,
+        "matrix": "external_memory" if cache_dir else "quantile",
+        "max_bin": max_bin,
+        "threads": {"bin": threads_bin, "multi": threads_multi},
+        "stages_s": stages,
+        "wall_s": round(time.perf_counter() - t_start, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if search_report is not None:
+        meta["search"] = search_report
+    _write_artifacts(out_dir, bin_model, multi_model, classes, features["bin"], features["multi"], meta)
 
 
 def main() -> None:
@@ -170,9 +942,75 @@ def main() -> None:
     p.add_argument("--out", default="/data/models", help="Output dir for model artifacts")
     p.add_argument("--test-size", type=float, default=0.2)
     p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--threads", type=int, default=0, help="Total threads for both trainings (0 = all CPUs)")
+    p.add_argument("--bin-threads", type=int, default=0, help="Threads of the binary model (0 = split by cost)")
+    p.add_argument("--stream", action="store_true", help="Out-of-core mode for datasets that do not fit in RAM")
+    p.add_argument("--chunk-rows", type=int, default=100_000, help="--stream: CSV rows per chunk")
+    p.add_argument("--median-sample-rows", type=int, default=500_000, help="--stream: row sample for medians")
+    p.add_argument("--max-bin", type=int, default=256, help="--stream: histogram bins of the QuantileDMatrix")
+    p.add_argument("--spill-dir", default=None, help="--stream: where parsed chunks are spilled (default: tmp)")
+    p.add_argument(
+        "--cache-dir",
+        default=None,
+        help="--stream: external-memory DMatrix cached here (several times slower, for when even the quantized matrix does not fit)",
+    )
+    p.add_argument("--search", action="store_true", help="Grid search depth/learning rate with early stopping")
+    p.add_argument("--search-depths", default="4,6,8")
+    p.add_argument("--search-lrs", default="0.05,0.1,0.3")
+    p.add_argument("--max-rounds", type=int, default=1000, help="--search: tree cap per candidate")
+    p.add_argument("--early-stopping", type=int, default=30, help="--search: rounds without held-out improvement")
+    p.add_argument(
+        "--cost-weight",
+        type=float,
+        default=0.01,
+        help="--search: error penalty per fixed-config inference cost (400 trees x depth 6)",
+    )
+    p.add_argument("--search-workers", type=int, default=0, help="--search: parallel candidates per model")
+    p.add_argument("--importance", choices=("gain", "shap"), default="gain", help="Feature importance for meta/pruning")
+    p.add_argument("--prune", action="store_true", help="Retrain on the smallest top-k feature set within tolerance")
+    p.add_argument("--prune-tolerance", type=float, default=0.002, help="--prune: max held-out accuracy drop")
     args = p.parse_args()
 
-    train_and_export(Path(args.input), Path(args.out), test_size=args.test_size, seed=args.seed)
+    prune = PruneOptions(importance=args.importance, prune=args.prune, tolerance=args.prune_tolerance)
+
+    search = None
+    if args.search:
+        search = SearchSpace(
+            depths=tuple(int(v) for v in args.search_depths.split(",")),
+            learning_rates=tuple(float(v) for v in args.search_lrs.split(",")),
+            max_rounds=args.max_rounds,
+            early_stopping=args.early_stopping,
+            cost_weight=args.cost_weight,
+            workers=args.search_workers,
+        )
+
+    if args.stream:
+        train_and_export_streaming(
+            Path(args.input),
+            Path(args.out),
+            test_size=args.test_size,
+            seed=args.seed,
+            threads=args.threads,
+            bin_threads=args.bin_threads,
+            chunk_rows=args.chunk_rows,
+            sample_rows=args.median_sample_rows,
+            max_bin=args.max_bin,
+            spill_dir=Path(args.spill_dir) if args.spill_dir else None,
+            cache_dir=Path(args.cache_dir) if args.cache_dir else None,
+            search=search,
+            prune=prune,
+        )
+    else:
+        train_and_export(
+            Path(args.input),
+            Path(args.out),
+            test_size=args.test_size,
+            seed=args.seed,
+            threads=args.threads,
+            bin_threads=args.bin_threads,
+            search=search,
+            prune=prune,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,103 @@
+"""Admission control for uploads: backpressure from the ML queue and the backlog.
+
+Checked before an upload is stored:
+  - system: ready messages on the ML queue, MB of queued + running uploads and
+    the estimated wait against the ADMISSION_MAX_* limits -> 503;
+  - the user: queued + running jobs and their MB (ADMISSION_USER_MAX_*) -> 429.
+Both come with Retry-After: the estimated seconds until the excess drains.
+
+Estimates come from the pending work in worker-seconds
+(app/services/capacity.py) spread over the job slots of the queue's consumers.
+Accepted uploads get back estimated_wait_seconds (until their jobs are done).
+
+The limits are soft: the system numbers are a snapshot of up to
+CAPACITY_CACHE_SECONDS and concurrent uploads may overshoot by a request each.
+"""
+from __future__ import annotations
+
+import math
+from typing import NoReturn, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_REJECTIONS_TOTAL
+from app.services.capacity import pending_work, snapshot
+
+_MB = 1024 * 1024
+_RETRY_AFTER_MAX = 3600
+
+
+def _reject(status_code: int, reason: str, detail: str, retry_after: float) -> NoReturn:
+    ADMISSION_REJECTIONS_TOTAL.labels(reason=reason).inc()
+    seconds = int(min(_RETRY_AFTER_MAX, max(1, math.ceil(retry_after))))
+    raise HTTPException(
+        status_code=status_code,
+        detail=f"{detail}, retry in ~{seconds}s",
+        headers={"Retry-After": str(seconds)},
+    )
+
+
+async def admit(db: AsyncSession, user_id: UUID, uploads: Sequence[Tuple[str, int]]) -> float:
+    """Raise 503 / 429 when the uploads [(name, bytes)] have to wait; else the
+    estimated seconds until their jobs are done.
+
+    System limits apply to the backlog already there (an upload is let in while
+    there is room to start it), the user's limits include the uploads themselves.
+    """
+    state = await snapshot(db)
+    pending = state.work
+    workers = state.slots
+    ahead = state.drain_seconds
+    incoming_jobs = len(uploads)
+    incoming_bytes = sum(nbytes for _, nbytes in uploads)
+    incoming = [state.model.seconds(name, nbytes) for name, nbytes in uploads]
+
+    max_depth = settings.admission_max_queue_depth
+    if max_depth > 0 and state.queue_messages is not None and state.queue_messages >= max_depth:
+        per_job = pending.queued.seconds / max(1, pending.queued.jobs)
+        _reject(
+            503,
+            "queue_depth",
+            f"Processing queue is full ({state.queue_messages} jobs waiting)",
+            (state.queue_messages - max_depth + 1) * per_job / workers,
+        )
+    max_pending = settings.admission_max_pending_mb * _MB
+    if max_pending > 0 and pending.bytes >= max_pending:
+        _reject(
+            503,
+            "pending_bytes",
+            f"Too much pending work ({pending.bytes / _MB:.0f} MB queued or running)",
+            (pending.bytes - max_pending) / max(1, pending.bytes) * ahead + 1,
+        )
+    max_wait = settings.admission_max_wait_seconds
+    if max_wait > 0 and ahead > max_wait:
+        _reject(503, "wait", f"Estimated wait is {ahead:.0f}s (limit {max_wait:.0f}s)", ahead - max_wait)
+
+    max_jobs = settings.admission_user_max_jobs
+    max_user_bytes = settings.admission_user_max_mb * _MB
+    if max_jobs > 0 or max_user_bytes > 0:
+        # not cached: the user's own previous upload must count
+        mine = await pending_work(db, state.model, user_id)
+        if max_jobs > 0 and mine.jobs + incoming_jobs > max_jobs:
+            _reject(
+                429,
+                "user_jobs",
+                f"Too many jobs in flight ({mine.jobs} queued or running, {incoming_jobs} new, max {max_jobs})",
+                mine.seconds / max(1, mine.jobs),
+            )
+        if max_user_bytes > 0 and mine.bytes + incoming_bytes > max_user_bytes:
+            excess = mine.bytes + incoming_bytes - max_user_bytes
+            _reject(
+                429,
+                "user_bytes",
+                f"Too much data in flight ({(mine.bytes + incoming_bytes) / _MB:.0f} MB, "
+                f"max {settings.admission_user_max_mb:.0f} MB)",
+                min(1.0, excess / max(1, mine.bytes)) * mine.seconds,
+            )
+
+    # a single job runs on one worker; a batch spreads over all of them
+    own = max(sum(incoming) / workers, max(incoming, default=0.0))
+    return round(ahead + own, 1)
@@ -5,30 +5,55 @@ from uuid import UUID
 
 from fastapi import HTTPException, status
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.models import Subscription
 
+_NOT_CACHED = object()
 
-def require_active_subscription(db: Session, user_id: UUID) -> Subscription:
+# user_id -> end_at of the latest active subscription (None = no active one).
+# Invalidated explicitly by /billing/renew, otherwise lives auth_cache_ttl_seconds.
+subscription_cache: "TTLCache[datetime | None]" = TTLCache(
+    "subscription_end",
+    ttl_seconds=settings.auth_cache_ttl_seconds,
+    max_entries=settings.auth_cache_max_entries,
+)
+
+
+async def active_subscription_end(db: AsyncSession, user_id: UUID) -> datetime | None:
+    """end_at of the latest active, not yet expired subscription (cached per user)."""
+    now = datetime.now(timezone.utc)
+
+    end_at = subscription_cache.get(user_id, _NOT_CACHED)
+    if end_at is _NOT_CACHED:
+        end_at = await db.scalar(
+            select(Subscription.end_at)
+            .where(Subscription.user_id == user_id)
+            .where(Subscription.status == "active")
+            .where(Subscription.end_at > now)
+            .order_by(Subscription.end_at.desc())
+            .limit(1)
+        )
+        subscription_cache.set(user_id, end_at)
+
+    if end_at is None or end_at <= now:
+        return None
+    return end_at
+
+
+async def require_active_subscription(db: AsyncSession, user_id: UUID) -> datetime:
     """Guard for paid endpoints.
 
     Raises HTTPException(402) if user has no active subscription.
-    Returns the latest active subscription otherwise.
+    Returns end_at of the latest active subscription otherwise.
     """
-    now = datetime.now(timezone.utc)
-
-    sub = db.scalar(
-        select(Subscription)
-        .where(Subscription.user_id == user_id)
-        .where(Subscription.status == "active")
-        .where(Subscription.end_at > now)
-        .order_by(Subscription.end_at.desc())
-    )
+    end_at = await active_subscription_end(db, user_id)
 
-    if not sub:
+    if end_at is None:
         raise HTTPException(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
             detail="Active subscription required",
         )
-    return sub
+    return end_at
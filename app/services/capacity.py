@@ -0,0 +1,253 @@
+"""Pending work in estimated worker-seconds: the signal to scale workers on.
+
+A queue message says nothing about the size of a job: a 1 KB CSV and a
+2 GB capture weigh the same. Here every queued / running job is costed by
+a throughput model fitted on recently finished jobs (inference_jobs
+started_at / finished_at, traffic_files stored_bytes / rows_count):
+
+    rows    = bytes / bytes_per_row                 per upload kind (csv, csv.gz, parquet, pcap, ...)
+    seconds = overhead + rows * seconds_per_row     least squares over the kind's recent jobs
+
+Kinds with too few jobs use the fit over all kinds, with no history at all
+CAPACITY_DEFAULT_MB_PER_SECOND is assumed. A running job counts what is
+left of its estimate. Seconds are those of one job slot (a worker runs
+job_slots jobs at once: WORKER_JOB_SLOTS, else the tuning profile the workers
+read, else 1), so pending seconds / (target drain time * job_slots) =
+replicas needed.
+
+Served as GET /capacity and as clarus_pending_work_seconds on /metrics;
+admission control (app/services/admission.py) uses the same snapshot.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.formats import compression_of, upload_kind
+from app.ml.tuning import worker_tuning
+from app.models.inference_job import InferenceJob
+from app.models.traffic_file import TrafficFile
+from app.services.queue import queue_state
+
+IN_FLIGHT = ("queued", "running")
+
+_MB = 1024 * 1024
+# below this many finished jobs a kind borrows the fit over all kinds
+_MIN_KIND_JOBS = 5
+ALL_KINDS = "*"
+
+_model_cache: "TTLCache[ThroughputModel]" = TTLCache(
+    "capacity_model",
+    ttl_seconds=settings.capacity_model_ttl_seconds,
+    max_entries=1,
+)
+_snapshot_cache: "TTLCache[Snapshot]" = TTLCache(
+    "capacity_snapshot",
+    ttl_seconds=settings.capacity_cache_seconds,
+    max_entries=1,
+)
+
+
+def work_kind(name: str) -> str:
+    """Cost class of an upload: its format plus compression (csv, csv.gz, parquet, pcap.zst, ...)."""
+    kind = upload_kind(name) or "csv"
+    compression = compression_of(name)
+    return f"{kind}.{compression}" if compression else kind
+
+
+@dataclass
+class KindFit:
+    bytes_per_row: float
+    overhead_seconds: float
+    seconds_per_row: float
+    jobs: int = 0  # finished jobs it was fitted on
+
+    def seconds(self, nbytes: int) -> float:
+        return self.overhead_seconds + max(0, nbytes) / self.bytes_per_row * self.seconds_per_row
+
+
+def _default_fit() -> KindFit:
+    # one "row" per byte at the configured MB/s
+    return KindFit(1.0, 0.0, 1.0 / (max(settings.capacity_default_mb_per_second, 1e-3) * _MB))
+
+
+def _fit(samples: List[Tuple[int, int, float]]) -> KindFit:
+    """(bytes, rows, seconds) of finished jobs -> KindFit."""
+    nbytes = np.array([s[0] for s in samples], dtype=np.float64)
+    rows = np.array([s[1] for s in samples], dtype=np.float64)
+    seconds = np.array([s[2] for s in samples], dtype=np.float64)
+    bytes_per_row = nbytes.sum() / rows.sum()
+
+    overhead, per_row = 0.0, seconds.sum() / rows.sum()
+    if len(samples) >= 2 and np.ptp(rows) > 0:
+        (overhead, per_row), *_ = np.linalg.lstsq(np.column_stack([np.ones_like(rows), rows]), seconds, rcond=None)
+        if overhead < 0 or per_row <= 0:
+            # small or noisy history: proportional model through the origin
+            overhead, per_row = 0.0, seconds.sum() / rows.sum()
+    return KindFit(float(bytes_per_row), float(overhead), float(per_row), len(samples))
+
+
+@dataclass
+class ThroughputModel:
+    kinds: Dict[str, KindFit] = field(default_factory=dict)  # ALL_KINDS: the fit over every kind
+
+    def fit_for(self, kind: str) -> KindFit:
+        return self.kinds.get(kind) or self.kinds.get(ALL_KINDS) or _default_fit()
+
+    def seconds(self, name: str, nbytes: int) -> float:
+        return self.fit_for(work_kind(name)).seconds(nbytes)
+
+
+def fit_model(samples: Iterable[Tuple[str, int, int, float]]) -> ThroughputModel:
+    """(stored name, bytes, rows, seconds) of finished jobs -> per-kind fits."""
+    by_kind: Dict[str, List[Tuple[int, int, float]]] = {}
+    pooled: List[Tuple[int, int, float]] = []
+    for name, nbytes, rows, seconds in samples:
+        if nbytes <= 0 or rows <= 0 or seconds <= 0:
+            continue
+        by_kind.setdefault(work_kind(name), []).append((nbytes, rows, seconds))
+        pooled.append((nbytes, rows, seconds))
+
+    model = ThroughputModel()
+    if pooled:
+        model.kinds[ALL_KINDS] = _fit(pooled)
+    for kind, kind_samples in by_kind.items():
+        if len(kind_samples) >= _MIN_KIND_JOBS:
+            model.kinds[kind] = _fit(kind_samples)
+    return model
+
+
+async def throughput_model(db: AsyncSession) -> ThroughputModel:
+    """Fitted on the last CAPACITY_FIT_JOBS finished jobs; refitted every CAPACITY_MODEL_TTL_SECONDS."""
+    cached = _model_cache.get("model")
+    if cached is not None:
+        return cached
+    rows = (
+        await db.execute(
+            select(
+                TrafficFile.stored_path,
+                TrafficFile.stored_bytes,
+                TrafficFile.rows_count,
+                InferenceJob.started_at,
+                InferenceJob.finished_at,
+            )
+            .join(TrafficFile, TrafficFile.id == InferenceJob.file_id)
+            .where(
+                InferenceJob.status == "done",
+                InferenceJob.started_at.is_not(None),
+                InferenceJob.finished_at.is_not(None),
+                # stored_bytes of compressed files are no longer the upload size
+                TrafficFile.storage_state == "hot",
+            )
+            .order_by(InferenceJob.finished_at.desc())
+            .limit(settings.capacity_fit_jobs)
+        )
+    ).all()
+    model = fit_model(
+        (path, int(nbytes or 0), int(n_rows or 0), (finished - started).total_seconds())
+        for path, nbytes, n_rows, started, finished in rows
+    )
+    _model_cache.set("model", model)
+    return model
+
+
+@dataclass
+class Work:
+    jobs: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class PendingWork:
+    queued: Work = field(default_factory=Work)
+    running: Work = field(default_factory=Work)
+
+    @property
+    def jobs(self) -> int:
+        return self.queued.jobs + self.running.jobs
+
+    @property
+    def bytes(self) -> int:
+        return self.queued.bytes + self.running.bytes
+
+    @property
+    def seconds(self) -> float:
+        return self.queued.seconds + self.running.seconds
+
+
+async def pending_work(
+    db: AsyncSession, model: ThroughputModel, user_id: UUID | None = None, now: Optional[datetime] = None
+) -> PendingWork:
+    """Queued + running jobs (of one user, or all) costed by the model."""
+    now = now or datetime.now(timezone.utc)
+    stmt = (
+        select(InferenceJob.status, InferenceJob.started_at, TrafficFile.stored_path, TrafficFile.stored_bytes)
+        .join(TrafficFile, TrafficFile.id == InferenceJob.file_id)
+        .where(InferenceJob.status.in_(IN_FLIGHT))
+    )
+    if user_id is not None:
+        stmt = stmt.where(InferenceJob.user_id == user_id)
+
+    work = PendingWork()
+    for status, started_at, path, nbytes in (await db.execute(stmt)).all():
+        nbytes = int(nbytes or 0)
+        seconds = model.seconds(path, nbytes)
+        if status == "running" and started_at is not None:
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            seconds = max(0.0, seconds - (now - started_at).total_seconds())
+        bucket = work.running if status == "running" else work.queued
+        bucket.jobs += 1
+        bucket.bytes += nbytes
+        bucket.seconds += seconds
+    return work
+
+
+@dataclass
+class Snapshot:
+    work: PendingWork
+    model: ThroughputModel
+    queue_messages: Optional[int]  # None: RabbitMQ did not answer
+    consumers: int
+    job_slots: int = 1  # per worker
+
+    @property
+    def slots(self) -> int:
+        """Jobs the current workers run at once."""
+        return max(1, self.consumers) * max(1, self.job_slots)
+
+    @property
+    def drain_seconds(self) -> float:
+        """Time the current workers need for the pending work."""
+        return self.work.seconds / self.slots
+
+
+def _queue() -> Tuple[Optional[int], int]:
+    try:
+        return queue_state()
+    except Exception as e:
+        print(f"[capacity] ML queue state unavailable: {e}")
+        return None, 0
+
+
+async def snapshot(db: AsyncSession) -> Snapshot:
+    """Pending work + queue state, cached for CAPACITY_CACHE_SECONDS per process."""
+    cached = _snapshot_cache.get("snapshot")
+    if cached is not None:
+        return cached
+    messages, consumers = await run_in_threadpool(_queue)
+    model = await throughput_model(db)
+    job_slots = worker_tuning(check_host=False).job_slots
+    state = Snapshot(await pending_work(db, model), model, messages, consumers, job_slots)
+    _snapshot_cache.set("snapshot", state)
+    return state
@@ -0,0 +1,258 @@
+"""Row-level predictions in Postgres: flow_predictions, loaded by COPY.
+
+Optional (FLOW_SINK_ENABLED): the worker hands over the arrays it already
+has after scoring - class codes, probabilities, the key columns
+saddr/sport/daddr/dport of the input - and load() streams them into the
+partition of the job's upload day as CSV that Arrow renders in C++, one
+COPY per job, in the transaction that finalizes the job. A re-delivered job
+replaces its rows.
+
+Partitions are daily (flow_predictions_pYYYYMMDD), created on first use
+(and a day ahead by the storage manager); retention drops whole partitions,
+no DELETE of rows. Benchmark: python -m app.scripts.bench_flow_sink.
+"""
+from __future__ import annotations
+
+import ipaddress
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.flow_prediction import FlowClass, FlowPrediction
+from app.models.inference_job import InferenceJob
+from app.services.rollups import upload_day
+
+# input columns kept per row (BoT-IoT / flow aggregator names)
+KEY_COLUMNS = ("saddr", "sport", "daddr", "dport")
+
+COPY_COLUMNS = (
+    "job_id",
+    "row_no",
+    "day",
+    "saddr",
+    "sport",
+    "daddr",
+    "dport",
+    "is_attack",
+    "class_id",
+    "attack_proba",
+    "class_proba",
+)
+
+_PARTITION_PREFIX = "flow_predictions_p"
+_PARTITION_RE = re.compile(r"^flow_predictions_p(\d{8})$")
+# rows per COPY chunk (~10 MB of CSV)
+_COPY_ROWS = 128 * 1024
+
+# per process: partitions known to exist (the storage manager may drop them behind our back)
+_partitions: Set[date] = set()
+
+
+@dataclass
+class FlowRows:
+    """What the worker keeps of a scored file for the sink."""
+
+    codes: np.ndarray  # row i is classes[codes[i]], 0 = benign
+    classes: List[str]
+    keys: Dict[str, np.ndarray]  # KEY_COLUMNS found in the input, raw values
+    proba_attack: Optional[np.ndarray] = None  # None on the pandas path
+    proba_class: Optional[np.ndarray] = None
+
+    @property
+    def rows(self) -> int:
+        return int(len(self.codes))
+
+
+def partition_name(day: date) -> str:
+    return f"{_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def ensure_partition(engine: Engine, day: date) -> str:
+    """Create the day's partition if needed, in its own short transaction.
+
+    Must run before the caller's transaction touches flow_predictions: the
+    DDL locks the parent table.
+    """
+    name = partition_name(day)
+    if day in _partitions:
+        return name
+    with engine.begin() as conn:
+        # concurrent CREATE ... IF NOT EXISTS can still collide in the catalog
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+        conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF flow_predictions "
+                f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+            )
+        )
+    _partitions.add(day)
+    return name
+
+
+def _ids_of(db: Session, classes: Sequence[str]) -> List[int]:
+    """Ids of the class names, new names inserted - in the caller's transaction, every job:
+    a cache could keep ids of rows that a rollback took away."""
+    known = dict(db.execute(select(FlowClass.name, FlowClass.id).where(FlowClass.name.in_(classes))).all())
+    new = [name for name in classes if name not in known]
+    if new:
+        # only unknown names: ON CONFLICT still takes a (smallint) sequence value per row
+        db.execute(insert(FlowClass).values([{"name": name} for name in new]).on_conflict_do_nothing())
+        known.update(db.execute(select(FlowClass.name, FlowClass.id).where(FlowClass.name.in_(new))).all())
+    return [known[name] for name in classes]
+
+
+def _address(value) -> Optional[str]:
+    try:
+        # scope ids (fe80::1%eth0) are not valid inet
+        return str(ipaddress.ip_address(str(value).strip().split("%", 1)[0]))
+    except ValueError:
+        return None
+
+
+def _port(value) -> Optional[int]:
+    try:
+        if isinstance(value, str):
+            value = value.strip()
+            # hex ports of ICMP / ARP flows in BoT-IoT (0x0303)
+            port = int(value, 16) if value[:2].lower() == "0x" else int(float(value))
+        else:
+            port = int(value)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return port if 0 <= port <= 65535 else None
+
+
+def _by_unique(values: np.ndarray, parse, type_):
+    """parse() each distinct value once (addresses / ports repeat a lot), then take per row."""
+    import pyarrow as pa
+
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    dictionary = pa.array([parse(v) for v in uniques], type=type_)
+    return dictionary.take(pa.array(codes, mask=codes < 0))
+
+
+def _table(job_id: UUID, day: date, rows: FlowRows, class_ids: Sequence[int]):
+    import pyarrow as pa
+
+    n = rows.rows
+    ids = np.asarray(class_ids, dtype=np.int16)
+
+    def key(name: str, parse, type_):
+        values = rows.keys.get(name)
+        return _by_unique(values, parse, type_) if values is not None else pa.nulls(n, type_)
+
+    def proba(values: Optional[np.ndarray]):
+        if values is None:
+            return pa.nulls(n, pa.float32())
+        return pa.array(values.astype(np.float32, copy=False), from_pandas=True)
+
+    return pa.table(
+        {
+            "job_id": pa.repeat(str(job_id), n),
+            "row_no": pa.array(np.arange(n, dtype=np.int64)),
+            "day": pa.repeat(pa.scalar(day, pa.date32()), n),
+            "saddr": key("saddr", _address, pa.string()),
+            "sport": key("sport", _port, pa.int32()),
+            "daddr": key("daddr", _address, pa.string()),
+            "dport": key("dport", _port, pa.int32()),
+            "is_attack": pa.array(rows.codes > 0),
+            "class_id": pa.array(ids[rows.codes]),
+            "attack_proba": proba(rows.proba_attack),
+            "class_proba": proba(rows.proba_class),
+        }
+    )
+
+
+def copy_chunks(job_id: UUID, day: date, rows: FlowRows, class_ids: Sequence[int]) -> Iterator[memoryview]:
+    """COPY ... (FORMAT csv) payload of the rows, chunk by chunk (nulls are unquoted empty fields)."""
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+
+    table = _table(job_id, day, rows, class_ids)
+    options = pacsv.WriteOptions(include_header=False)
+    for batch in table.to_batches(max_chunksize=_COPY_ROWS):
+        sink = pa.BufferOutputStream()
+        pacsv.write_csv(batch, sink, write_options=options)
+        yield memoryview(sink.getvalue())
+
+
+def _undefined_table(e: Exception) -> bool:
+    # psycopg error from the raw COPY, or wrapped by SQLAlchemy
+    return getattr(e, "sqlstate", None) == "42P01" or getattr(getattr(e, "orig", None), "sqlstate", None) == "42P01"
+
+
+def _replace_rows(db: Session, name: str, job_id: UUID, day: date, rows: FlowRows, class_ids: Sequence[int]) -> None:
+    # partition key in the condition: only that partition is scanned (by the primary key)
+    db.execute(delete(FlowPrediction).where(FlowPrediction.day == day, FlowPrediction.job_id == job_id))
+
+    # straight into the partition: no per-row routing through the parent
+    conn = db.connection().connection.driver_connection
+    with conn.cursor() as cur:
+        with cur.copy(f"COPY {name} ({', '.join(COPY_COLUMNS)}) FROM STDIN (FORMAT csv)") as copy:
+            for chunk in copy_chunks(job_id, day, rows, class_ids):
+                copy.write(chunk)
+
+
+def load(db: Session, job: InferenceJob, rows: FlowRows) -> int:
+    """Replace the job's rows in flow_predictions. No commit: runs in the caller's transaction."""
+    day = upload_day(job.created_at)
+    name = ensure_partition(db.get_bind(), day)
+    class_ids = _ids_of(db, rows.classes)
+
+    try:
+        # savepoint: its rollback also releases the locks on flow_predictions,
+        # which ensure_partition needs below
+        with db.begin_nested():
+            _replace_rows(db, name, job.id, day, rows, class_ids)
+    except Exception as e:
+        if not _undefined_table(e):
+            raise
+        # a re-delivered job of a day whose partition retention has dropped since we created it
+        _partitions.discard(day)
+        name = ensure_partition(db.get_bind(), day)
+        _replace_rows(db, name, job.id, day, rows, class_ids)
+    return rows.rows
+
+
+def partitions(db: Session) -> List[Tuple[str, date]]:
+    """Existing partitions of flow_predictions, oldest first."""
+    names = db.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'flow_predictions'"
+        )
+    ).all()
+    out = []
+    for name in names:
+        m = _PARTITION_RE.match(name)
+        if m:
+            out.append((name, datetime.strptime(m.group(1), "%Y%m%d").date()))
+    return sorted(out, key=lambda item: item[1])
+
+
+def drop_expired(db: Session, retention_days: int, today: Optional[date] = None) -> List[str]:
+    """Drop the partitions of days before today - retention_days; returns their names.
+
+    One short transaction per partition (DROP locks the parent table for a moment).
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = today - timedelta(days=retention_days)
+    dropped = []
+    for name, day in partitions(db):
+        if day >= cutoff:
+            break
+        db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        db.commit()
+        _partitions.discard(day)
+        dropped.append(name)
+    return dropped
@@ -1 +1,304 @@
-# reserved for moving business logic out of routers later
+from __future__ import annotations
+
+import base64
+import binascii
+import os
+import shutil
+import tarfile
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.config import settings
+from app.core.formats import codec_available, compression_of, detect_upload, is_upload_name
+from app.core.metrics import UPLOAD_BYTES
+from app.core.model_manifest import available_versions
+from app.models.inference_job import InferenceJob
+from app.models.traffic_file import TrafficFile
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+UNSUPPORTED_UPLOAD = (
+    "Only CSV files (.csv, .csv.gz, .csv.zst), Parquet / Arrow IPC / JSON lines (.parquet, .arrow, .jsonl), "
+    "packet captures (.pcap, .pcapng) and flow exports (.ipfix, .netflow) are supported"
+)
+
+
+def check_upload_name(filename: str | None) -> None:
+    """Early check before the body is stored: a name, and a codec for a .gz/.zst one.
+
+    The format itself is decided by the content (store_upload), so names
+    without a known suffix are let through here.
+    """
+    if not filename:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_UPLOAD)
+    compression = compression_of(filename)
+    if not codec_available(compression):
+        raise HTTPException(status_code=400, detail=f"{compression} compression is not supported on this server")
+
+
+def check_model_version(model_version: str | None) -> str | None:
+    """Validate a pinned model version against the manifest of the shared models volume."""
+    if not model_version:
+        return None
+    try:
+        versions = available_versions(settings.model_dir)
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=f"Model manifest is broken: {e}")
+    if model_version not in versions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown model version '{model_version}' (available: {', '.join(versions)})",
+        )
+    return model_version
+
+
+def store_upload(src: BinaryIO, filename: str) -> Tuple[str, str]:
+    """Stream an uploaded CSV / table / capture into uploads_dir.
+
+    The stored file's suffix follows its magic bytes, not the client's name
+    (x.csv holding Parquet is stored as ..._x.parquet); the original name is
+    kept for display.
+
+    Returns: (safe_name, stored_path)
+    """
+    os.makedirs(settings.uploads_dir, exist_ok=True)
+    safe_name = os.path.basename(filename)
+    stored_path = os.path.join(settings.uploads_dir, f"{uuid.uuid4()}_{safe_name}")
+
+    try:
+        with open(stored_path, "wb") as f:
+            shutil.copyfileobj(src, f)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store file: {e}")
+
+    size = os.path.getsize(stored_path)
+    if size == 0:
+        os.remove(stored_path)
+        raise HTTPException(status_code=400, detail=f"Empty file: {safe_name}")
+    try:
+        detected = detect_upload(stored_path, safe_name)
+    except ValueError as e:
+        os.remove(stored_path)
+        raise HTTPException(status_code=400, detail=f"{UNSUPPORTED_UPLOAD} ('{safe_name}': {e})")
+    if detected != safe_name:
+        renamed = os.path.join(os.path.dirname(stored_path), f"{uuid.uuid4()}_{detected}")
+        os.replace(stored_path, renamed)
+        stored_path = renamed
+
+    UPLOAD_BYTES.observe(size)
+
+    return safe_name, stored_path
+
+
+def iter_archive_uploads(src: BinaryIO, filename: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """Yield (member_name, stream) for every CSV / table / capture member of a zip/tar archive.
+
+    Members are picked by name (archives carry READMEs and the like); each is
+    then checked by content like any upload.
+    """
+    name = filename.lower()
+    try:
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(src) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not is_upload_name(info.filename):
+                        continue
+                    if "__MACOSX" in info.filename:
+                        continue
+                    with zf.open(info) as member:
+                        yield info.filename, member
+        else:
+            # mode "r|*" reads the archive as a stream, gz or plain
+            with tarfile.open(fileobj=src, mode="r|*") as tf:
+                for info in tf:
+                    if not info.isfile() or not is_upload_name(info.name):
+                        continue
+                    member = tf.extractfile(info)
+                    if member is not None:
+                        yield info.name, member
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise HTTPException(status_code=400, detail=f"Broken archive '{filename}': {e}")
+
+
+def store_uploads(parts: Iterable[Tuple[str, BinaryIO]]) -> List[Tuple[str, str]]:
+    """Store every CSV / table / capture of a batch (archives are expanded). Blocking - call from a threadpool.
+
+    All-or-nothing: on any error already stored files are removed.
+    """
+    stored: List[Tuple[str, str]] = []
+    try:
+        for filename, src in parts:
+            members = iter_archive_uploads(src, filename) if is_archive(filename) else [(filename, src)]
+
+            for member_name, stream in members:
+                if len(stored) >= settings.batch_upload_max_files:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Too many files in batch (max {settings.batch_upload_max_files})",
+                    )
+                stored.append(store_upload(stream, member_name))
+    except Exception:
+        for _, path in stored:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    return stored
+
+
+async def create_jobs(
+    db: AsyncSession,
+    user_id: UUID,
+    stored: Iterable[Tuple[str, str]],
+    batch_id: UUID | None = None,
+    model_version: str | None = None,
+) -> List[Tuple[UUID, str]]:
+    """Insert TrafficFile + InferenceJob rows for stored uploads in one transaction.
+
+    Ids are generated client-side, so jobs can reference their files before the
+    flush; the unit of work orders the INSERTs by FK. On failure stored files
+    are removed, nothing stays half-registered.
+
+    Returns: [(job_id, original_filename)]
+    """
+    now = _utcnow()
+    stored = list(stored)
+
+    files: List[TrafficFile] = []
+    jobs: List[InferenceJob] = []
+    for safe_name, stored_path in stored:
+        tf = TrafficFile(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            original_filename=safe_name,
+            stored_path=stored_path,
+            stored_bytes=os.path.getsize(stored_path),
+            rows_count=None,
+            created_at=now,
+        )
+        files.append(tf)
+        jobs.append(
+            InferenceJob(
+                id=uuid.uuid4(),
+                user_id=user_id,
+                file_id=tf.id,
+                batch_id=batch_id,
+                model_version=model_version,
+                status="queued",
+                created_at=now,
+                started_at=None,
+                finished_at=None,
+                error_message=None,
+            )
+        )
+
+    created = [(job.id, tf.original_filename) for job, tf in zip(jobs, files)]
+
+    try:
+        db.add_all([*files, *jobs])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        for _, stored_path in stored:
+            if os.path.exists(stored_path):
+                os.remove(stored_path)
+        raise
+
+    return created
+
+
+def aggregate_status(statuses: Iterable[str]) -> str:
+    """Batch status from its job statuses.
+
+    queued/running while anything is in flight, done/failed when all jobs agree,
+    partial when finished with a mix of done and failed.
+    """
+    statuses = set(statuses)
+    if not statuses:
+        return "queued"
+    if statuses & {"queued", "running"}:
+        return "running" if statuses - {"queued"} else "queued"
+    if statuses == {"done"}:
+        return "done"
+    if statuses == {"failed"}:
+        return "failed"
+    return "partial"
+
+
+def user_jobs_select(user_id: UUID) -> Select:
+    """Single query path for every job read: file + summary are joined eagerly.
+
+    Both relations are many-to-one/one-to-one, so joinedload keeps it at one
+    SELECT with LIMIT applied correctly, whatever the number of jobs. Eager
+    loading is also required under AsyncSession - lazy loads are not allowed.
+    """
+    return (
+        select(InferenceJob)
+        .options(joinedload(InferenceJob.file, innerjoin=True), joinedload(InferenceJob.summary))
+        .where(InferenceJob.user_id == user_id)
+    )
+
+
+async def fetch_jobs(db: AsyncSession, stmt: Select) -> List[InferenceJob]:
+    return list((await db.scalars(stmt)).all())
+
+
+def encode_cursor(job: InferenceJob) -> str:
+    raw = f"{job.created_at.isoformat()}|{job.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_iso, job_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_iso), UUID(job_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def list_jobs_page(
+    db: AsyncSession,
+    user_id: UUID,
+    limit: int,
+    cursor: str | None = None,
+    offset: int = 0,
+) -> Tuple[List[InferenceJob], str | None]:
+    """One page of job history, newest first.
+
+    With a cursor this is a keyset seek on (created_at, id), served by
+    ix_inference_jobs_user_created_id without reading the skipped rows.
+    Returns: (jobs, next_cursor) - next_cursor is None on the last page.
+    """
+    stmt = user_jobs_select(user_id).order_by(InferenceJob.created_at.desc(), InferenceJob.id.desc())
+
+    if cursor:
+        created_at, job_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(InferenceJob.created_at, InferenceJob.id) < tuple_(created_at, job_id))
+    elif offset:
+        stmt = stmt.offset(offset)
+
+    # one extra row tells whether there is a next page
+    jobs = await fetch_jobs(db, stmt.limit(limit + 1))
+    if len(jobs) <= limit:
+        return jobs, None
+
+    jobs = jobs[:limit]
+    return jobs, encode_cursor(jobs[-1])
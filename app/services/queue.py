@@ -1,27 +1,50 @@
 from __future__ import annotations
 
 import json
+from typing import Iterable, Tuple
+
 import pika
 
 from app.core.config import settings
 
 
-def publish_ml_job(job_id: str) -> None:
+def publish_ml_jobs(job_ids: Iterable[str]) -> None:
+    """Publish many jobs over a single connection/channel (one AMQP handshake per batch)."""
+    job_ids = list(job_ids)
+    if not job_ids:
+        return
+
     params = pika.URLParameters(settings.rabbitmq_url)
     connection = pika.BlockingConnection(params)
-    channel = connection.channel()
-
-    channel.queue_declare(queue=settings.ml_queue_name, durable=True)
+    try:
+        channel = connection.channel()
+        channel.queue_declare(queue=settings.ml_queue_name, durable=True)
 
-    body = json.dumps({"job_id": job_id}).encode("utf-8")
-    channel.basic_publish(
-        exchange="",
-        routing_key=settings.ml_queue_name,
-        body=body,
-        properties=pika.BasicProperties(
+        properties = pika.BasicProperties(
             delivery_mode=2,  # persistent
             content_type="application/json",
-        ),
-    )
+        )
+        for job_id in job_ids:
+            body = json.dumps({"job_id": job_id}).encode("utf-8")
+            channel.basic_publish(
+                exchange="",
+                routing_key=settings.ml_queue_name,
+                body=body,
+                properties=properties,
+            )
+    finally:
+        connection.close()
+
+
+def publish_ml_job(job_id: str) -> None:
+    publish_ml_jobs([job_id])
+
 
-    connection.close()
+def queue_state() -> Tuple[int, int]:
+    """(ready messages, consumers) of the ML queue - a passive declare, nothing is created."""
+    connection = pika.BlockingConnection(pika.URLParameters(settings.rabbitmq_url))
+    try:
+        method = connection.channel().queue_declare(queue=settings.ml_queue_name, durable=True, passive=True)
+        return int(method.method.message_count), int(method.method.consumer_count)
+    finally:
+        connection.close()
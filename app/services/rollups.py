@@ -0,0 +1,249 @@
+"""Per-user daily rollups of jobs: user_daily_stats + user_daily_class_counts.
+
+The worker keeps them current inside the transaction that finalizes a job
+(record_job): atomic upserts adding deltas (col = col + excluded.col), so
+concurrent workers never lose an update and a rolled back job leaves no
+trace. A job is counted on the UTC day it was uploaded; a re-delivered job
+only adds the difference to its previous outcome.
+
+Dashboards read O(days) rows (daily_stats). rebuild() recomputes all of it
+from inference_jobs / prediction_summaries - the backfill for history that
+predates the rollups (python -m app.scripts.backfill_rollups).
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.inference_job import InferenceJob
+from app.models.prediction_summary import PredictionSummary
+from app.models.user_rollup import UserDailyClassCount, UserDailyStats
+
+# attack rows of pre-rollup summaries that are not their top class (no per-class counts stored then)
+UNKNOWN_CLASS = "unknown"
+
+_REBUILD_BATCH = 5000
+
+
+@dataclass
+class JobOutcome:
+    """What a job contributes to the rollups."""
+
+    status: Optional[str] = None  # done / failed count, anything else does not
+    rows: int = 0
+    attacks: int = 0
+    classes: Dict[str, int] = field(default_factory=dict)
+
+    def counted(self, status: str) -> bool:
+        return self.status == status
+
+
+def upload_day(created: Optional[datetime]) -> date:
+    """UTC date of a job's upload: the day it is counted on (here and in flow_predictions)."""
+    created = created or datetime.now(timezone.utc)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created.astimezone(timezone.utc).date()
+
+
+def outcome_of(db: Session, job: InferenceJob) -> JobOutcome:
+    """The job's current contribution (taken before the worker changes it)."""
+    if job.status != "done":
+        return JobOutcome(status=job.status)
+    ps = db.scalar(select(PredictionSummary).where(PredictionSummary.job_id == job.id))
+    if ps is None:
+        return JobOutcome(status=job.status)
+    classes = _summary_classes(ps.class_counts, ps.attack_rows, ps.top_class, ps.top_class_share)
+    return JobOutcome("done", int(ps.rows_scored or 0), int(ps.attack_rows or 0), classes)
+
+
+def _summary_classes(
+    class_counts: Optional[dict], attack_rows: Optional[int], top_class: Optional[str], top_share: Optional[float]
+) -> Dict[str, int]:
+    if class_counts is not None:
+        return {str(k): int(v) for k, v in class_counts.items()}
+    # summaries written before class_counts: only the top class is known
+    attacks = int(attack_rows or 0)
+    if attacks <= 0:
+        return {}
+    top = min(attacks, round((top_share or 0.0) * attacks)) if top_class not in (None, "benign") else 0
+    classes = {top_class: top} if top else {}
+    if attacks - top:
+        classes[UNKNOWN_CLASS] = attacks - top
+    return classes
+
+
+def _insert(db: Session):
+    # Postgres in production, SQLite in bench_pipeline's in-memory stand-in: same upsert API
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+
+def _add(
+    db: Session,
+    user_id: UUID,
+    day: date,
+    jobs_done: int,
+    jobs_failed: int,
+    rows: int,
+    attacks: int,
+    classes: Dict[str, int],
+) -> None:
+    insert = _insert(db)
+    stmt = insert(UserDailyStats).values(
+        user_id=user_id,
+        day=day,
+        jobs_done=jobs_done,
+        jobs_failed=jobs_failed,
+        rows_scored=rows,
+        attack_rows=attacks,
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserDailyStats.user_id, UserDailyStats.day],
+            set_={
+                "jobs_done": UserDailyStats.jobs_done + stmt.excluded.jobs_done,
+                "jobs_failed": UserDailyStats.jobs_failed + stmt.excluded.jobs_failed,
+                "rows_scored": UserDailyStats.rows_scored + stmt.excluded.rows_scored,
+                "attack_rows": UserDailyStats.attack_rows + stmt.excluded.attack_rows,
+                "updated_at": func.now(),
+            },
+        )
+    )
+    if not classes:
+        return
+    stmt = insert(UserDailyClassCount).values(
+        [{"user_id": user_id, "day": day, "class_name": name, "rows": n} for name, n in sorted(classes.items())]
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserDailyClassCount.user_id, UserDailyClassCount.day, UserDailyClassCount.class_name],
+            set_={"rows": UserDailyClassCount.rows + stmt.excluded.rows},
+        )
+    )
+
+
+def record_job(db: Session, job: InferenceJob, before: JobOutcome, after: JobOutcome) -> None:
+    """Add the difference between two outcomes of a job. No commit: call it in the
+    transaction that writes the job's final status."""
+    done = after.counted("done") - before.counted("done")
+    failed = after.counted("failed") - before.counted("failed")
+
+    def part(o: JobOutcome) -> Tuple[int, int, Dict[str, int]]:
+        return (o.rows, o.attacks, o.classes) if o.counted("done") else (0, 0, {})
+
+    rows_a, attacks_a, classes_a = part(after)
+    rows_b, attacks_b, classes_b = part(before)
+    classes = {k: classes_a.get(k, 0) - classes_b.get(k, 0) for k in {*classes_a, *classes_b}}
+    classes = {k: v for k, v in classes.items() if v}
+
+    if not (done or failed or rows_a - rows_b or attacks_a - attacks_b or classes):
+        return
+    _add(db, job.user_id, upload_day(job.created_at), done, failed, rows_a - rows_b, attacks_a - attacks_b, classes)
+
+
+def rebuild(db: Session) -> Tuple[int, int]:
+    """Recompute every rollup from the job history in one transaction.
+
+    On Postgres the rollup tables are locked for the duration: a worker
+    finalizing a job meanwhile waits and adds its delta after the rebuild,
+    so nothing is counted twice or lost. Returns (jobs read, day rows written).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE user_daily_stats, user_daily_class_counts IN EXCLUSIVE MODE"))
+    db.execute(delete(UserDailyClassCount))
+    db.execute(delete(UserDailyStats))
+
+    totals: Dict[Tuple[UUID, date], List[int]] = defaultdict(lambda: [0, 0, 0, 0])
+    classes: Dict[Tuple[UUID, date], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    jobs = 0
+    # plain columns, streamed: memory grows with (user, day) pairs, not with jobs
+    result = db.execute(
+        select(
+            InferenceJob.user_id,
+            InferenceJob.created_at,
+            InferenceJob.status,
+            PredictionSummary.rows_scored,
+            PredictionSummary.attack_rows,
+            PredictionSummary.class_counts,
+            PredictionSummary.top_class,
+            PredictionSummary.top_class_share,
+        )
+        .outerjoin(PredictionSummary, PredictionSummary.job_id == InferenceJob.id)
+        .where(InferenceJob.status.in_(("done", "failed")))
+        .execution_options(yield_per=_REBUILD_BATCH)
+    )
+    for user_id, created_at, status, n_rows, attacks, class_counts, top_class, top_share in result:
+        jobs += 1
+        key = (user_id, upload_day(created_at))
+        acc = totals[key]
+        if status == "failed":
+            acc[1] += 1
+            continue
+        acc[0] += 1
+        if n_rows is None:
+            continue
+        acc[2] += int(n_rows)
+        acc[3] += int(attacks or 0)
+        for name, n in _summary_classes(class_counts, attacks, top_class, top_share).items():
+            classes[key][name] += n
+
+    for (user_id, day), (done, failed, n_rows, attacks) in totals.items():
+        db.add(
+            UserDailyStats(
+                user_id=user_id,
+                day=day,
+                jobs_done=done,
+                jobs_failed=failed,
+                rows_scored=n_rows,
+                attack_rows=attacks,
+            )
+        )
+    for (user_id, day), counts in classes.items():
+        for name, n in counts.items():
+            if n:
+                db.add(UserDailyClassCount(user_id=user_id, day=day, class_name=name, rows=n))
+    db.commit()
+    return jobs, len(totals)
+
+
+# ---------- reads (API) ----------
+
+
+async def daily_stats(
+    db: AsyncSession, user_id: UUID, days: int, today: Optional[date] = None
+) -> Tuple[List[UserDailyStats], Dict[date, Dict[str, int]]]:
+    """The user's rollup rows of the last `days` days (today included): two
+    primary-key range scans, independent of the number of jobs."""
+    today = today or datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days - 1)
+
+    stats = list(
+        (
+            await db.scalars(
+                select(UserDailyStats)
+                .where(UserDailyStats.user_id == user_id, UserDailyStats.day >= since)
+                .order_by(UserDailyStats.day)
+            )
+        ).all()
+    )
+    classes: Dict[date, Dict[str, int]] = defaultdict(dict)
+    rows = await db.execute(
+        select(UserDailyClassCount.day, UserDailyClassCount.class_name, UserDailyClassCount.rows).where(
+            UserDailyClassCount.user_id == user_id, UserDailyClassCount.day >= since
+        )
+    )
+    for day, name, n in rows:
+        if n:
+            classes[day][name] = int(n)
+    return stats, classes
@@ -0,0 +1,334 @@
+"""Uploads volume housekeeping: at-rest compression, scored-file dedup, retention.
+
+Runs in the storage manager process (python -m app.storage_manager) on a sync
+Session; scored_download() is used by the API. A file is touched only while
+no job of its upload is queued or running. Replacements are written and
+committed before the old file is removed, so a crash leaves at most an orphan
+file on disk, never a row pointing at nothing.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import Session, aliased, joinedload
+
+from app.core.config import settings
+from app.core.csv_utils import iter_scored_csv, write_slim_scored
+from app.core.formats import (
+    AT_REST_COMPRESSION,
+    compress_file,
+    compression_of,
+    iter_compress,
+    is_columnar,
+    is_csv_name,
+    iter_read,
+    media_type,
+    scored_name,
+    split_csv_name,
+    with_compression,
+)
+from app.models.inference_job import InferenceJob
+from app.models.prediction_summary import PredictionSummary
+from app.models.traffic_file import TrafficFile
+
+HOT, COMPRESSED, SLIM, EXPIRED = "hot", "compressed", "slim", "expired"
+
+_BUSY = ("queued", "running")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class StorageReport:
+    measured: int = 0
+    compressed: int = 0
+    slimmed: int = 0
+    expired: int = 0
+    bytes_freed: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def _size(path: Optional[str]) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _remove(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _idle():
+    """No job of the upload is queued or running (its files may change)."""
+    busy = aliased(InferenceJob)
+    return ~exists().where(busy.file_id == TrafficFile.id, busy.status.in_(_BUSY)).correlate(TrafficFile)
+
+
+def _summaries_of(db: Session, tf: TrafficFile) -> List[PredictionSummary]:
+    return list(
+        db.scalars(
+            select(PredictionSummary)
+            .join(InferenceJob, InferenceJob.id == PredictionSummary.job_id)
+            .where(InferenceJob.file_id == tf.id, PredictionSummary.scored_state != EXPIRED)
+        )
+    )
+
+
+# ---------- jobs ----------
+
+
+def measure_sizes(db: Session, report: StorageReport, limit: int) -> None:
+    """Fill missing byte counts (rows from before the storage manager)."""
+    files = db.scalars(
+        select(TrafficFile).where(TrafficFile.stored_bytes.is_(None), TrafficFile.storage_state != EXPIRED).limit(limit)
+    ).all()
+    for tf in files:
+        tf.stored_bytes = _size(tf.stored_path)
+    summaries = db.scalars(
+        select(PredictionSummary)
+        .where(
+            PredictionSummary.scored_bytes.is_(None),
+            PredictionSummary.scored_path.is_not(None),
+            PredictionSummary.scored_state != EXPIRED,
+        )
+        .limit(limit)
+    ).all()
+    for ps in summaries:
+        ps.scored_bytes = _size(ps.scored_path)
+    db.commit()
+    report.measured += len(files) + len(summaries)
+
+
+def _compress_raw(db: Session, tf: TrafficFile, now: datetime, report: StorageReport) -> None:
+    old_path = tf.stored_path
+    before = _size(old_path)
+    if compression_of(old_path) is None and not is_columnar(old_path):
+        # uploads already sent as .gz/.zst (or Parquet / Arrow, compressed inside) are kept as they are
+        tf.stored_path = with_compression(old_path, AT_REST_COMPRESSION)
+        tf.stored_bytes = compress_file(old_path, tf.stored_path)
+    else:
+        tf.stored_bytes = before
+    tf.storage_state = COMPRESSED
+    tf.storage_updated_at = now
+    db.commit()
+
+    if tf.stored_path != old_path:
+        _remove(old_path)
+        report.compressed += 1
+        report.bytes_freed += before - tf.stored_bytes
+
+
+def _compress_scored(db: Session, ps: PredictionSummary, tf: TrafficFile, now: datetime, report: StorageReport) -> None:
+    old_path = ps.scored_path
+    before = _size(old_path)
+
+    new_path, sep = old_path, None
+    # captures: the scored flows are not in the upload, nothing to re-join
+    dedupe = settings.storage_dedupe_scored and is_csv_name(tf.stored_path)
+    if dedupe and tf.storage_state != EXPIRED and os.path.exists(tf.stored_path):
+        slim_path = with_compression(split_csv_name(old_path)[0] + ".preds.csv", AT_REST_COMPRESSION)
+        sep = write_slim_scored(tf.stored_path, old_path, slim_path)
+        if sep is not None:
+            new_path = slim_path
+    if sep is None and compression_of(old_path) is None and not is_columnar(old_path):
+        new_path = with_compression(old_path, AT_REST_COMPRESSION)
+        compress_file(old_path, new_path)
+
+    ps.scored_path = new_path
+    ps.scored_sep = sep
+    ps.scored_state = SLIM if sep is not None else COMPRESSED
+    ps.scored_bytes = _size(new_path)
+    db.commit()
+
+    if new_path != old_path:
+        _remove(old_path)
+        if sep is not None:
+            report.slimmed += 1
+        else:
+            report.compressed += 1
+        report.bytes_freed += before - ps.scored_bytes
+
+
+def compress_cold(db: Session, now: datetime, report: StorageReport, limit: int) -> None:
+    """Uploads and scored files older than STORAGE_COMPRESS_AFTER_HOURS -> .csv.zst / slim."""
+    cutoff = now - timedelta(hours=settings.storage_compress_after_hours)
+
+    files = db.scalars(
+        select(TrafficFile)
+        .where(TrafficFile.storage_state == HOT, TrafficFile.created_at < cutoff, _idle())
+        .order_by(TrafficFile.created_at)
+        .limit(limit)
+    ).all()
+    for tf in files:
+        if not os.path.exists(tf.stored_path):
+            continue
+        try:
+            _compress_raw(db, tf, now, report)
+        except Exception as e:
+            db.rollback()
+            report.errors.append(f"compress {tf.stored_path}: {e}")
+
+    summaries = db.scalars(
+        select(PredictionSummary)
+        .join(InferenceJob, InferenceJob.id == PredictionSummary.job_id)
+        .join(TrafficFile, TrafficFile.id == InferenceJob.file_id)
+        .options(joinedload(PredictionSummary.job).joinedload(InferenceJob.file))
+        .where(
+            PredictionSummary.scored_state == HOT,
+            PredictionSummary.scored_path.is_not(None),
+            TrafficFile.created_at < cutoff,
+            _idle(),
+        )
+        .order_by(TrafficFile.created_at)
+        .limit(limit)
+    ).all()
+    for ps in summaries:
+        if not os.path.exists(ps.scored_path):
+            continue
+        try:
+            _compress_scored(db, ps, ps.job.file, now, report)
+        except Exception as e:
+            db.rollback()
+            report.errors.append(f"compress {ps.scored_path}: {e}")
+
+
+def _expire(db: Session, tf: TrafficFile, now: datetime) -> int:
+    """Delete the upload and its scored files; rows stay for the history. Returns bytes freed."""
+    summaries = _summaries_of(db, tf)
+    paths = [tf.stored_path, *(ps.scored_path for ps in summaries)]
+    freed = (tf.stored_bytes or 0) + sum(ps.scored_bytes or 0 for ps in summaries)
+
+    tf.storage_state = EXPIRED
+    tf.storage_updated_at = now
+    for ps in summaries:
+        ps.scored_state = EXPIRED
+    db.commit()
+
+    for path in paths:
+        _remove(path)
+    return freed
+
+
+def _expire_all(db: Session, files: List[TrafficFile], now: datetime, report: StorageReport) -> None:
+    for tf in files:
+        try:
+            report.bytes_freed += _expire(db, tf, now)
+            report.expired += 1
+        except Exception as e:
+            db.rollback()
+            report.errors.append(f"expire {tf.stored_path}: {e}")
+
+
+def _usage_by_user(db: Session) -> Dict[object, int]:
+    usage: Dict[object, int] = {}
+    rows = db.execute(
+        select(TrafficFile.user_id, func.coalesce(func.sum(TrafficFile.stored_bytes), 0))
+        .where(TrafficFile.storage_state != EXPIRED)
+        .group_by(TrafficFile.user_id)
+    )
+    for user_id, total in rows:
+        usage[user_id] = usage.get(user_id, 0) + int(total)
+    rows = db.execute(
+        select(TrafficFile.user_id, func.coalesce(func.sum(PredictionSummary.scored_bytes), 0))
+        .join(InferenceJob, InferenceJob.id == PredictionSummary.job_id)
+        .join(TrafficFile, TrafficFile.id == InferenceJob.file_id)
+        .where(PredictionSummary.scored_state != EXPIRED)
+        .group_by(TrafficFile.user_id)
+    )
+    for user_id, total in rows:
+        usage[user_id] = usage.get(user_id, 0) + int(total)
+    return usage
+
+
+def enforce_retention(db: Session, now: datetime, report: StorageReport, limit: int) -> None:
+    """Expire uploads older than STORAGE_RETENTION_DAYS, then the oldest ones of
+    users above STORAGE_USER_QUOTA_MB (stored + scored bytes)."""
+    if settings.storage_retention_days > 0:
+        cutoff = now - timedelta(days=settings.storage_retention_days)
+        files = db.scalars(
+            select(TrafficFile)
+            .where(TrafficFile.storage_state != EXPIRED, TrafficFile.created_at < cutoff, _idle())
+            .order_by(TrafficFile.created_at)
+            .limit(limit)
+        ).all()
+        _expire_all(db, list(files), now, report)
+
+    if settings.storage_user_quota_mb > 0:
+        quota = int(settings.storage_user_quota_mb * 1024 * 1024)
+        for user_id, used in _usage_by_user(db).items():
+            if used <= quota:
+                continue
+            victims: List[TrafficFile] = []
+            candidates = db.scalars(
+                select(TrafficFile)
+                .where(TrafficFile.user_id == user_id, TrafficFile.storage_state != EXPIRED, _idle())
+                .order_by(TrafficFile.created_at)
+                .limit(limit)
+            ).all()
+            for tf in candidates:
+                if used <= quota:
+                    break
+                victims.append(tf)
+                used -= (tf.stored_bytes or 0) + sum(ps.scored_bytes or 0 for ps in _summaries_of(db, tf))
+            _expire_all(db, victims, now, report)
+
+
+def run_once(db: Session, now: Optional[datetime] = None) -> StorageReport:
+    """One pass of every job: sizes first (quotas need them), retention before
+    compression (no point compressing what is deleted next)."""
+    now = now or _utcnow()
+    limit = settings.storage_batch_size
+    report = StorageReport()
+
+    measure_sizes(db, report, limit)
+    enforce_retention(db, now, report, limit)
+    if settings.storage_compress_after_hours > 0:
+        compress_cold(db, now, report, limit)
+    return report
+
+
+# ---------- downloads ----------
+
+
+@dataclass
+class ScoredDownload:
+    """How to serve a scored file: a path as is, or rebuilt/re-encoded chunks."""
+
+    filename: str
+    media_type: str
+    sources: List[str]
+    path: Optional[str] = None
+    chunks: Optional[Iterator[bytes]] = None
+
+
+def scored_download(ps: PredictionSummary, tf: TrafficFile) -> ScoredDownload:
+    """The scored CSV as it was written, whatever happened to it at rest.
+
+    The client always gets the upload's own compression: compressed-at-rest
+    files of plain uploads are decompressed on the fly, slim files are joined
+    back with the raw upload (and recompressed for .csv.gz/.csv.zst uploads).
+    """
+    # Parquet / Arrow outputs are never wrapped, whatever the client called the upload
+    want = None if is_columnar(tf.stored_path) else compression_of(tf.original_filename)
+    filename = with_compression(scored_name(tf.stored_path), want)
+    content_type = media_type(filename)
+
+    if ps.scored_state == SLIM:
+        chunks = iter_compress(iter_scored_csv(tf.stored_path, ps.scored_path, ps.scored_sep or ","), want)
+        return ScoredDownload(filename, content_type, [tf.stored_path, ps.scored_path], chunks=chunks)
+    if compression_of(ps.scored_path) == want:
+        return ScoredDownload(filename, content_type, [ps.scored_path], path=ps.scored_path)
+    chunks = iter_compress(iter_read(ps.scored_path), want)
+    return ScoredDownload(filename, content_type, [ps.scored_path], chunks=chunks)
@@ -0,0 +1,83 @@
+"""Storage manager: keeps the uploads volume bounded (see app/services/storage.py).
+
+Every STORAGE_POLL_SECONDS:
+  - fills missing byte counts of uploads / scored files,
+  - expires uploads past STORAGE_RETENTION_DAYS or over STORAGE_USER_QUOTA_MB,
+  - compresses uploads older than STORAGE_COMPRESS_AFTER_HOURS to .csv.zst and
+    turns their scored files into predictions-only "slim" files (the raw
+    columns are re-joined from the upload on download),
+  - with FLOW_SINK_ENABLED: creates tomorrow's flow_predictions partition and
+    drops partitions older than FLOW_SINK_RETENTION_DAYS.
+
+Usage:
+  python -m app.storage_manager           # loop (docker-compose service "storage")
+  python -m app.storage_manager --once    # one pass, e.g. from cron
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.core.db import SessionLocal, engine
+from app.services import flow_sink
+from app.services.storage import run_once
+
+
+def _pass() -> None:
+    t = time.perf_counter()
+    db = SessionLocal()
+    try:
+        report = run_once(db)
+    finally:
+        db.close()
+
+    print(
+        f"[storage] measured={report.measured} compressed={report.compressed} slimmed={report.slimmed} "
+        f"expired={report.expired} freed={report.bytes_freed / 1e6:.1f}MB in {time.perf_counter() - t:.1f}s"
+    )
+    for error in report.errors:
+        print(f"[storage] error: {error}")
+
+    if settings.flow_sink_enabled:
+        _flow_partitions()
+
+
+def _flow_partitions() -> None:
+    today = datetime.now(timezone.utc).date()
+    # workers then rarely run the DDL themselves
+    for day in (today, today + timedelta(days=1)):
+        flow_sink.ensure_partition(engine, day)
+    if settings.flow_sink_retention_days <= 0:
+        return
+    db = SessionLocal()
+    try:
+        dropped = flow_sink.drop_expired(db, settings.flow_sink_retention_days, today)
+    finally:
+        db.close()
+    if dropped:
+        print(f"[storage] dropped flow_predictions partitions: {', '.join(dropped)}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compress / slim / expire files on the uploads volume")
+    ap.add_argument("--once", action="store_true", help="run one pass and exit")
+    args = ap.parse_args()
+
+    if args.once:
+        _pass()
+        return
+
+    print(f"[storage] every {settings.storage_poll_seconds:.0f}s, uploads_dir={settings.uploads_dir}")
+    while True:
+        try:
+            _pass()
+        except Exception as e:
+            # DB restarts etc.: retry on the next pass
+            print(f"[storage] pass failed: {e}")
+        time.sleep(settings.storage_poll_seconds)
+
+
+if __name__ == "__main__":
+    main()
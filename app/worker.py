@@ -1,23 +1,63 @@
 from __future__ import annotations
 
+import functools
 import json
 import os
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
 
+import numpy as np
+import pandas as pd
 import pika
 from pika.exceptions import AMQPConnectionError
+from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.csv_utils import read_csv_robust
-from app.core.db import SessionLocal
+from app.core.captures import CaptureError, read_capture_flows
+from app.core.csv_utils import (
+    NumericCsv,
+    read_csv_robust,
+    read_numeric_matrix,
+    read_text_columns,
+    write_frame_csv,
+    write_scored_csv,
+    write_scored_frame,
+)
+from app.core.db import SessionLocal, engine
+from app.core.flows import flow_matrix
+from app.core.formats import capture_kind, scored_name, table_kind
+from app.core.metrics import (
+    JOB_QUEUE_WAIT_SECONDS,
+    JOB_ROWS_PER_SECOND,
+    JOB_RUNTIME_SECONDS,
+    JOB_STAGE_SECONDS,
+    JOBS_TOTAL,
+    SHADOW_LABEL_AGREEMENT,
+    SHADOW_OVERHEAD_RATIO,
+    instrument_engine,
+)
+from app.core.model_manifest import read_manifest
 from app.core.model_seed import ensure_models_present
-from app.ml.bundle import XGBBundle
+from app.core.profiling import SlowJobProfiler
+from app.core.tables import read_table_columns, read_table_matrix, write_scored_table
+from app.core.timing import StageTimer
+from app.core.tracing import emit_job_trace
+from app.ml.bundle import LABEL_COLS, XGBBundle
+from app.ml.registry import BundleRegistry, ModelVersionError
+from app.ml.shadow import ShadowBudget, shadow_compare
+from app.ml.timeline import TIME_COLUMNS, Timeline, build_timeline, codes_from_labels
+from app.ml.tuning import InferenceTuning, worker_tuning
 from app.models.inference_job import InferenceJob
 from app.models.prediction_summary import PredictionSummary
+from app.models.prediction_timeline import PredictionTimeline
 from app.models.traffic_file import TrafficFile
+from app.services import flow_sink
+from app.services.flow_sink import KEY_COLUMNS, FlowRows
+from app.services.rollups import JobOutcome, outcome_of, record_job
 
 
 def _utcnow() -> datetime:
@@ -28,26 +68,27 @@ def _get_db() -> Session:
     return SessionLocal()
 
 
-def _load_models() -> XGBBundle:
+def _load_models(nthread: int = 0) -> BundleRegistry:
+    default_paths = {
+        "xgb_bin_path": settings.xgb_bin_path,
+        "xgb_multi_path": settings.xgb_multi_path,
+        "class_mapping_path": settings.xgb_class_mapping_path,
+        "features_bin_path": settings.xgb_features_bin_path,
+        "features_multi_path": settings.xgb_features_multi_path,
+    }
+    registry = BundleRegistry(settings.model_dir, default_paths, nthread=nthread)
+    if read_manifest(settings.model_dir) is not None:
+        registry.refresh(raise_errors=True)
+        return registry
+
+    # flat layout (no manifest): seed the volume from the image like before
     ensure_models_present(
         model_dir=settings.model_dir,
-        required_paths=[
-            settings.xgb_bin_path,
-            settings.xgb_multi_path,
-            settings.xgb_class_mapping_path,
-            settings.xgb_features_bin_path,
-            settings.xgb_features_multi_path,
-        ],
+        required_paths=list(default_paths.values()),
         source_dir="/app/models",
     )
-
-    return XGBBundle.load(
-        xgb_bin_path=settings.xgb_bin_path,
-        xgb_multi_path=settings.xgb_multi_path,
-        class_mapping_path=settings.xgb_class_mapping_path,
-        features_bin_path=settings.xgb_features_bin_path,
-        features_multi_path=settings.xgb_features_multi_path,
-    )
+    registry.refresh(raise_errors=True)
+    return registry
 
 
 def _connect_rabbitmq_with_retry(max_attempts: int = 30, sleep_seconds: float = 1.0):
@@ -63,97 +104,440 @@ def _connect_rabbitmq_with_retry(max_attempts: int = 30, sleep_seconds: float =
     raise last_exc  # type: ignore[misc]
 
 
-def _process_job(db: Session, bundle: XGBBundle, job_id: str) -> None:
+def _observe_job(job: InferenceJob, timer: StageTimer, rows: int | None = None) -> None:
+    JOBS_TOTAL.labels(status=job.status).inc()
+    for stage, seconds in timer.stages.items():
+        JOB_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+    if job.started_at and job.created_at:
+        JOB_QUEUE_WAIT_SECONDS.observe(max(0.0, (job.started_at - job.created_at).total_seconds()))
+    if job.started_at and job.finished_at:
+        runtime = max(0.0, (job.finished_at - job.started_at).total_seconds())
+        JOB_RUNTIME_SECONDS.observe(runtime)
+        if rows and runtime > 0:
+            JOB_ROWS_PER_SECOND.observe(rows / runtime)
+
+
+# set in main() when PROFILE_SLOWEST_PCT > 0
+_profiler: SlowJobProfiler | None = None
+
+# set in main() from the tuning profile (app/ml/tuning.py)
+_tuning = InferenceTuning()
+
+# sample fraction for shadow scoring, adapted job to job to stay under SHADOW_MAX_OVERHEAD
+_shadow_budget = ShadowBudget(settings.shadow_max_overhead)
+
+
+def _process_job(db: Session, models: BundleRegistry, job_id: str) -> None:
     job = db.query(InferenceJob).filter(InferenceJob.id == job_id).first()
     if not job:
         return
 
-    tf = db.query(TrafficFile).filter(TrafficFile.id == job.file_id).first()
-    if not tf:
-        job.status = "failed"
-        job.error_message = "TrafficFile not found"
-        job.finished_at = _utcnow()
-        db.commit()
-        return
-
-    job.status = "running"
-    job.started_at = _utcnow()
-    db.commit()
+    timer = StageTimer()
+    sampler = _profiler.start() if _profiler else None
+    rows = None
+    try:
+        rows = _run_job(db, models, job, timer)
+    finally:
+        if sampler is not None:
+            dump = _profiler.finish(sampler, job_id, timer.elapsed())
+            if dump:
+                print(f"[worker] slow job={job_id} ({timer.elapsed():.2f}s), stacks: {dump}")
+
+        # timings go out with the job's final commit; after it only the db_commit
+        # stage (and the total) are new, or the job crashed before finishing.
+        # Timings must never fail a job
+        try:
+            if "db_commit" in timer.stages or job.status not in ("done", "failed"):
+                job.timings = timer.as_record()
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[worker] timings for job={job_id} not saved: {e}")
+        # metrics and traces must never fail a job either
+        try:
+            _observe_job(job, timer, rows)
+            emit_job_trace(job_id, job.status, timer, rows)
+        except Exception as e:
+            print(f"[worker] metrics/trace for job={job_id} skipped: {e}")
+
+
+class JobInputError(Exception):
+    """Input file is unusable; the message is shown to the user as the job error."""
+
+
+@dataclass
+class ScoredFile:
+    scored_path: str
+    total: int
+    attack_rows: int
+    attack_ratio: float
+    top_class: str | None
+    top_share: float | None
+    sep: str | None
+    parsed_columns: int
+    shadow_stats: dict | None = None
+    timeline: Timeline | None = None
+    class_counts: dict[str, int] | None = None
+    flow_rows: FlowRows | None = None  # FLOW_SINK_ENABLED only
+
+
+def _scored_path_for(stored_path: str, out_dir: str) -> str:
+    # keeps the input's compression: x.csv.gz -> x_scored.csv.gz
+    return os.path.join(out_dir, scored_name(stored_path))
+
+
+def _key_columns(stored_path: str, sep: str | None, frame: pd.DataFrame | None = None) -> dict[str, np.ndarray]:
+    """saddr/sport/daddr/dport for the flow sink: from the frame in memory, else a narrow read of the input."""
+    if frame is not None:
+        return {c: frame[c].to_numpy() for c in KEY_COLUMNS if c in frame.columns}
+    if table_kind(stored_path) is not None:
+        return read_table_columns(stored_path, KEY_COLUMNS)
+    return read_text_columns(stored_path, KEY_COLUMNS, sep or ",")
+
+
+def _score_file(
+    bundle: XGBBundle,
+    stored_path: str,
+    timer: StageTimer,
+    out_dir: str | None = None,
+    shadow: tuple[str, XGBBundle] | None = None,
+    shadow_fraction: float = 1.0,
+) -> ScoredFile:
+    """Read -> score -> summarize -> write scored CSV. No DB access (benchmarks call it directly).
+
+    shadow=(version, bundle) also scores a sample of the rows with that bundle
+    on the same preprocessed features (fast path only); only its agreement
+    stats are returned, the output file is the primary's.
+
+    Packet captures / flow exports are aggregated into flows here; the flow
+    frame goes straight into the fast path and is the scored output's rows.
+    Parquet / Arrow / JSON-lines uploads are scored into a file of their own format.
+    """
+
+    out_dir = out_dir or settings.uploads_dir
+    os.makedirs(out_dir, exist_ok=True)
+    scored_path = _scored_path_for(stored_path, out_dir)
+
+    # -------- Captures: flow features computed in memory, no intermediate CSV --------
+    data = None
+    flows = None
+    if capture_kind(stored_path) is not None:
+        with timer.stage("read_capture"):
+            try:
+                flows, packets = read_capture_flows(
+                    stored_path, settings.flow_record_seconds, settings.flow_idle_timeout_seconds
+                )
+            except CaptureError as e:
+                raise JobInputError(f"Failed to read capture: {e}")
+        if flows.empty:
+            raise JobInputError(f"No IP flows found in capture ({packets} packets/records read)")
+        data = NumericCsv(
+            matrix=flow_matrix(flows, bundle.feature_union),
+            columns=list(bundle.feature_union),
+            header=list(flows.columns),
+            sep=",",
+            rows=len(flows),
+            times=flows["stime"].to_numpy(dtype=np.float64),
+        )
 
-    stored_path = tf.stored_path
-    if not stored_path or not os.path.exists(stored_path):
-        job.status = "failed"
-        job.error_message = f"CSV not found at stored_path='{stored_path}'. (uploads volume может быть пересоздан)"
-        job.finished_at = _utcnow()
-        db.commit()
-        return
+    # -------- Parquet / Arrow / JSON lines: feature columns only, no text parsing --------
+    elif table_kind(stored_path) is not None:
+        with timer.stage("read_table"):
+            try:
+                data = read_table_matrix(stored_path, bundle.feature_union, time_columns=TIME_COLUMNS)
+            except Exception as e:
+                raise JobInputError(f"Failed to read {table_kind(stored_path)} file: {e}")
+        if data.rows == 0:
+            raise JobInputError("No rows in file")
+
+    # -------- Fast path: only the feature columns, parsed into a float32 matrix --------
+    elif settings.csv_fast_path:
+        with timer.stage("read_csv"):
+            try:
+                data = read_numeric_matrix(
+                    stored_path, bundle.feature_union, expected_columns=bundle.features_bin, time_columns=TIME_COLUMNS
+                )
+            except Exception as e:
+                # the pandas path below reports unreadable files
+                print(f"[worker] fast CSV reader skipped for {stored_path}: {e}")
+    if data is not None:
+        _check_overlap(bundle, data.header, data.sep)
+
+        result = bundle.score_matrix(
+            data.matrix,
+            timer=timer,
+            keep_features=shadow is not None,
+            keep_proba=settings.flow_sink_enabled,
+            chunk_rows=_tuning.chunk_rows,
+        )
+        data.matrix = None  # frees the matrix before the output is written
+
+        shadow_stats = None
+        if shadow is not None:
+            # a broken candidate must never fail the user's job
+            with timer.stage("shadow"):
+                try:
+                    shadow_stats = {"version": shadow[0], **shadow_compare(bundle, shadow[1], result, shadow_fraction)}
+                except Exception as e:
+                    print(f"[worker] shadow scoring with {shadow[0]} failed: {e}")
+            result.features = None
+
+        with timer.stage("summary"):
+            total, attack_rows, attack_ratio, top_class, top_share = bundle.summary_from_result(result)
+            codes, values = result.output_codes()
+            classes = [str(v[1]) for v in values]
+            timeline = _timeline(data.times, codes, classes)
+            per_code = np.bincount(codes, minlength=len(classes))
+            class_counts = {classes[k]: int(n) for k, n in enumerate(per_code) if k > 0 and n}
+
+        flow_rows = None
+        if settings.flow_sink_enabled:
+            with timer.stage("read_keys"):
+                keys = _key_columns(stored_path, data.sep, flows)
+            flow_rows = FlowRows(codes, classes, keys, result.proba_attack, result.proba_class)
+
+        with timer.stage("write_scored"):
+            if flows is not None:
+                write_scored_frame(flows, scored_path, ["is_attack", "attack_type"], codes, values)
+            elif table_kind(stored_path) is not None:
+                write_scored_table(
+                    stored_path,
+                    scored_path,
+                    data.rows,
+                    ["is_attack", "attack_type"],
+                    codes,
+                    values,
+                    drop_columns=LABEL_COLS,
+                )
+            else:
+                write_scored_csv(
+                    stored_path,
+                    scored_path,
+                    data,
+                    ["is_attack", "attack_type"],
+                    codes,
+                    values,
+                    drop_columns=LABEL_COLS,
+                )
+
+        return ScoredFile(
+            scored_path=scored_path,
+            total=total,
+            attack_rows=attack_rows,
+            attack_ratio=attack_ratio,
+            top_class=top_class,
+            top_share=top_share,
+            sep=data.sep or None,
+            parsed_columns=len(data.header),
+            shadow_stats=shadow_stats,
+            timeline=timeline,
+            class_counts=class_counts,
+            flow_rows=flow_rows,
+        )
 
     # -------- Read CSV robustly (comma/semicolon/tab) --------
     try:
-        df, sep = read_csv_robust(stored_path, expected_columns=bundle.features_bin)
+        with timer.stage("read_csv"):
+            df, sep = read_csv_robust(stored_path, expected_columns=bundle.features_bin)
     except Exception as e:
-        job.status = "failed"
-        job.error_message = f"Failed to read CSV: {e}"
-        job.finished_at = _utcnow()
-        db.commit()
-        return
+        raise JobInputError(f"Failed to read CSV: {e}")
+
+    _check_overlap(bundle, list(df.columns), sep)
+
+    scored = bundle.predict_rows(df, timer=timer)
+
+    with timer.stage("summary"):
+        total, attack_rows, attack_ratio, top_class, top_share = bundle.summary_from_scored(scored)
+        attack_types = scored.loc[scored["is_attack"].astype(int) == 1, "attack_type"].astype(str)
+        class_counts = {str(k): int(n) for k, n in attack_types.value_counts().items()}
+        time_col = next((c for c in TIME_COLUMNS if c in df.columns), None)
+        timeline = None
+        flow_rows = None
+        if time_col is not None or settings.flow_sink_enabled:
+            codes, classes = codes_from_labels(scored["is_attack"].to_numpy(), scored["attack_type"].to_numpy())
+        if time_col is not None:
+            times = pd.to_numeric(df[time_col], errors="coerce").to_numpy(dtype=np.float64)
+            timeline = _timeline(times, codes, classes)
+        if settings.flow_sink_enabled:
+            # no probabilities on this path
+            flow_rows = FlowRows(codes, classes, _key_columns(stored_path, sep, df))
+
+    with timer.stage("write_scored"):
+        write_frame_csv(scored, scored_path)
+
+    return ScoredFile(
+        scored_path=scored_path,
+        total=total,
+        attack_rows=attack_rows,
+        attack_ratio=attack_ratio,
+        top_class=top_class,
+        top_share=top_share,
+        sep=sep,
+        parsed_columns=int(df.shape[1]),
+        timeline=timeline,
+        class_counts=class_counts,
+        flow_rows=flow_rows,
+    )
+
+
+def _timeline(times: np.ndarray | None, codes: np.ndarray, classes: list[str]) -> Timeline | None:
+    if settings.timeline_resolution_seconds <= 0:
+        return None
+    return build_timeline(times, codes, classes, settings.timeline_resolution_seconds, settings.timeline_max_buckets)
 
+
+def _check_overlap(bundle: XGBBundle, columns: list[str], sep: str) -> None:
     # sanity check: ensure it looks like the model features at least a bit
-    cols_in = set(df.columns)
-    overlap = len(cols_in & set(bundle.features_bin))
+    overlap = len(set(columns) & set(bundle.features_bin))
     if overlap < max(3, int(0.1 * len(bundle.features_bin))):
         # If overlap too small, predictions will be garbage (mostly zeros).
-        job.status = "failed"
-        job.finished_at = _utcnow()
-        job.error_message = (
+        if not sep:
+            # tables: column names come from the schema, no separator to blame
+            raise JobInputError(
+                "Columns do not match trained feature set. "
+                f"parsed_cols={len(columns)}, overlap_with_features={overlap}. Wrong dataset schema?"
+            )
+        raise JobInputError(
             "CSV columns do not match trained feature set. "
-            f"Detected sep='{sep}', parsed_cols={df.shape[1]}, overlap_with_features={overlap}. "
+            f"Detected sep='{sep}', parsed_cols={len(columns)}, overlap_with_features={overlap}. "
             "Most likely wrong separator or wrong dataset schema."
         )
-        db.commit()
+
+
+def _observe_shadow(stats: dict | None) -> None:
+    if not stats or stats.get("overhead") is None:
         return
+    _shadow_budget.update(stats["overhead"], stats["fraction"])
+    SHADOW_OVERHEAD_RATIO.observe(stats["overhead"])
+    if stats.get("label_agreement") is not None:
+        SHADOW_LABEL_AGREEMENT.labels(shadow_version=stats["version"]).observe(stats["label_agreement"])
+
+
+def _save_timeline(db: Session, job: InferenceJob, timeline: Timeline | None) -> None:
+    """Replace the job's timeline (re-runs included); committed with the summary."""
+    db.query(PredictionTimeline).filter(PredictionTimeline.job_id == job.id).delete(synchronize_session=False)
+    if timeline is None:
+        return
+    db.add(
+        PredictionTimeline(
+            job_id=job.id,
+            resolution_seconds=timeline.resolution,
+            start_ts=timeline.start,
+            classes=timeline.classes,
+            buckets=timeline.buckets,
+            untimed_rows=timeline.untimed_rows,
+        )
+    )
+
 
+def _sink_flows(db: Session, job: InferenceJob, rows: FlowRows) -> None:
+    """Row-level predictions into flow_predictions, in the job's transaction (savepoint):
+    a sink failure is logged, the job itself still succeeds."""
+    if db.get_bind().dialect.name != "postgresql":
+        return  # bench_pipeline's SQLite
     try:
-        scored = bundle.predict_rows(df)
+        with db.begin_nested():
+            flow_sink.load(db, job, rows)
+    except Exception as e:
+        print(f"[worker] flow sink failed for job {job.id}: {e}")
+
+
+def _remove_stale(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[worker] previous scored file {path} not removed: {e}")
+
+
+def _fail_job(
+    db: Session,
+    job: InferenceJob,
+    message: str,
+    before: JobOutcome | None = None,
+    timer: StageTimer | None = None,
+) -> None:
+    job.status = "failed"
+    job.error_message = message
+    job.finished_at = _utcnow()
+    if timer is not None:
+        job.timings = timer.as_record()
+    record_job(db, job, before or JobOutcome(), JobOutcome(status="failed"))
+    db.commit()
 
-        total, attack_rows, attack_ratio, top_class, top_share = bundle.summary_from_scored(scored)
 
-        os.makedirs(settings.uploads_dir, exist_ok=True)
-        base = os.path.basename(stored_path)
-        scored_name = base[:-4] + "_scored.csv" if base.lower().endswith(".csv") else base + "_scored.csv"
-        scored_path = os.path.join(settings.uploads_dir, scored_name)
-        scored.to_csv(scored_path, index=False)
+def _run_job(db: Session, models: BundleRegistry, job: InferenceJob, timer: StageTimer) -> int | None:
+    """Runs the pipeline for a loaded job; returns scored rows on success."""
+
+    # a re-delivered job replaces its previous outcome in the rollups
+    before = outcome_of(db, job)
+
+    tf = db.query(TrafficFile).filter(TrafficFile.id == job.file_id).first()
+    if not tf:
+        _fail_job(db, job, "TrafficFile not found", before, timer)
+        return None
+
+    # resolved once: a model swap during the job does not affect it
+    try:
+        model_version, bundle = models.get(job.model_version)
+    except ModelVersionError as e:
+        _fail_job(db, job, str(e), before, timer)
+        return None
+
+    shadow = models.get_shadow() if settings.shadow_max_overhead > 0 else None
+    if shadow is not None and shadow[0] == model_version:
+        shadow = None
+
+    job.status = "running"
+    job.started_at = _utcnow()
+    db.commit()
+
+    stored_path = tf.stored_path
+    if not stored_path or not os.path.exists(stored_path):
+        _fail_job(
+            db, job, f"CSV not found at stored_path='{stored_path}'. (uploads volume может быть пересоздан)", before, timer
+        )
+        return None
+
+    try:
+        result = _score_file(bundle, stored_path, timer, shadow=shadow, shadow_fraction=_shadow_budget.fraction)
+        _observe_shadow(result.shadow_stats)
 
-        tf.rows_count = total
+        tf.rows_count = result.total
         db.add(tf)
 
         ps = db.query(PredictionSummary).filter(PredictionSummary.job_id == job.id).first()
         if not ps:
-            ps = PredictionSummary(
-                job_id=job.id,
-                rows_scored=total,
-                attack_rows=attack_rows,
-                attack_share=attack_ratio,
-                top_class=top_class,
-                top_class_share=top_share,
-                scored_path=scored_path,
-                created_at=_utcnow(),
-            )
-        else:
-            ps.rows_scored = total
-            ps.attack_rows = attack_rows
-            ps.attack_share = attack_ratio
-            ps.top_class = top_class
-            ps.top_class_share = top_share
-            ps.scored_path = scored_path
+            ps = PredictionSummary(job_id=job.id, created_at=_utcnow())
+        ps.rows_scored = result.total
+        ps.attack_rows = result.attack_rows
+        ps.attack_share = result.attack_ratio
+        ps.top_class = result.top_class
+        ps.top_class_share = result.top_share
+        # a slimmed / compressed scored file of an earlier run is not overwritten by the new one
+        previous_scored = ps.scored_path
+        ps.scored_path = result.scored_path
+        # a re-run writes a fresh full file
+        ps.scored_state = "hot"
+        ps.scored_bytes = os.path.getsize(result.scored_path)
+        ps.scored_sep = None
+        ps.model_version = model_version
+        ps.shadow_stats = result.shadow_stats
+        ps.class_counts = result.class_counts
+        _save_timeline(db, job, result.timeline)
+        if result.flow_rows is not None:
+            with timer.stage("flow_sink"):
+                _sink_flows(db, job, result.flow_rows)
 
         # --- Optional debug (won't break if columns don't exist) ---
         # If your PredictionSummary model has no such columns, this simply won't be stored.
         # If you want persistence, add columns via migration.
         if hasattr(ps, "detected_sep"):
-            setattr(ps, "detected_sep", sep)
+            setattr(ps, "detected_sep", result.sep)
         if hasattr(ps, "parsed_columns"):
-            setattr(ps, "parsed_columns", int(df.shape[1]))
+            setattr(ps, "parsed_columns", result.parsed_columns)
 
         db.add(ps)
 
@@ -161,24 +545,80 @@ def _process_job(db: Session, bundle: XGBBundle, job_id: str) -> None:
         job.finished_at = _utcnow()
         job.error_message = None
         db.add(job)
+        record_job(
+            db,
+            job,
+            before,
+            JobOutcome("done", result.total, result.attack_rows, result.class_counts or {}),
+        )
+
+        # a poller never sees a done job without timings
+        job.timings = timer.as_record()
+        with timer.stage("db_commit"):
+            db.commit()
 
-        db.commit()
+        # removed only once nothing points at it (the order of app/services/storage.py)
+        if previous_scored and previous_scored != result.scored_path:
+            _remove_stale(previous_scored)
 
+        return result.total
+
+    except JobInputError as e:
+        _fail_job(db, job, str(e), before, timer)
     except Exception as e:
-        job.status = "failed"
-        job.finished_at = _utcnow()
-        job.error_message = f"{e}\n\n{traceback.format_exc()}"
-        db.commit()
+        db.rollback()
+        _fail_job(db, job, f"{e}\n\n{traceback.format_exc()}", before, timer)
+    return None
 
 
 def main() -> None:
-    bundle = _load_models()
+    global _profiler, _tuning
+
+    instrument_engine(engine)
+    start_http_server(settings.worker_metrics_port)
+    print(f"[worker] metrics on :{settings.worker_metrics_port}/metrics")
+
+    if settings.profile_slowest_pct > 0:
+        _profiler = SlowJobProfiler(
+            out_dir=settings.profile_dir,
+            slowest_pct=settings.profile_slowest_pct,
+            interval=settings.profile_interval_ms / 1000.0,
+        )
+        print(f"[worker] profiling slowest {settings.profile_slowest_pct}% of jobs -> {settings.profile_dir}")
+
+    _tuning = worker_tuning()
+    print(f"[worker] inference {_tuning.describe()}")
+
+    models = _load_models(_tuning.nthread)
+    print(f"[worker] models active={models.active_version} shadow={models.shadow_version} resident={models.versions}")
+    if settings.model_poll_seconds > 0:
+        models.start_watcher(settings.model_poll_seconds)
 
     connection = _connect_rabbitmq_with_retry()
     channel = connection.channel()
 
     channel.queue_declare(queue=settings.ml_queue_name, durable=True)
-    channel.basic_qos(prefetch_count=1)
+    channel.basic_qos(prefetch_count=_tuning.job_slots)
+    # job slots > 1: jobs run in a pool, the connection stays on this thread
+    pool = ThreadPoolExecutor(_tuning.job_slots, thread_name_prefix="job") if _tuning.job_slots > 1 else None
+
+    def handle(job_id: str) -> None:
+        db = _get_db()
+        try:
+            _process_job(db, models, job_id)
+        finally:
+            db.close()
+
+    def run_in_slot(ch, delivery_tag: int, job_id: str) -> None:
+        try:
+            handle(job_id)
+            done = functools.partial(ch.basic_ack, delivery_tag=delivery_tag)
+        except Exception:
+            # what stops a single-slot worker (and redelivers the job) only frees the slot here
+            print(f"[worker] job={job_id} crashed, requeued:\n{traceback.format_exc()}")
+            done = functools.partial(ch.basic_nack, delivery_tag=delivery_tag, requeue=True)
+        # pika channels are not thread-safe: ack from the connection's thread
+        connection.add_callback_threadsafe(done)
 
     def callback(ch, method, properties, body: bytes):
         try:
@@ -188,12 +628,11 @@ def main() -> None:
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
 
-        db = _get_db()
-        try:
-            _process_job(db, bundle, job_id)
-        finally:
-            db.close()
+        if pool is not None:
+            pool.submit(run_in_slot, ch, method.delivery_tag, job_id)
+            return
 
+        handle(job_id)
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
     channel.basic_consume(queue=settings.ml_queue_name, on_message_callback=callback)
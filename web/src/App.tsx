@@ -3,6 +3,7 @@ import {
   clearToken,
   downloadScoredCsv,
   getJob,
+  getJobStatuses,
   listJobs,
   getSubscriptionStatus,
   getToken,
@@ -187,6 +188,27 @@ export default function App() {
     };
   }, [view, currentJob?.job_id]);
 
+  // polling in-flight jobs of the history list: one request for all of them
+  const pendingIds = jobs
+    .filter((j) => j.status === "queued" || j.status === "running")
+    .map((j) => j.job_id)
+    .join(",");
+
+  useEffect(() => {
+    if (view !== "dashboard" || !pendingIds) return;
+
+    const timer = window.setTimeout(async () => {
+      try {
+        const updated = await getJobStatuses(pendingIds.split(","));
+        const byId = new Map(updated.map((j) => [j.job_id, j]));
+        setJobs((prev) => prev.map((j) => ({ ...j, ...(byId.get(j.job_id) ?? {}) })));
+      } catch {
+        // best-effort, next upload/refresh will resync
+      }
+    }, 2000);
+    return () => window.clearTimeout(timer);
+  }, [view, pendingIds, jobs]);
+
   return (
     <div className="min-h-screen bg-neutral-950">
       <div className="max-w-5xl mx-auto px-4 py-8">
@@ -298,7 +320,7 @@ export default function App() {
                 <div className="flex flex-col md:flex-row gap-3 md:items-center">
                   <input
                     type="file"
-                    accept=".csv,text/csv"
+                    accept=".csv,.gz,.zst,.parquet,.pq,.arrow,.feather,.jsonl,.ndjson,.pcap,.pcapng,.cap,.ipfix,.netflow,text/csv"
                     className="block w-full text-sm text-neutral-300 file:mr-3 file:rounded-xl file:border file:border-neutral-800 file:bg-neutral-900 file:px-4 file:py-2 file:text-neutral-100 hover:file:bg-neutral-800"
                     onChange={(e) => {
                       const f = e.target.files?.[0];
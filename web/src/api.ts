@@ -13,6 +13,8 @@ export type JobResponse = {
   // optional fields available in /predictions/jobs (history)
   created_at?: string | null;
   original_filename?: string | null;
+  // only in POST /predictions/status
+  error_message?: string | null;
 };
 
 export type SubscriptionStatus = {
@@ -143,6 +145,19 @@ export async function listJobs(limit = 50, offset = 0): Promise<JobResponse[]> {
   return JSON.parse(txt) as JobResponse[];
 }
 
+export async function getJobStatuses(jobIds: string[]): Promise<JobResponse[]> {
+  if (jobIds.length === 0) return [];
+  const res = await fetch("/predictions/status", {
+    method: "POST",
+    headers: { ...authHeaders(), accept: "application/json", "Content-Type": "application/json" },
+    body: JSON.stringify({ job_ids: jobIds })
+  });
+
+  const txt = await res.text();
+  if (!res.ok) throw new Error(txt || `Job statuses failed (${res.status})`);
+  return JSON.parse(txt) as JobResponse[];
+}
+
 function parseFilenameFromContentDisposition(cd: string | null): string | null {
   if (!cd) return null;
   // Handles: attachment; filename="..." and RFC5987: filename*=UTF-8''...